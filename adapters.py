@@ -0,0 +1,438 @@
+import base64
+import hashlib
+import http.client
+import importlib
+import json
+import os
+import random
+import socket
+import ssl
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# ---------------------------------------------------------
+# フィードアダプタ
+#   ポーリング型: fetch() が (fx_df, crypto_df) を返す
+#   プッシュ型 (websocket / SSE): 受信したレートを溜め、fetch() は
+#   新しいレートが届くまで待ってから銘柄ごとに最新の値だけを返す
+# 使うアダプタは起動時に1回だけ resolve_adapter() で決める。
+#   TRADESOFT_FEED=ws://127.0.0.1:8765/ python main.py
+# ---------------------------------------------------------
+FEED_ENV = "TRADESOFT_FEED"
+FEED_MODULE = "repRateModu01"  # 既定の外部レートモジュール
+HEARTBEAT = 15.0               # この秒数受信が無ければ ping / 再接続
+RECONNECT_MIN = 0.5            # 再接続の待ち時間 (倍々で RECONNECT_MAX まで)
+RECONNECT_MAX = 30.0
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class FeedAdapter:
+    """アダプタの共通部分"""
+    name = "base"
+    streaming = False  # True ならプッシュ型 (fetch() はデータが届くまで待つ)
+
+    def start(self):
+        pass
+
+    def fetch(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {'feed': self.name}
+
+
+class FunctionAdapter(FeedAdapter):
+    """(fx_df, crypto_df) を返す関数をそのまま使う (ダミー・合成フィード)"""
+    def __init__(self, fetch, name):
+        self._fetch = fetch
+        self.name = name
+
+    def fetch(self):
+        return self._fetch()
+
+
+class SourcesAdapter(FeedAdapter):
+    """FX と暗号資産を別々の関数から並行して取得する
+
+    2つの取得はスレッドプールで同時に投げ、両方そろってから返す
+    (1周期の時間は遅い方の取得時間で決まり、合計にはならない)。
+    """
+    def __init__(self, fetch_fx, fetch_crypto, name):
+        self.sources = (fetch_fx, fetch_crypto)
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"{name}-src")
+
+    def fetch(self):
+        futures = [self._pool.submit(fn) for fn in self.sources]
+        return tuple(f.result() for f in futures)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+# ---------------------------------------------------------
+# websocket (RFC 6455 のテキストフレームのみ、標準ライブラリで実装)
+# ---------------------------------------------------------
+class WebSocketError(Exception):
+    pass
+
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise WebSocketError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def _mask(payload, key):
+    n = len(payload)
+    if not n:
+        return payload
+    stream = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(stream, "big")).to_bytes(n, "big")
+
+
+def ws_send(sock, payload, opcode=0x1, mask=False):
+    """1フレーム送信 (クライアントからはマスク必須)"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    n = len(payload)
+    head = bytes([0x80 | opcode])
+    bit = 0x80 if mask else 0
+    if n < 126:
+        head += bytes([bit | n])
+    elif n < 1 << 16:
+        head += bytes([bit | 126]) + struct.pack("!H", n)
+    else:
+        head += bytes([bit | 127]) + struct.pack("!Q", n)
+    if mask:
+        key = os.urandom(4)
+        head += key
+        payload = _mask(payload, key)
+    sock.sendall(head + payload)
+
+
+def ws_recv(sock):
+    """1メッセージ受信 (分割フレームは結合する)。戻り値: (opcode, payload)"""
+    message, first = bytearray(), None
+    while True:
+        b0, b1 = _recv_exact(sock, 2)
+        opcode, n = b0 & 0x0F, b1 & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", _recv_exact(sock, 2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", _recv_exact(sock, 8))[0]
+        key = _recv_exact(sock, 4) if b1 & 0x80 else None
+        payload = _recv_exact(sock, n)
+        if key:
+            payload = _mask(payload, key)
+        if opcode >= 0x8:
+            # 制御フレームは分割メッセージの途中にも割り込める
+            return opcode, payload
+        if first is None:
+            first = opcode
+        message += payload
+        if b0 & 0x80:
+            return first, bytes(message)
+
+
+def _open_socket(url, timeout):
+    parts = urlsplit(url)
+    secure = parts.scheme in ("wss", "https")
+    port = parts.port or (443 if secure else 80)
+    sock = socket.create_connection((parts.hostname, port), timeout=timeout)
+    if secure:
+        sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+    return sock, parts
+
+
+class WebSocketConnection:
+    """websocket クライアント (接続・受信ループ・心拍)"""
+    def __init__(self, url, timeout=HEARTBEAT):
+        self.url = url
+        self.timeout = timeout
+        self.sock = None
+
+    def connect(self):
+        sock, parts = _open_socket(self.url, self.timeout)
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        sock.sendall((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                      "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+        header = b""
+        while b"\r\n\r\n" not in header:
+            header += _recv_exact(sock, 1)
+        lines = header.decode("latin-1").split("\r\n")
+        fields = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+        if lines[0].split()[1:2] != ["101"] or fields.get("sec-websocket-accept") != ws_accept_key(key):
+            sock.close()
+            raise WebSocketError(f"handshake failed: {lines[0]}")
+        self.sock = sock
+
+    def messages(self, stopped):
+        """テキストメッセージを順に返す。HEARTBEAT 秒無音なら ping、さらに無音なら切断扱い"""
+        pinged = False
+        while not stopped.is_set():
+            try:
+                opcode, payload = ws_recv(self.sock)
+            except socket.timeout:
+                if pinged:
+                    raise WebSocketError("heartbeat timeout")
+                ws_send(self.sock, b"", opcode=0x9, mask=True)
+                pinged = True
+                continue
+            pinged = False
+            if opcode == 0x9:
+                ws_send(self.sock, payload, opcode=0xA, mask=True)
+            elif opcode == 0x8:
+                raise WebSocketError("closed by server")
+            elif opcode in (0x1, 0x2):
+                yield payload.decode()
+
+    def close(self):
+        sock, self.sock = self.sock, None
+        if sock is None:
+            return
+        try:
+            ws_send(sock, b"", opcode=0x8, mask=True)
+        except OSError:
+            pass
+        sock.close()
+
+
+class SSEConnection:
+    """Server-Sent Events クライアント (data: 行をイベント単位でまとめる)"""
+    def __init__(self, url, timeout=HEARTBEAT * 2):
+        self.url = url[len("sse+"):] if url.startswith("sse+") else url
+        self.timeout = timeout
+        self.conn = None
+        self.response = None
+
+    def connect(self):
+        parts = urlsplit(self.url)
+        cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.conn = cls(parts.hostname, parts.port, timeout=self.timeout)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.conn.request("GET", path, headers={"Accept": "text/event-stream", "Cache-Control": "no-cache"})
+        self.response = self.conn.getresponse()
+        if self.response.status != 200:
+            raise WebSocketError(f"SSE status {self.response.status}")
+
+    def messages(self, stopped):
+        data = []
+        while not stopped.is_set():
+            line = self.response.readline()  # chunked でも本文だけを読む。無音が timeout 秒続くと socket.timeout
+            if not line:
+                raise WebSocketError("stream ended")
+            line = line.decode().rstrip("\r\n")
+            if not line:
+                if data:
+                    yield "\n".join(data)
+                    data = []
+            elif line.startswith("data:"):
+                data.append(line[5:].lstrip(" "))
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()  # 応答がソケットを握っているので先に閉じる
+            self.response = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+# ---------------------------------------------------------
+# 接続プール (URL ごとに1本を共有し、切れたら自動で張り直す)
+# ---------------------------------------------------------
+class PooledStream:
+    """1つの URL への常駐接続。受信したメッセージを購読者全員に配る"""
+    def __init__(self, url):
+        self.url = url
+        self.listeners = []
+        self.refs = 0
+        self.connected = False
+        self.reconnects = 0
+        self.messages = 0
+        self._stop = threading.Event()
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, name=f"stream {url}", daemon=True)
+
+    def _new_connection(self):
+        return SSEConnection(self.url) if self.url.startswith("sse+") else WebSocketConnection(self.url)
+
+    def _run(self):
+        delay = RECONNECT_MIN
+        while not self._stop.is_set():
+            conn = self._conn = self._new_connection()
+            try:
+                conn.connect()
+                self.connected = True
+                delay = RECONNECT_MIN
+                for text in conn.messages(self._stop):
+                    self.messages += 1
+                    for callback in self.listeners:
+                        try:
+                            callback(text)
+                        except Exception as e:
+                            print(f"Stream Listener Error: {e}")
+            except (OSError, WebSocketError, http.client.HTTPException) as e:
+                if not self._stop.is_set():
+                    print(f"[{self.url}] {e} (reconnect in {delay:.1f}s)")
+            finally:
+                self.connected = False
+                conn.close()
+            if self._stop.wait(delay * random.uniform(0.8, 1.2)):
+                break
+            self.reconnects += 1
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def stop(self):
+        self._stop.set()
+        if self._conn is not None:
+            self._conn.close()
+
+
+class ConnectionPool:
+    """URL -> PooledStream (参照カウント。最後の利用者が離れたら切断)"""
+    def __init__(self):
+        self.streams = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url, callback):
+        with self.lock:
+            stream = self.streams.get(url)
+            if stream is None:
+                stream = self.streams[url] = PooledStream(url)
+                stream._thread.start()
+            stream.listeners = stream.listeners + [callback]
+            stream.refs += 1
+            return stream
+
+    def release(self, url, callback):
+        with self.lock:
+            stream = self.streams.get(url)
+            if stream is None:
+                return
+            stream.listeners = [cb for cb in stream.listeners if cb is not callback]
+            stream.refs -= 1
+            if stream.refs <= 0:
+                del self.streams[url]
+                stream.stop()
+
+
+POOL = ConnectionPool()
+
+
+class StreamAdapter(FeedAdapter):
+    """websocket / SSE のプッシュ型フィード
+
+    メッセージ形式 (JSON):
+      {"market": "fx" | "crypto", "ts": 1700000000.0,
+       "quotes": [{"symbol": "USD_JPY", "bid": 150.1, "ask": 150.103, "high": ..., "low": ...}, ...]}
+    受信スレッドは銘柄ごとの最新レート表を上書きするだけ。fetch() は
+    新しいレートが届くまで待ち、表全体 (ポーリング型と同じく全銘柄) を返す。
+    処理が追いつかない間に同じ銘柄が複数回届いた分は最新の1件に間引かれる。
+    """
+    streaming = True
+
+    def __init__(self, urls, pool=POOL):
+        self.urls = list(urls)
+        self.name = ",".join(self.urls)
+        self.pool = pool
+        self._cond = threading.Condition()
+        self._book = {'fx': {}, 'crypto': {}}
+        self._fresh = set()  # 前回の fetch() 以降に更新された (市場, 銘柄)
+        self._closed = False
+        self.received = 0
+        self.conflated = 0
+
+    def start(self):
+        self._closed = False
+        for url in self.urls:
+            self.pool.acquire(url, self._on_message)
+
+    def _on_message(self, text):
+        msg = json.loads(text)
+        market = 'crypto' if msg.get('market') == 'crypto' else 'fx'
+        book = self._book[market]
+        with self._cond:
+            for quote in msg.get('quotes', ()):
+                key = (market, quote['symbol'])
+                if key in self._fresh:
+                    self.conflated += 1
+                self._fresh.add(key)
+                book[quote['symbol']] = quote
+            self.received += 1
+            self._cond.notify()
+
+    def fetch(self):
+        import pandas as pd
+        with self._cond:
+            while not self._closed and not self._fresh:
+                self._cond.wait()
+            self._fresh = set()
+            fx, crypto = list(self._book['fx'].values()), list(self._book['crypto'].values())
+        return pd.DataFrame(fx), pd.DataFrame(crypto)
+
+    def close(self):
+        for url in self.urls:
+            self.pool.release(url, self._on_message)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        streams = [self.pool.streams.get(u) for u in self.urls]
+        return {
+            'feed': self.name, 'received': self.received, 'conflated': self.conflated,
+            'connected': sum(1 for s in streams if s is not None and s.connected),
+            'reconnects': sum(s.reconnects for s in streams if s is not None),
+        }
+
+
+# ---------------------------------------------------------
+# アダプタの解決 (起動時に1回)
+# ---------------------------------------------------------
+def resolve_adapter(spec=None):
+    """指定からアダプタを作る
+
+    None / "auto":     repRateModu01 があれば使い、無ければダミー (その旨を表示)
+    "module:NAME":     NAME.fetch_get_FXrate / fetch_get_Cryptorate を並行取得
+    "dummy":           ダミーデータ
+    "synthetic[:N]":   合成フィード (N 銘柄)
+    "ws://..." / "sse+http://...":  プッシュ型 (カンマ区切りで複数接続)
+    """
+    spec = (spec if spec is not None else os.environ.get(FEED_ENV, "")).strip()
+    if spec.startswith(("ws://", "wss://", "sse+http://", "sse+https://")):
+        return StreamAdapter(u.strip() for u in spec.split(",") if u.strip())
+    if spec == "dummy":
+        from engine import DataManager
+        return FunctionAdapter(DataManager.create_dummy_dataframe, "dummy")
+    if spec.startswith("synthetic"):
+        from engine import SyntheticFeed
+        n = int(spec.partition(":")[2] or 8)
+        return FunctionAdapter(SyntheticFeed(n_fx=n // 2, n_crypto=n - n // 2).fetch, spec)
+    if spec in ("", "auto") or spec.startswith("module:"):
+        name = spec.partition(":")[2] or FEED_MODULE
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            if spec.startswith("module:"):
+                raise
+            print(f"Feed module '{name}' not found; using dummy data")
+            return resolve_adapter("dummy")
+        return SourcesAdapter(module.fetch_get_FXrate, module.fetch_get_Cryptorate, name)
+    raise ValueError(f"unknown feed: {spec}")
@@ -0,0 +1,277 @@
+import bisect
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+# ---------------------------------------------------------
+# 価格アラート
+#   上抜け / 下抜け: Bid が指定価格を越えたら
+#   変動率:          基準価格 (登録後の最初の Bid) から ±N% 動いたら (繰り返しなら発火価格を新しい基準にする)
+#   スプレッド拡大:  Ask - Bid が指定幅以上に広がったら
+# どれも「前回の値 → 今回の値」の区間を越えた閾値だけを二分探索で取り出すので、
+# 1ティックの判定は登録数に対して O(log n + 発火数)。
+# ---------------------------------------------------------
+CROSS_ABOVE, CROSS_BELOW, PERCENT, SPREAD = "above", "below", "percent", "spread"
+ALERT_KINDS = (CROSS_ABOVE, CROSS_BELOW, PERCENT, SPREAD)
+ALERT_COOLDOWN = 60.0  # 同じアラートを再通知しない間隔 (秒)
+MAX_PENDING = 1000     # UI が受け取る前に溜めておく通知の上限 (超えたら古いものから捨てる)
+
+
+class Alert:
+    __slots__ = ('id', 'symbol', 'kind', 'value', 'repeat', 'cooldown', 'ref', 'levels',
+                 'fired', 'last_fired')
+
+    def __init__(self, id, symbol, kind, value, repeat, cooldown):
+        self.id = id
+        self.symbol = symbol
+        self.kind = kind
+        self.value = value
+        self.repeat = repeat
+        self.cooldown = cooldown
+        self.ref = None       # 変動率の基準価格
+        self.levels = ()      # 索引に登録中の (索引名, 閾値)
+        self.fired = 0
+        self.last_fired = None
+
+    def describe(self):
+        if self.kind == CROSS_ABOVE:
+            return f"{self.symbol} {self.value:g} 上抜け"
+        if self.kind == CROSS_BELOW:
+            return f"{self.symbol} {self.value:g} 下抜け"
+        if self.kind == PERCENT:
+            return f"{self.symbol} ±{self.value:g}% 変動"
+        return f"{self.symbol} スプレッド {self.value:g} 以上"
+
+
+class AlertEvent:
+    """1件の通知 (UI が受け取るまでに同じアラートが再発火したら count を増やして1件にまとめる)"""
+    __slots__ = ('alert', 'price', 'ts', 'count')
+
+    def __init__(self, alert, price, ts):
+        self.alert = alert
+        self.price = price
+        self.ts = ts
+        self.count = 1
+
+    def message(self):
+        text = f"{self.alert.describe()} ({self.price:g})"
+        return text if self.count == 1 else f"{text} ×{self.count}"
+
+
+class LevelIndex:
+    """閾値でソートしたアラートの索引 ((閾値, id) の昇順リスト)"""
+    def __init__(self):
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, level, alert_id):
+        bisect.insort(self.keys, (level, alert_id))
+
+    def remove(self, level, alert_id):
+        i = bisect.bisect_left(self.keys, (level, alert_id))
+        if i < len(self.keys) and self.keys[i] == (level, alert_id):
+            del self.keys[i]
+
+    def rising(self, lo, hi):
+        """lo < 閾値 <= hi のアラート (値が上がって越えたもの)"""
+        i = bisect.bisect_right(self.keys, (lo, float("inf")))
+        j = bisect.bisect_right(self.keys, (hi, float("inf")))
+        return [k[1] for k in self.keys[i:j]]
+
+    def falling(self, lo, hi):
+        """lo <= 閾値 < hi のアラート (値が下がって越えたもの、近い順)"""
+        i = bisect.bisect_left(self.keys, (lo, -1))
+        j = bisect.bisect_left(self.keys, (hi, -1))
+        return [k[1] for k in self.keys[i:j][::-1]]
+
+
+class _SymbolAlerts:
+    """1銘柄分の索引と直前の気配"""
+    def __init__(self):
+        self.above = LevelIndex()   # Bid がこの価格を上に越えたら
+        self.below = LevelIndex()   # Bid がこの価格を下に越えたら
+        self.spread = LevelIndex()  # スプレッドがこの幅を上に越えたら
+        self.waiting = []           # 基準価格待ちの変動率アラート
+        self.bid = None
+        self.spread_value = None
+
+    def __len__(self):
+        return len(self.above) + len(self.below) + len(self.spread) + len(self.waiting)
+
+
+class AlertEngine:
+    """アラートの登録と判定
+
+    DataEngine の購読者として on_snapshot() をワーカースレッドで受ける。
+    発火した通知は溜めておき、on_alert に登録したコールバックへ知らせる
+    (UI 側は LatestDispatcher で起こされてから drain() でまとめて受け取る)。
+    """
+    def __init__(self, cooldown=ALERT_COOLDOWN, clock=time.time):
+        self.cooldown = cooldown
+        self.clock = clock
+        self.alerts = {}          # id -> Alert
+        self.books = {}           # symbol -> _SymbolAlerts
+        self._keys = {}           # (symbol, kind, value) -> id (重複登録の防止)
+        self.pending = OrderedDict()  # alert id -> AlertEvent (UI 未受信)
+        self.listeners = []
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.suppressed = 0       # クールダウン中で通知しなかった回数
+        self.dropped = 0
+
+    def on_alert(self, callback):
+        self.listeners.append(callback)
+        return callback
+
+    # --- 登録 ---
+    def add(self, symbol, kind, value, repeat=True, cooldown=None):
+        """アラートを登録する (同じ銘柄・種類・値が登録済みならそれを返す)"""
+        if kind not in ALERT_KINDS:
+            raise ValueError(f"invalid alert kind: {kind}")
+        value = float(value)
+        if value <= 0:
+            raise ValueError("alert value must be positive")
+        with self.lock:
+            key = (symbol, kind, value)
+            alert_id = self._keys.get(key)
+            if alert_id is not None:
+                return self.alerts[alert_id]
+            alert = Alert(next(self._ids), symbol, kind, value, repeat,
+                          self.cooldown if cooldown is None else cooldown)
+            self._keys[key] = alert.id
+            self.alerts[alert.id] = alert
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = _SymbolAlerts()
+            if kind == PERCENT:
+                if book.bid is None:
+                    book.waiting.append(alert.id)
+                else:
+                    self._arm_percent(book, alert, book.bid)
+            else:
+                self._index(book, alert, (kind, value))
+            return alert
+
+    def remove(self, alert_id):
+        with self.lock:
+            alert = self.alerts.get(alert_id)
+            if alert is None:
+                return False
+            self._discard(alert)
+            self.pending.pop(alert_id, None)
+            return True
+
+    def _discard(self, alert):
+        """登録を索引ごと外す (同じ銘柄・種類・値をまた登録できるようにする)"""
+        del self.alerts[alert.id]
+        del self._keys[(alert.symbol, alert.kind, alert.value)]
+        book = self.books.get(alert.symbol)
+        if book is not None:
+            self._index(book, alert)
+            if alert.id in book.waiting:
+                book.waiting.remove(alert.id)
+            if not len(book):
+                del self.books[alert.symbol]
+
+    def _index(self, book, alert, *levels):
+        """索引の登録を levels に置き換える ((CROSS_ABOVE|CROSS_BELOW|SPREAD, 閾値) の並び)"""
+        indexes = {CROSS_ABOVE: book.above, CROSS_BELOW: book.below, SPREAD: book.spread}
+        for name, level in alert.levels:
+            indexes[name].remove(level, alert.id)
+        alert.levels = levels
+        for name, level in alert.levels:
+            indexes[name].add(level, alert.id)
+
+    def _arm_percent(self, book, alert, price):
+        alert.ref = price
+        width = price * alert.value / 100
+        self._index(book, alert, (CROSS_ABOVE, price + width), (CROSS_BELOW, price - width))
+
+    # --- 判定 ---
+    def on_snapshot(self, snapshot):
+        """DataEngine の購読者 (ワーカースレッド)。アラートのある銘柄だけ判定する"""
+        events = []
+        with self.lock:
+            if not self.books:
+                return
+            now = self.clock()
+            symbols = list(self.books)
+            found, values = snapshot.take(symbols)
+            for i, row in zip(found.tolist(), values[:, :2].tolist()):
+                self._check(self.books[symbols[i]], row[0], row[1], now, events)
+        self._notify(events)
+
+    def _check(self, book, bid, ask, now, events):
+        spread = ask - bid
+        prev_bid, prev_spread = book.bid, book.spread_value
+        book.bid, book.spread_value = bid, spread
+        if prev_bid is None:
+            for alert_id in book.waiting:
+                self._arm_percent(book, self.alerts[alert_id], bid)
+            book.waiting = []
+            return
+        if bid > prev_bid:
+            for alert_id in book.above.rising(prev_bid, bid):
+                self._fire(book, alert_id, bid, now, events)
+        elif bid < prev_bid:
+            for alert_id in book.below.falling(bid, prev_bid):
+                self._fire(book, alert_id, bid, now, events)
+        if spread > prev_spread:
+            for alert_id in book.spread.rising(prev_spread, spread):
+                self._fire(book, alert_id, spread, now, events)
+
+    def _fire(self, book, alert_id, price, now, events):
+        alert = self.alerts[alert_id]
+        if not alert.repeat:
+            self._discard(alert)  # 1回限り: 発火したら登録から外す (通知は下で出す)
+        elif alert.kind == PERCENT:
+            self._arm_percent(book, alert, price)
+        if alert.last_fired is not None and now - alert.last_fired < alert.cooldown:
+            self.suppressed += 1
+            return
+        alert.fired += 1
+        alert.last_fired = now
+        event = self.pending.get(alert_id)
+        if event is not None:
+            # UI がまだ受け取っていない通知は1件にまとめる
+            event.count += 1
+            event.price, event.ts = price, now
+            self.pending.move_to_end(alert_id)
+        else:
+            event = self.pending[alert_id] = AlertEvent(alert, price, now)
+            if len(self.pending) > MAX_PENDING:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+        events.append(event)
+
+    def _notify(self, events):
+        if not events:
+            return
+        for callback in self.listeners:
+            try:
+                callback(events)
+            except Exception as e:
+                print(f"Alert Listener Error: {e}")
+
+    # --- 参照 ---
+    def drain(self):
+        """未受信の通知を古い順に取り出す (UI スレッドから呼ぶ)"""
+        with self.lock:
+            events = list(self.pending.values())
+            self.pending.clear()
+            return events
+
+    def list(self):
+        with self.lock:
+            return list(self.alerts.values())
+
+    def active(self, alert_id):
+        """登録中なら True (1回限りのアラートは発火すると外れる)"""
+        return alert_id in self.alerts
+
+    def stats(self):
+        return {'alerts': len(self.alerts), 'alert_symbols': len(self.books),
+                'alert_suppressed': self.suppressed, 'alert_dropped': self.dropped}
@@ -0,0 +1,309 @@
+import calendar
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+from probes import PROBES
+from tickstore import TICK_DTYPE
+from bars import BAR_FIELDS
+
+# ---------------------------------------------------------
+# ティック・足のアーカイブ (追記専用の列データ、銘柄 × 日ごとのファイル)
+#   data/ticks/USD_JPY/2024-05-01.ticks   TICK_DTYPE のレコードを並べただけ
+#   data/ticks/USD_JPY/2024-05-01.idx     疎な時刻索引 (INDEX_STRIDE 件ごとの ts)
+#   data/bars/USD_JPY/1m/2024-05-01.bars  BAR_DTYPE (確定足のみ)
+# 読み出しはファイルを memmap し、索引で絞ってから二分探索で切り出す。
+# 書き込みは専用スレッドがまとめて行い、呼び出し側はキューに積むだけ。
+# 日付の区切りは UTC。
+# ---------------------------------------------------------
+ARCHIVE_DIR = "data"
+BAR_DTYPE = np.dtype([(f, 'f8') for f in BAR_FIELDS])
+INDEX_DTYPE = np.dtype([('ts', 'f8'), ('row', 'i8')])
+INDEX_STRIDE = 4096    # 索引を打つ間隔 (レコード数)
+FLUSH_INTERVAL = 1.0   # 書き込みスレッドが溜まった分を書き出す間隔 (秒)
+FLUSH_RECORDS = 65536  # これだけ溜まったら間隔を待たずに書き出す
+MAX_OPEN_FILES = 64    # 開きっぱなしにするファイル数の上限
+DAY = 86400
+
+
+def day_name(day):
+    """エポック日数 -> 'YYYY-MM-DD' (UTC)"""
+    return time.strftime("%Y-%m-%d", time.gmtime(day * DAY))
+
+
+class _DayFile:
+    """1ファイル分の追記先 (レコード数と最終時刻を覚えておく)"""
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = dtype
+        self.f = open(path, "ab")
+        size = os.path.getsize(path)
+        self.count = size // dtype.itemsize
+        if size % dtype.itemsize:
+            # 前回の書きかけレコードは切り捨てる
+            self.f.truncate(self.count * dtype.itemsize)
+        self.last_ts = -np.inf
+        if self.count:
+            self.last_ts = float(np.memmap(path, dtype=dtype, mode="r", offset=(self.count - 1) * dtype.itemsize,
+                                           shape=(1,))['ts'][0])
+        self.index = open(os.path.splitext(path)[0] + ".idx", "ab")
+
+    def write(self, records):
+        """時刻順のレコードを追記する (最終時刻より古いものは捨てる)。書いた件数を返す"""
+        if records['ts'][0] < self.last_ts:
+            records = records[records['ts'] >= self.last_ts]
+            if not len(records):
+                return 0
+        start, n = self.count, len(records)
+        # INDEX_STRIDE の倍数の行番号ごとに (ts, 行) を索引へ
+        first = -(-start // INDEX_STRIDE) * INDEX_STRIDE
+        rows = np.arange(first, start + n, INDEX_STRIDE)
+        if len(rows):
+            marks = np.empty(len(rows), dtype=INDEX_DTYPE)
+            marks['row'] = rows
+            marks['ts'] = records['ts'][rows - start]
+            self.index.write(marks.tobytes())
+        self.f.write(records.tobytes())
+        self.count += n
+        self.last_ts = float(records['ts'][-1])
+        return n
+
+    def flush(self):
+        self.f.flush()
+        self.index.flush()
+
+    def close(self):
+        self.f.close()
+        self.index.close()
+
+
+class ArchiveWriter:
+    """アーカイブへの書き込みスレッド
+
+    append_*() はワーカースレッドから呼ばれ、キューに積むだけで返る。
+    書き込みスレッドは FLUSH_INTERVAL ごと (または FLUSH_RECORDS 件溜まったら)
+    銘柄 × 日ごとにまとめて1回の write で書き出す。
+    """
+    def __init__(self, root):
+        self.root = root
+        self._queue = deque()   # (種類, 銘柄, 時間足, レコード配列)
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._files = OrderedDict()  # path -> _DayFile (LRU)
+        self.written = 0
+        self.skipped = 0
+        self.flushes = 0
+        self._thread = threading.Thread(target=self._run, name="archive", daemon=True)
+        self._thread.start()
+
+    # --- 呼び出し側 (ブロックしない) ---
+    def _put(self, kind, symbols, tf, records):
+        """records の各行を symbols の同じ位置の銘柄として積む"""
+        with self._cond:
+            self._queue.append((kind, symbols, tf, records))
+            self._queued += len(records)
+            if self._queued >= FLUSH_RECORDS:
+                self._cond.notify()
+
+    def append_ticks(self, symbols, ts, bid, ask, high, low, volume):
+        """1回分の取得結果 (銘柄ごとに1ティック) をまとめて積む"""
+        rec = np.empty(len(symbols), dtype=TICK_DTYPE)
+        rec['ts'] = ts
+        rec['bid'], rec['ask'], rec['high'], rec['low'], rec['volume'] = bid, ask, high, low, volume
+        self._put("ticks", list(symbols), None, rec)
+
+    def append_tick(self, symbol, ts, bid, ask, high=0.0, low=0.0, volume=0.0):
+        rec = np.empty(1, dtype=TICK_DTYPE)
+        rec[0] = (ts, bid, ask, high, low, volume)
+        self._put("ticks", [symbol], None, rec)
+
+    def append_bar(self, symbol, tf, bar):
+        rec = np.empty(1, dtype=BAR_DTYPE)
+        rec[0] = tuple(bar)
+        self._put("bars", [symbol], tf, rec)
+
+    # --- 書き込みスレッド ---
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped and self._queued < FLUSH_RECORDS:
+                    self._cond.wait(FLUSH_INTERVAL)
+                items, self._queue = self._queue, deque()
+                self._queued = 0
+                stopped = self._stopped
+            if items:
+                self._write(items)
+            if stopped:
+                for f in self._files.values():
+                    f.close()
+                self._files.clear()
+                return
+
+    def _write(self, items):
+        t0 = PROBES.now()
+        batches = {}
+        for kind, symbols, tf, rec in items:
+            syms, recs = batches.setdefault((kind, tf), ([], []))
+            syms.extend(symbols)
+            recs.append(rec)
+        groups = []
+        for (kind, tf), (syms, recs) in batches.items():
+            # 銘柄ごとに並べ替えて切り分ける (同じ銘柄の中では到着順を保つ)
+            syms = np.array(syms)
+            recs = np.concatenate(recs)
+            order = np.argsort(syms, kind="stable")
+            syms, recs = syms[order], recs[order]
+            cuts = np.flatnonzero(syms[1:] != syms[:-1]) + 1
+            for start, chunk in zip(np.r_[0, cuts].tolist(), np.split(recs, cuts)):
+                groups.append((kind, str(syms[start]), tf, chunk))
+        for kind, symbol, tf, records in groups:
+            days = (records['ts'] // DAY).astype(np.int64)
+            # 日をまたぐ場合はファイルごとに分ける (ts は概ね昇順なので境界で切るだけ)
+            order = np.argsort(records['ts'], kind="stable")
+            records, days = records[order], days[order]
+            cuts = np.flatnonzero(np.diff(days)) + 1
+            for chunk, day in zip(np.split(records, cuts), days[np.r_[0, cuts]].tolist()):
+                path = self.path(kind, symbol, tf, day)
+                f = self._open(path, TICK_DTYPE if kind == "ticks" else BAR_DTYPE)
+                n = f.write(chunk)
+                self.written += n
+                self.skipped += len(chunk) - n
+        for f in self._files.values():
+            f.flush()
+        self.flushes += 1
+        PROBES.record("archive_flush", t0)
+
+    def path(self, kind, symbol, tf, day):
+        parts = [self.root, kind, symbol] + ([tf] if tf else [])
+        return os.path.join(*parts, f"{day_name(day)}.{kind}")
+
+    def _open(self, path, dtype):
+        f = self._files.get(path)
+        if f is not None:
+            self._files.move_to_end(path)
+            return f
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = self._files[path] = _DayFile(path, dtype)
+        while len(self._files) > MAX_OPEN_FILES:
+            _, old = self._files.popitem(last=False)
+            old.close()
+        return f
+
+    def close(self, timeout=None):
+        """残りを書き出してスレッドを終了する"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {'archived': self.written, 'archive_skipped': self.skipped,
+                'archive_queued': self._queued, 'archive_flushes': self.flushes}
+
+
+class Archive:
+    """アーカイブの読み出し (memmap + 疎な索引) と書き込みの窓口"""
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.writer = ArchiveWriter(root)
+
+    def close(self, timeout=None):
+        self.writer.close(timeout)
+
+    # --- 読み出し ---
+    def symbols(self, kind="ticks"):
+        path = os.path.join(self.root, kind)
+        return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+    def days(self, kind, symbol, tf=None):
+        """保存されている日 (エポック日数) の一覧"""
+        parts = [self.root, kind, symbol] + ([tf] if tf else [])
+        path = os.path.join(*parts)
+        if not os.path.isdir(path):
+            return []
+        suffix = f".{kind}"
+        names = [n[:-len(suffix)] for n in os.listdir(path) if n.endswith(suffix)]
+        return sorted(calendar.timegm(time.strptime(n, "%Y-%m-%d")) // DAY for n in names)
+
+    @staticmethod
+    def _map(path, dtype):
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        n = size // dtype.itemsize
+        if not n:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+
+    def _slice(self, path, dtype, start, end):
+        """1ファイルから [start, end) の時刻範囲を切り出す (memmap のビュー)"""
+        data = self._map(path, dtype)
+        if not len(data):
+            return data
+        lo, hi = 0, len(data)
+        idx_path = os.path.splitext(path)[0] + ".idx"
+        if os.path.exists(idx_path):
+            # 索引で INDEX_STRIDE 件の区間まで絞ってから、その中だけを二分探索する
+            with open(idx_path, "rb") as f:
+                raw = f.read()
+            index = np.frombuffer(raw[:len(raw) // INDEX_DTYPE.itemsize * INDEX_DTYPE.itemsize], dtype=INDEX_DTYPE)
+            index = index[index['row'] < len(data)]  # 本体より先に書かれた索引は無視
+            if len(index):
+                i = np.searchsorted(index['ts'], start, side="left") - 1
+                j = np.searchsorted(index['ts'], end, side="left")
+                lo = int(index['row'][i]) if i >= 0 else 0
+                hi = int(index['row'][j]) + 1 if j < len(index) else len(data)
+        ts = data['ts'][lo:hi]
+        a = lo + int(np.searchsorted(ts, start, side="left"))
+        b = lo + int(np.searchsorted(ts, end, side="left"))
+        return data[a:b]
+
+    def _read(self, kind, symbol, tf, dtype, start, end):
+        first, last = int(start // DAY), int(np.ceil(end / DAY))
+        chunks = []
+        for day in range(first, last + 1):
+            path = self.writer.path(kind, symbol, tf, day)
+            if os.path.exists(path):
+                chunk = self._slice(path, dtype, start, end)
+                if len(chunk):
+                    chunks.append(chunk)
+        if not chunks:
+            return np.empty(0, dtype=dtype)
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    def read_ticks(self, symbol, start=0.0, end=np.inf):
+        """[start, end) のティック (1日以内ならコピーなしの memmap ビュー)"""
+        end = min(end, time.time() + DAY)
+        start = max(start, self._first_day("ticks", symbol) * DAY)
+        return self._read("ticks", symbol, None, TICK_DTYPE, start, end)
+
+    def read_bars(self, symbol, tf, start=0.0, end=np.inf):
+        """[start, end) の確定足を列ごとの配列で返す"""
+        end = min(end, time.time() + DAY)
+        start = max(start, self._first_day("bars", symbol, tf) * DAY)
+        data = self._read("bars", symbol, tf, BAR_DTYPE, start, end)
+        return {f: np.asarray(data[f]) for f in BAR_FIELDS}
+
+    def _first_day(self, kind, symbol, tf=None):
+        days = self.days(kind, symbol, tf)
+        return days[0] if days else int(time.time() // DAY)
+
+    # --- 書き込み (ブロックしない) ---
+    def append_frame(self, df, ts):
+        """フィードが返す (fx_df, crypto_df) のうち DataFrame 1枚分を積む"""
+        if df is None or df.empty:
+            return
+        n = len(df)
+        cols = [df[c].to_numpy(dtype=float) if c in df.columns else np.zeros(n)
+                for c in ('bid', 'ask', 'high', 'low', 'volume')]
+        self.writer.append_ticks(df['symbol'].tolist(), ts, *cols)
+
+    def append_tick(self, symbol, ts, bid, ask, high=0.0, low=0.0, volume=0.0):
+        self.writer.append_tick(symbol, ts, bid, ask, high, low, volume)
+
+    def append_bar(self, symbol, tf, bar):
+        self.writer.append_bar(symbol, tf, bar)
+
+    def stats(self):
+        return self.writer.stats()
@@ -0,0 +1,357 @@
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from orders import BUY, SELL, MARKET, Fill, OrderEngine, Position
+
+# ---------------------------------------------------------
+# バックテスト (保存済みのティック・足を再生する)
+#   python backtest.py --symbol USD_JPY --tf 1m --days 365 --strategy sma_cross
+#   python backtest.py --synthetic 525600 --grid fast=5,10,20 slow=50,100,200
+# 約定ルールはペーパートレードと同じ (買いは Ask、売りは Bid、Position.apply で損益確定)。
+#   ベクトル化: シグナル関数が各足の目標建玉を配列で返す。損益曲線は NumPy で一括計算し、
+#               売買のあった足だけ Position に通して約定一覧を作る。
+#   イベント駆動: Strategy.on_bar() が足ごとに OrderEngine へ発注する (指値・逆指値も可)。
+# パラメータ総当たりはプロセスプールで並列に回す。データは一時ディレクトリの .npy を
+# 各ワーカーが memmap で開くので、プロセス間で配列のコピーは送らない。
+# ---------------------------------------------------------
+QUOTE_FIELDS = ('ts', 'bid', 'ask', 'open', 'high', 'low', 'close')
+
+
+# ---------------------------------------------------------
+# データ
+# ---------------------------------------------------------
+def load_quotes(archive, symbol, tf="1m", start=0.0, end=np.inf, spread=None):
+    """アーカイブから再生用の配列を作る
+
+    tf=None ならティック (bid/ask をそのまま使う)、時間足なら終値を Bid とし、
+    Ask = Bid + spread とする。spread が None なら直近のティックの中央値を使う。
+    """
+    if tf is None:
+        ticks = archive.read_ticks(symbol, start, end)
+        bid = np.asarray(ticks['bid'])
+        return {'ts': np.asarray(ticks['ts']), 'bid': bid, 'ask': np.asarray(ticks['ask']),
+                'open': bid, 'high': bid, 'low': bid, 'close': bid}
+    cols = archive.read_bars(symbol, tf, start, end)
+    if spread is None:
+        spread = estimate_spread(archive, symbol)
+    return {'ts': cols['ts'], 'bid': cols['close'], 'ask': cols['close'] + spread,
+            'open': cols['open'], 'high': cols['high'], 'low': cols['low'], 'close': cols['close']}
+
+
+def estimate_spread(archive, symbol):
+    """保存済みティックの直近1日分から典型的なスプレッドを求める (無ければ 0)"""
+    days = archive.days("ticks", symbol)
+    if not days:
+        return 0.0
+    from archive import DAY
+    ticks = archive.read_ticks(symbol, days[-1] * DAY, (days[-1] + 1) * DAY)
+    return float(np.median(ticks['ask'] - ticks['bid'])) if len(ticks) else 0.0
+
+
+def synthetic_quotes(n, step=60, price=150.0, spread=0.003, volatility=0.0005, seed=None):
+    """幾何ランダムウォークの1分足 (アーカイブが無いときの検証・計測用)"""
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0.0, volatility, n)))
+    open_ = np.concatenate([[price], close[:-1]])
+    wick = np.abs(rng.normal(0.0, volatility / 2, (2, n))) * close
+    ts = time.time() - n * step + np.arange(n) * step
+    return {'ts': ts, 'bid': close, 'ask': close + spread, 'open': open_,
+            'high': np.maximum(open_, close) + wick[0], 'low': np.minimum(open_, close) - wick[1],
+            'close': close}
+
+
+def share(data, directory=None):
+    """配列を .npy に書き出し、ワーカーが memmap で開くためのパスを返す"""
+    directory = directory or tempfile.mkdtemp(prefix="backtest-")
+    paths = {}
+    for name, values in data.items():
+        paths[name] = os.path.join(directory, f"{name}.npy")
+        np.save(paths[name], np.ascontiguousarray(values, dtype=float))
+    return paths
+
+
+def open_shared(paths):
+    return {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+
+
+# ---------------------------------------------------------
+# 結果
+# ---------------------------------------------------------
+class BacktestResult:
+    """損益曲線 (足ごとの確定損益 + 評価損益) と約定一覧"""
+    def __init__(self, ts, equity, fills, params=None):
+        self.ts = ts
+        self.equity = equity
+        self.fills = fills
+        self.params = params or {}
+
+    @property
+    def pnl(self):
+        return float(self.equity[-1]) if len(self.equity) else 0.0
+
+    @property
+    def max_drawdown(self):
+        if not len(self.equity):
+            return 0.0
+        return float((np.maximum.accumulate(np.maximum(self.equity, 0.0)) - self.equity).max())
+
+    def trades(self):
+        """決済を伴った約定 (損益が確定したもの)"""
+        return [f for f in self.fills if f.realized != 0.0]
+
+    def summary(self):
+        closed = self.trades()
+        wins = sum(1 for f in closed if f.realized > 0)
+        return {**self.params, 'pnl': self.pnl, 'max_drawdown': self.max_drawdown,
+                'fills': len(self.fills), 'trades': len(closed),
+                'win_rate': wins / len(closed) * 100 if closed else None}
+
+
+# ---------------------------------------------------------
+# ベクトル化モード
+# ---------------------------------------------------------
+def run_vectorized(data, signal, qty=1.0, symbol="", **params):
+    """signal(data, **params) が返す目標建玉 (枚数の倍率) で売買する
+
+    足 i の目標は足 i の終値までの情報で決め、その足の Bid/Ask で約定させる。
+    """
+    bid = np.asarray(data['bid'], dtype=float)
+    ask = np.asarray(data['ask'], dtype=float)
+    target = np.nan_to_num(np.asarray(signal(data, **params), dtype=float)) * qty
+    delta = np.diff(target, prepend=0.0)
+    price = np.where(delta > 0, ask, bid)
+    # 現金の出入り + 建玉の評価 (買いは Bid、売りは Ask) = 確定損益 + 評価損益
+    cash = -np.cumsum(delta * price)
+    equity = cash + target * np.where(target > 0, bid, ask)
+
+    # 売買のあった足だけペーパートレードと同じ Position で約定一覧を作る
+    ts = np.asarray(data['ts'])
+    pos = Position(symbol)
+    fills = []
+    for n, i in enumerate(np.flatnonzero(delta).tolist(), 1):
+        side = BUY if delta[i] > 0 else SELL
+        q, p = abs(float(delta[i])), float(price[i])
+        fills.append(Fill(n, n, symbol, side, q, p, float(ts[i]), pos.apply(side, q, p)))
+    return BacktestResult(ts, equity, fills, params)
+
+
+def sma_cross(data, fast=20, slow=50):
+    """短期移動平均が長期を上回れば買い、下回れば売り (どちらかが未確定の間は建玉なし)"""
+    from indicators import SMA
+    close = {'close': data['close']}
+    diff = SMA(fast).batch(close)['value'] - SMA(slow).batch(close)['value']
+    return np.where(np.isnan(diff), 0.0, np.sign(diff))
+
+
+def breakout(data, n=20):
+    """直近 n 本の高値を終値で上抜けたら買い、安値を下抜けたら売り (次のシグナルまで保持)"""
+    from numpy.lib.stride_tricks import sliding_window_view
+    close = np.asarray(data['close'], dtype=float)
+    raw = np.zeros(len(close))
+    if len(close) > n:
+        high = sliding_window_view(np.asarray(data['high'], dtype=float), n).max(axis=1)[:-1]
+        low = sliding_window_view(np.asarray(data['low'], dtype=float), n).min(axis=1)[:-1]
+        raw[n:] = np.where(close[n:] > high, 1.0, np.where(close[n:] < low, -1.0, np.nan))
+    # シグナルの無い足は直前の向きを引き継ぐ
+    idx = np.where(np.isnan(raw), 0, np.arange(len(raw)))
+    return raw[np.maximum.accumulate(idx)]
+
+
+SIGNALS = {'sma_cross': sma_cross, 'breakout': breakout}
+
+
+# ---------------------------------------------------------
+# イベント駆動モード
+# ---------------------------------------------------------
+class _Quote:
+    """1銘柄分の RateSnapshot 互換 (OrderEngine が参照する get / in だけ持つ)"""
+    __slots__ = ('symbol', 'row')
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.row = None
+
+    def __contains__(self, symbol):
+        return symbol == self.symbol
+
+    def get(self, symbol):
+        return self.row if symbol == self.symbol else None
+
+
+class Strategy:
+    """イベント駆動の戦略。on_bar(bt, i) で bt.buy / bt.sell / bt.orders を使って発注する"""
+    def on_start(self, bt):
+        pass
+
+    def on_bar(self, bt, i):
+        raise NotImplementedError
+
+
+class SmaCross(Strategy):
+    """sma_cross と同じ売買を足ごとの逐次計算で行う (2つのモードの突き合わせ用)"""
+    def __init__(self, fast=20, slow=50):
+        from indicators import SMA
+        self.fast, self.slow = SMA(fast), SMA(slow)
+
+    def on_bar(self, bt, i):
+        c = bt.data['close'][i]
+        diff = self.fast.push(c, c, c, c)[0] - self.slow.push(c, c, c, c)[0]
+        bt.target(0.0 if diff != diff else float(np.sign(diff)))
+
+
+class Backtest:
+    """OrderEngine に1本ずつ足を流し、戦略の注文をペーパートレードと同じ規則で約定させる"""
+    def __init__(self, data, symbol="", qty=1.0):
+        self.data = data
+        self.symbol = symbol
+        self.qty = qty
+        self.now = 0.0
+        self.orders = OrderEngine(clock=lambda: self.now)
+        self.fills = []
+        self.orders.on_fill(self.fills.extend)
+        self.position = self.orders.positions[symbol] = Position(symbol)
+
+    def buy(self, qty=None, type=MARKET, price=None):
+        return self.orders.submit(self.symbol, BUY, qty or self.qty, type, price)
+
+    def sell(self, qty=None, type=MARKET, price=None):
+        return self.orders.submit(self.symbol, SELL, qty or self.qty, type, price)
+
+    def target(self, units):
+        """建玉を units * qty に合わせる (差分だけ成行で発注)"""
+        delta = units * self.qty - self.position.qty
+        if delta > 0:
+            self.buy(delta)
+        elif delta < 0:
+            self.sell(-delta)
+
+    def run(self, strategy, params=None):
+        ts = np.asarray(self.data['ts'], dtype=float)
+        quotes = np.column_stack([np.asarray(self.data['bid'], dtype=float),
+                                  np.asarray(self.data['ask'], dtype=float)])
+        equity = np.empty(len(ts))
+        quote = _Quote(self.symbol)
+        pos = self.position
+        strategy.on_start(self)
+        for i in range(len(ts)):
+            self.now = ts[i]
+            quote.row = row = quotes[i]
+            # 待機注文を新しい気配で約定させてから戦略に足を渡す
+            self.orders.on_snapshot(quote)
+            strategy.on_bar(self, i)
+            equity[i] = pos.realized + pos.unrealized(row[0], row[1])
+        return BacktestResult(ts, equity, list(self.fills), params)
+
+
+def run_events(data, strategy, qty=1.0, symbol="", params=None):
+    return Backtest(data, symbol, qty).run(strategy, params)
+
+
+# ---------------------------------------------------------
+# パラメータ総当たり
+# ---------------------------------------------------------
+_SHARED = None  # ワーカーごとの memmap (初期化時に1度だけ開く)
+
+
+def _init_worker(paths):
+    global _SHARED
+    _SHARED = open_shared(paths)
+
+
+def _run_shared(signal, qty, params):
+    return run_vectorized(_SHARED, signal, qty, **params).summary()
+
+
+def grid_params(grid):
+    """{'fast': [5, 10], 'slow': [50]} -> [{'fast': 5, 'slow': 50}, {'fast': 10, 'slow': 50}]"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def sweep(data, signal, grid, qty=1.0, processes=None):
+    """全組み合わせをベクトル化モードで回し、summary() の一覧を返す (grid の順)
+
+    signal はワーカーから import できるモジュール直下の関数であること。
+    """
+    combos = grid_params(grid)
+    processes = min(processes or os.cpu_count() or 1, len(combos))
+    if processes <= 1:
+        return [run_vectorized(data, signal, qty, **p).summary() for p in combos]
+    from concurrent.futures import ProcessPoolExecutor
+    directory = tempfile.mkdtemp(prefix="backtest-")
+    try:
+        paths = share(data, directory)
+        with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(paths,)) as pool:
+            return list(pool.map(_run_shared, itertools.repeat(signal), itertools.repeat(qty), combos,
+                                 chunksize=max(1, len(combos) // (processes * 4))))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def parse_grid(items):
+    """["fast=5,10", "slow=50"] -> {'fast': [5, 10], 'slow': [50]}"""
+    grid = {}
+    for item in items:
+        name, _, values = item.partition("=")
+        grid[name] = [float(v) if "." in v else int(v) for v in values.split(",") if v]
+    return grid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest strategies against archived ticks or bars")
+    parser.add_argument("--archive", default="data", help="archive directory written by the app")
+    parser.add_argument("--symbol", default="USD_JPY")
+    parser.add_argument("--tf", default="1m", help="bar timeframe, or 'tick' to replay raw ticks")
+    parser.add_argument("--days", type=float, default=365)
+    parser.add_argument("--spread", type=float, default=None, help="ask - bid for bar data (default: from ticks)")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="use N synthetic 1-minute bars instead")
+    parser.add_argument("--strategy", choices=sorted(SIGNALS), default="sma_cross")
+    parser.add_argument("--grid", nargs="*", default=[], metavar="NAME=V1,V2", help="parameter grid to sweep")
+    parser.add_argument("--qty", type=float, default=10000)
+    parser.add_argument("--mode", choices=("vector", "event"), default="vector")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        data = synthetic_quotes(args.synthetic, seed=0)
+    else:
+        from archive import Archive, DAY
+        archive = Archive(args.archive)
+        tf = None if args.tf == "tick" else args.tf
+        data = load_quotes(archive, args.symbol, tf, time.time() - args.days * DAY, spread=args.spread)
+        archive.close()
+    print(f"loaded {len(data['ts'])} rows in {time.perf_counter() - t0:.2f}s")
+    if not len(data['ts']):
+        return
+
+    signal = SIGNALS[args.strategy]
+    t0 = time.perf_counter()
+    if args.mode == "event":
+        if signal is not sma_cross:
+            parser.error("event mode is only available for sma_cross")
+        # ベクトル化モードと同じ組み合わせ・同じ列で出す (grid 無しなら既定値の1回)
+        results = [run_events(data, SmaCross(**p), args.qty, args.symbol, params=p).summary()
+                   for p in grid_params(parse_grid(args.grid))]
+    elif args.grid:
+        results = sweep(data, signal, parse_grid(args.grid), args.qty, args.processes)
+    else:
+        results = [run_vectorized(data, signal, args.qty, args.symbol).summary()]
+    if args.grid:
+        results.sort(key=lambda r: r['pnl'], reverse=True)
+    elapsed = time.perf_counter() - t0
+    for r in results:
+        print("  ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in r.items()))
+    print(f"{len(results)} run(s) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import threading
+import time
+import numpy as np
+
+# ---------------------------------------------------------
+# 足 (OHLC) 集計エンジン
+# ---------------------------------------------------------
+TIMEFRAMES = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': 86400}
+BAR_FIELDS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+LOD_FACTOR = 4  # ピラミッド1段あたりの集約本数
+
+
+class BarSeries:
+    """確定足を列ごとの配列で保持する (容量は倍々で拡張)"""
+    def __init__(self, capacity=1024):
+        self._cols = {f: np.empty(capacity) for f in BAR_FIELDS}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, ts, o, h, l, c, v):
+        if self._size == len(self._cols['ts']):
+            self._grow()
+        i = self._size
+        cols = self._cols
+        cols['ts'][i] = ts
+        cols['open'][i] = o
+        cols['high'][i] = h
+        cols['low'][i] = l
+        cols['close'][i] = c
+        cols['volume'][i] = v
+        self._size += 1
+
+    def extend(self, cols):
+        """列ごとの配列をまとめて追記する"""
+        n = len(cols['ts'])
+        while self._size + n > len(self._cols['ts']):
+            self._grow()
+        for f in BAR_FIELDS:
+            self._cols[f][self._size:self._size + n] = cols[f]
+        self._size += n
+
+    def _grow(self):
+        for f, arr in self._cols.items():
+            new = np.empty(len(arr) * 2)
+            new[:self._size] = arr[:self._size]
+            self._cols[f] = new
+
+    def column(self, field, n=None):
+        """列のビュー (n 指定時は直近 n 本)"""
+        start = 0 if n is None else max(0, self._size - n)
+        return self._cols[field][start:self._size]
+
+    def columns(self, n=None):
+        return {f: self.column(f, n) for f in BAR_FIELDS}
+
+
+def aggregate(cols, factor):
+    """factor 本ずつ1本にまとめる (高値は max / 安値は min で保持)"""
+    n = len(cols['ts']) // factor * factor
+    return {
+        'ts': cols['ts'][:n:factor],
+        'open': cols['open'][:n:factor],
+        'high': cols['high'][:n].reshape(-1, factor).max(axis=1),
+        'low': cols['low'][:n].reshape(-1, factor).min(axis=1),
+        'close': cols['close'][factor - 1:n:factor],
+        'volume': cols['volume'][:n].reshape(-1, factor).sum(axis=1),
+    }
+
+
+class BarPyramid:
+    """確定足の多段解像度ピラミッド
+
+    level k は基準足 factor**k 本を1本にまとめたもの。高値・安値は
+    max/min で集約するので、間引いても各ピクセル列の値幅は正しく出る。
+    確定足が増えた分だけ追加で集約する (全体の作り直しはしない)。
+    """
+    def __init__(self, series, factor=LOD_FACTOR):
+        self.series = series
+        self.factor = factor
+        self.levels = []  # level 1 以降の BarSeries
+
+    def sync(self):
+        src = self.series
+        k = 0
+        while len(src) >= self.factor * 2:
+            if k == len(self.levels):
+                self.levels.append(BarSeries())
+            dst = self.levels[k]
+            done = len(dst)
+            full = len(src) // self.factor
+            if full > done:
+                a, b = done * self.factor, full * self.factor
+                dst.extend(aggregate({f: src.column(f)[a:b] for f in BAR_FIELDS}, self.factor))
+            src = dst
+            k += 1
+
+    def window(self, start, end, max_points, tail=None):
+        """基準足の番号で [start, end) の範囲を max_points 本以下で返す
+
+        tail: 形成中の足 (ts, open, high, low, close, volume)
+        戻り値: (列ごとの配列, 1本あたりの基準足数)
+        """
+        self.sync()
+        base = self.series
+        total = len(base) + (tail is not None)
+        start = max(0, min(start, total))
+        end = max(start, min(end, total))
+        span = max(end - start, 1)
+
+        k, step = 0, 1
+        while span / step > max_points and k < len(self.levels):
+            k += 1
+            step *= self.factor
+        level = base if k == 0 else self.levels[k - 1]
+
+        g0 = start // step
+        g1 = -(-end // step)
+        full = len(level)
+        # 範囲の末尾にかかるグループ (end で途切れるもの、埋まっていない末尾・形成中の足) は
+        # end までの基準足だけから作り直す。end より後の足の高値・安値は混ぜない
+        stop = min(g1, full) if g1 * step <= end else g1 - 1
+        cols = {f: level.column(f)[g0:stop] for f in BAR_FIELDS}
+        if stop < g1:
+            rest = {f: base.column(f)[stop * step:min(end, len(base))] for f in BAR_FIELDS}
+            if tail is not None and end > len(base):
+                rest = {f: np.append(rest[f], tail[i]) for i, f in enumerate(BAR_FIELDS)}
+            if len(rest['ts']):
+                last = (rest['ts'][0], rest['open'][0], rest['high'].max(),
+                        rest['low'].min(), rest['close'][-1], rest['volume'].sum())
+                cols = {f: np.append(cols[f], last[i]) for i, f in enumerate(BAR_FIELDS)}
+        return cols, step
+
+
+class _OpenBar:
+    """形成中の足 (1ティックごとに O(1) で更新)"""
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, start, price, volume):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+
+
+class BarAggregator:
+    """ティックを各時間足の足へ逐次畳み込む
+
+    price: 足に使う価格 ('bid' / 'ask' / 'mid')
+    出来高はティック数で数える (フィードの volume は累計値のため)
+    """
+    def __init__(self, timeframes=TIMEFRAMES, price='bid', utc_offset=None):
+        self.timeframes = dict(timeframes)
+        self.price = price
+        # 日足の区切りをローカル時刻に合わせる
+        self.utc_offset = -time.timezone if utc_offset is None else utc_offset
+        self.series = {}    # (symbol, tf) -> BarSeries
+        self.pyramids = {}  # (symbol, tf) -> BarPyramid (表示時に遅延生成)
+        self.refs = {}      # (symbol, tf) -> 表示中のチャート数 (0 になったらピラミッドを捨てる)
+        self.open_bars = {} # (symbol, tf) -> _OpenBar
+        self.listeners = [] # 足の確定時に listener(symbol, tf, (ts, o, h, l, c, v)) (ロック内で呼ぶ)
+        self.lock = threading.Lock()
+
+    def _price(self, bid, ask):
+        if self.price == 'ask':
+            return ask
+        if self.price == 'mid':
+            return (bid + ask) / 2
+        return bid
+
+    def on_tick(self, symbol, ts, bid, ask):
+        price = self._price(bid, ask)
+        with self.lock:
+            for tf, sec in self.timeframes.items():
+                self._fold(symbol, tf, sec, ts, price)
+
+    def _fold(self, symbol, tf, sec, ts, price):
+        key = (symbol, tf)
+        local = ts + self.utc_offset
+        start = local - local % sec - self.utc_offset
+        bar = self.open_bars.get(key)
+        if bar is None:
+            self.open_bars[key] = _OpenBar(start, price, 1)
+            return
+        if start > bar.start:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = BarSeries()
+            series.append(bar.start, bar.open, bar.high, bar.low, bar.close, bar.volume)
+            self.open_bars[key] = _OpenBar(start, price, 1)
+            for listener in self.listeners:
+                listener(symbol, tf, (bar.start, bar.open, bar.high, bar.low, bar.close, bar.volume))
+            return
+        # 古いティック (順序逆転) は形成中の足に含めない
+        if start < bar.start:
+            return
+        if price > bar.high: bar.high = price
+        if price < bar.low: bar.low = price
+        bar.close = price
+        bar.volume += 1
+
+    def seed(self, symbol, tf, cols):
+        """保存済みの確定足を履歴として読み込む (まだ足が無い銘柄・時間足のみ)"""
+        key = (symbol, tf)
+        with self.lock:
+            if self.series.get(key) or key in self.open_bars or not len(cols['ts']):
+                return False
+            series = self.series[key] = BarSeries()
+            series.extend(cols)
+            return True
+
+    def acquire(self, symbol, tf):
+        """チャートが (symbol, tf) を表示し始める"""
+        key = (symbol, tf)
+        with self.lock:
+            self.refs[key] = self.refs.get(key, 0) + 1
+
+    def release(self, symbol, tf):
+        """チャートが表示をやめる。誰も見なくなったら表示用のピラミッドを捨てて True を返す"""
+        key = (symbol, tf)
+        with self.lock:
+            n = self.refs.get(key, 0) - 1
+            if n > 0:
+                self.refs[key] = n
+                return False
+            self.refs.pop(key, None)
+            self.pyramids.pop(key, None)
+            return True
+
+    def update_frame(self, df, ts):
+        """フィードが返す (fx_df, crypto_df) のうち DataFrame 1枚分を畳み込む"""
+        if df is None or df.empty:
+            return
+        symbols = df['symbol'].to_numpy()
+        bids = df['bid'].to_numpy(dtype=float)
+        asks = df['ask'].to_numpy(dtype=float)
+        for i in range(len(symbols)):
+            self.on_tick(symbols[i], ts, bids[i], asks[i])
+
+    def bars(self, symbol, tf, n=None, include_open=True):
+        """確定足 (+形成中の足) を列ごとの配列で返す"""
+        with self.lock:
+            series = self.series.get((symbol, tf))
+            bar = self.open_bars.get((symbol, tf)) if include_open else None
+            cols = series.columns(n) if series else {f: np.empty(0) for f in BAR_FIELDS}
+            if bar is None:
+                return cols
+            tail = np.array([bar.start, bar.open, bar.high, bar.low, bar.close, bar.volume])
+            if n is not None:
+                cols = {f: c[-(n - 1):] if n > 1 else c[:0] for f, c in cols.items()}
+            return {f: np.append(cols[f], tail[i]) for i, f in enumerate(BAR_FIELDS)}
+
+    def tail(self, symbol, tf, start):
+        """start 本目以降の確定足 (ビュー) と形成中の足 (無ければ None) をまとめて返す"""
+        with self.lock:
+            series = self.series.get((symbol, tf))
+            cols = {f: series.column(f)[start:] if series else np.empty(0) for f in BAR_FIELDS}
+            bar = self.open_bars.get((symbol, tf))
+            tail = None if bar is None else (bar.start, bar.open, bar.high, bar.low, bar.close, bar.volume)
+            return cols, tail
+
+    def count(self, symbol, tf, include_open=True):
+        """足の本数 (形成中の足を含む)"""
+        with self.lock:
+            series = self.series.get((symbol, tf))
+            n = len(series) if series else 0
+            return n + (include_open and (symbol, tf) in self.open_bars)
+
+    def window(self, symbol, tf, start, end, max_points, include_open=True):
+        """ズーム・スクロール用: 範囲内の足を max_points 本以下に間引いて返す"""
+        key = (symbol, tf)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = BarSeries()
+            pyramid = self.pyramids.get(key)
+            if pyramid is None or pyramid.series is not series:
+                pyramid = self.pyramids[key] = BarPyramid(series)
+            bar = self.open_bars.get(key) if include_open else None
+            tail = None if bar is None else (bar.start, bar.open, bar.high, bar.low, bar.close, bar.volume)
+            return pyramid.window(start, end, max_points, tail)
+
+    def to_frame(self, symbol, tf, n=100, include_open=True):
+        """mplfinance 用の DataFrame (直近 n 本のみ生成する)"""
+        import pandas as pd
+        cols = self.bars(symbol, tf, n, include_open)
+        index = pd.to_datetime(cols['ts'], unit='s', utc=True).tz_convert(None) \
+            + pd.Timedelta(seconds=self.utc_offset)
+        return pd.DataFrame({
+            'Open': cols['open'], 'High': cols['high'], 'Low': cols['low'],
+            'Close': cols['close'], 'Volume': cols['volume']
+        }, index=pd.DatetimeIndex(index))
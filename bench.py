@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# ---------------------------------------------------------
+# ベンチマーク (オフライン・合成フィード)
+#   python bench.py --symbols 500 --rate 20 --out bench_results.json
+#   DISPLAY が無い環境では自動的にヘッドレス経路で計測する
+#   (Tk で計測したい場合は xvfb-run python bench.py)
+# ---------------------------------------------------------
+
+
+def summarize(samples_ms):
+    """p50 / p99 / max / 平均 (ミリ秒)"""
+    import numpy as np
+    if not samples_ms:
+        return {'count': 0}
+    a = np.asarray(samples_ms)
+    return {
+        'count': int(a.size), 'mean_ms': float(a.mean()),
+        'p50_ms': float(np.percentile(a, 50)), 'p99_ms': float(np.percentile(a, 99)),
+        'max_ms': float(a.max()),
+    }
+
+
+def peak_rss_mb():
+    """最大常駐メモリ (MB)。取得できない環境では None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS は byte 単位
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def make_engine(feed, rate):
+    """合成フィードで動くエンジン。取得開始時刻をスナップショットに記録する"""
+    from engine import DataEngine
+
+    def fetch():
+        last_fetch[0] = time.perf_counter()
+        return feed.fetch()
+
+    last_fetch = [0.0]
+    engine = DataEngine(fetch=fetch, interval=1.0 / rate)
+    # 購読者は取得と同じワーカースレッドで呼ばれるので、直前の取得時刻を貼り付ける
+    engine.subscribe(lambda snap: setattr(snap, 'fetch_t', last_fetch[0]))
+    return engine
+
+
+def watch_pairs(feed):
+    return [s.replace("_", "/") for s in feed.symbols] + ["BTC/USD"]
+
+
+# ---------------------------------------------------------
+# Tk 経路 (fetch → after(0) → TradeView.update_table → _set_text)
+# ---------------------------------------------------------
+def bench_tk(feed, args):
+    import tkinter as tk
+    from main import TradeView
+    from feed import LatestDispatcher
+
+    root = tk.Tk()
+    root.geometry("1280x800")
+    view = TradeView(root)
+    view.pack(fill="both", expand=True)
+    view.set_watchlist(watch_pairs(feed))
+    root.update()
+
+    # 1. ティック → ラベル反映までの遅延
+    latencies = []
+
+    def on_value(snap):
+        view.update_table(snap)
+        root.update_idletasks()  # ラベルの再描画まで含める
+        latencies.append((time.perf_counter() - snap.fetch_t) * 1000)
+
+    engine = make_engine(feed, args.rate)
+    dispatcher = LatestDispatcher(lambda fn: root.after(0, fn), on_value)
+    engine.subscribe(dispatcher.publish)
+    engine.start()
+    root.after(int(args.duration * 1000), root.quit)
+    root.mainloop()
+    engine.stop(timeout=5)
+
+    # 2. update_table 単体のスループット
+    snaps = [engine.ingest(*feed.fetch(), time.time()) for _ in range(2)]
+    times = []
+    for i in range(args.iterations):
+        t = time.perf_counter()
+        view.update_table(snaps[i % 2])
+        root.update_idletasks()
+        times.append((time.perf_counter() - t) * 1000)
+    root.destroy()
+    return {
+        'tick_to_label': summarize(latencies),
+        'update_table': dict(summarize(times), per_sec=len(times) / (sum(times) / 1000)),
+        'feed': dispatcher_stats(engine, dispatcher),
+    }
+
+
+# ---------------------------------------------------------
+# ヘッドレス経路 (Tk の代わりにキューを UI スレッドとして使う)
+# ---------------------------------------------------------
+def bench_headless(feed, args):
+    from feed import LatestDispatcher
+    from render import TextCells, render_rate_rows
+
+    pairs = watch_pairs(feed)
+    symbols = [p.replace("/", "_") for p in pairs]
+    formats = ["{:,.3f}"] * len(pairs)
+    # RateGrid._render と同じ関数で全行を書く (Canvas の代わりに何もしない write)
+    cells = TextCells(lambda key, text: None)
+    slots = [[(r, c) for c in range(5)] for r in range(len(pairs))]
+
+    def update_table(snap):
+        render_rate_rows(cells, snap, pairs, symbols, formats, 0, slots)
+
+    latencies = []
+    ui_queue = queue.Queue()
+
+    def on_value(snap):
+        update_table(snap)
+        latencies.append((time.perf_counter() - snap.fetch_t) * 1000)
+
+    engine = make_engine(feed, args.rate)
+    dispatcher = LatestDispatcher(ui_queue.put, on_value)
+    engine.subscribe(dispatcher.publish)
+    engine.start()
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        try:
+            ui_queue.get(timeout=0.05)()
+        except queue.Empty:
+            pass
+    engine.stop(timeout=5)
+
+    snaps = [engine.ingest(*feed.fetch(), time.time()) for _ in range(2)]
+    times = []
+    for i in range(args.iterations):
+        t = time.perf_counter()
+        update_table(snaps[i % 2])
+        times.append((time.perf_counter() - t) * 1000)
+    return {
+        'tick_to_label': summarize(latencies),
+        'update_table': dict(summarize(times), per_sec=len(times) / (sum(times) / 1000)),
+        'feed': dispatcher_stats(engine, dispatcher),
+    }
+
+
+def dispatcher_stats(engine, dispatcher):
+    stats = engine.stats()
+    stats.update(ui_delivered=dispatcher.delivered, ui_coalesced=dispatcher.coalesced,
+                 ui_dropped=dispatcher.dropped)
+    return stats
+
+
+# ---------------------------------------------------------
+# チャート描画 (ChartView と同じ ChartRenderer を直接呼ぶ)
+# ---------------------------------------------------------
+def bench_chart(feed, args):
+    from bars import BarAggregator
+    from chart import ChartRenderer
+
+    bars = BarAggregator()
+    symbol = feed.fx_symbols[0]
+    t0 = time.time() - args.chart_bars * 60
+    for i in range(args.chart_bars * 6):
+        fd, _ = feed.fetch()
+        bars.update_frame(fd, t0 + i * 10)
+
+    renderer = ChartRenderer("#e74c3c", "#3498db")
+    full, live = [], []
+    width, height = 1000, 600
+    for i in range(args.chart_iterations):
+        cols, _ = bars.window(symbol, "1m", -10**9, 10**9, width // 4)
+        renderer.invalidate()
+        t = time.perf_counter()
+        renderer.render(cols, width, height)
+        full.append((time.perf_counter() - t) * 1000)
+        # 形成中の足だけ動かした部分更新 (ブリッティング)
+        cols['close'][-1] *= 1.0001
+        t = time.perf_counter()
+        renderer.render(cols, width, height)
+        live.append((time.perf_counter() - t) * 1000)
+    return {'draw_chart_full': summarize(full), 'draw_chart_live': summarize(live)}
+
+
+def has_display():
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        return False
+    try:
+        import tkinter as tk
+        tk.Tk().destroy()
+        return True
+    except Exception:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark with a synthetic feed")
+    parser.add_argument("--symbols", type=int, default=500, help="number of instruments (half FX, half crypto)")
+    parser.add_argument("--rate", type=float, default=10.0, help="feed polls per second")
+    parser.add_argument("--volatility", type=float, default=0.0002, help="per-tick log-return stdev")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of live feed for latency")
+    parser.add_argument("--iterations", type=int, default=200, help="update_table iterations")
+    parser.add_argument("--chart-bars", type=int, default=300, help="bars in the chart benchmark")
+    parser.add_argument("--chart-iterations", type=int, default=20, help="chart render iterations")
+    parser.add_argument("--headless", action="store_true", help="skip Tk even if a display is available")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json", help="JSON output path ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    from engine import SyntheticFeed
+    n_fx = args.symbols // 2
+    feed = SyntheticFeed(n_fx=n_fx, n_crypto=args.symbols - n_fx,
+                         volatility=args.volatility, seed=args.seed)
+
+    mode = "headless" if args.headless or not has_display() else "tk"
+    results = bench_tk(feed, args) if mode == "tk" else bench_headless(feed, args)
+    results.update(bench_chart(feed, args))
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'revision': git_revision(),
+        'mode': mode,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {k: v for k, v in vars(args).items() if k != "out"},
+        'results': results,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w") as f:
+            f.write(text)
+        print(f"Benchmark ({mode}) written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba
+from matplotlib.lines import Line2D
+from matplotlib.patches import Rectangle
+from matplotlib.ticker import FuncFormatter, MaxNLocator
+
+# ---------------------------------------------------------
+# ローソク足チャート (図は1枚を使い回す)
+# ---------------------------------------------------------
+CHART_BG = "#0a0a23"
+CHART_GRID = "#444"
+BODY_WIDTH = 0.6
+LINE_COLORS = ("#f1c40f", "#9b59b6", "#1abc9c", "#e67e22", "#ecf0f1", "#e84393")
+PLOT_RECT = (0.03, 0.07, 0.89, 0.90)  # 左, 下, 幅, 高さ (図に対する比率)
+PANE_HEIGHT = 0.18                    # 指標の別枠1つあたりの高さ
+PANE_GAP = 0.02
+RENDERER_CACHE = 6  # 保持する図 (Figure + キャンバス) の上限 (表示中 + 待機中)
+
+
+class CandleChart:
+    """1枚の Figure 上でローソク足を描画する
+
+    確定足はコレクション2つ (ヒゲ / 実体) にまとめ、データの差し替えは
+    set_segments / set_verts で行う。形成中の最後の足だけは animated な
+    アーティストにして、ブリッティングで部分更新する。
+    バックエンドに依存しないので Agg キャンバスでも Tk キャンバスでも使える。
+    """
+    def __init__(self, up_color, down_color, figsize=(10, 6), dpi=100):
+        self.up_color = up_color
+        self.down_color = down_color
+        self.fig = Figure(figsize=figsize, dpi=dpi, facecolor=CHART_BG)
+        self.ax = self.fig.add_subplot(111)
+        self._style_axes()
+
+        self.wicks = LineCollection([], linewidths=1)
+        self.bodies = PolyCollection([], linewidths=0)
+        self.ax.add_collection(self.wicks)
+        self.ax.add_collection(self.bodies)
+        self.live_wick = Line2D([], [], linewidth=1, animated=True)
+        self.live_body = Rectangle((0, 0), BODY_WIDTH, 0, linewidth=0, animated=True)
+        self.ax.add_line(self.live_wick)
+        self.ax.add_patch(self.live_body)
+        self.message = self.ax.text(0.5, 0.5, "", transform=self.ax.transAxes,
+                                    ha="center", va="center", color="#888")
+
+        # 指標の線: 表示名 -> (軸, 確定足ぶんの線, 形成中の足の区間 (animated))
+        self.lines = {}
+        self.panes = {}  # 別枠名 -> 軸 (指標を外しても再利用する)
+        self.pane_order = ()
+
+        self.ts = np.empty(0)
+        self.time_format = "%H:%M"
+        self.background = None
+        self._canvas = None
+
+    def _style_axes(self):
+        ax = self.ax
+        ax.set_facecolor(CHART_BG)
+        ax.grid(True, linestyle=":", color=CHART_GRID)
+        ax.tick_params(colors="#ccc", labelsize=8)
+        for spine in ax.spines.values():
+            spine.set_color(CHART_GRID)
+        ax.yaxis.tick_right()
+        ax.xaxis.set_major_locator(MaxNLocator(8, integer=True))
+        ax.xaxis.set_major_formatter(FuncFormatter(self._format_time))
+        ax.set_position(PLOT_RECT)
+
+    def _format_time(self, x, pos=None):
+        i = int(round(x))
+        if 0 <= i < len(self.ts):
+            return datetime.fromtimestamp(self.ts[i]).strftime(self.time_format)
+        return ""
+
+    # --- キャンバス連携 ---
+    def attach(self, canvas):
+        """描画のたびに背景を保存し、ブリッティングに使う"""
+        self._canvas = canvas
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self.background = self._canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_live()
+
+    def _draw_live(self):
+        self.ax.draw_artist(self.live_wick)
+        self.ax.draw_artist(self.live_body)
+        for ax, _, live in self.lines.values():
+            ax.draw_artist(live)
+
+    def resize(self, width_px, height_px):
+        """図を作り直さずにサイズだけ変える"""
+        dpi = self.fig.dpi
+        self.fig.set_size_inches(max(width_px, 1) / dpi, max(height_px, 1) / dpi, forward=False)
+        self.background = None
+
+    # --- データ ---
+    def needs_full_redraw(self, cols, series=()):
+        """確定足の増減・最新足や指標の値域はみ出しがあれば全体再描画が必要"""
+        ts = cols['ts']
+        if len(ts) != len(self.ts) or not len(ts) or ts[0] != self.ts[0] or ts[-1] != self.ts[-1]:
+            return True
+        if [label for label, _, _ in series] != list(self.lines):
+            return True
+        lo, hi = self.ax.get_ylim()
+        if cols['low'][-1] < lo or cols['high'][-1] > hi or self.background is None:
+            return True
+        for label, _, values in series:
+            v = values[-1]
+            lo, hi = self.lines[label][0].get_ylim()
+            if not np.isnan(v) and not lo <= v <= hi:
+                return True
+        return False
+
+    def set_bars(self, cols, time_format="%H:%M", series=()):
+        """全足を差し替える (最後の1本は形成中の足として扱う)
+
+        series: 指標 [(表示名, 別枠名 (None = ローソク足の軸), 値の配列), ...]
+        """
+        ts = cols['ts']
+        n = len(ts)
+        self.ts = np.array(ts)
+        self.time_format = time_format
+        self._set_series(series, n)
+        if n == 0:
+            self.wicks.set_segments([])
+            self.bodies.set_verts([])
+            self.live_wick.set_data([], [])
+            self.live_body.set_height(0)
+            self.message.set_text("Waiting for data...")  # 既定フォントに日本語グリフが無いため英語表記
+            return
+        self.message.set_text("")
+
+        o, h, l, c = (np.asarray(cols[f][:n - 1]) for f in ('open', 'high', 'low', 'close'))
+        x = np.arange(n - 1, dtype=float)
+        up = c >= o
+        colors = np.where(up[:, None], self._rgba(self.up_color), self._rgba(self.down_color))
+
+        segs = np.empty((n - 1, 2, 2))
+        segs[:, 0, 0] = segs[:, 1, 0] = x
+        segs[:, 0, 1] = l
+        segs[:, 1, 1] = h
+        self.wicks.set_segments(segs)
+        self.wicks.set_colors(colors)
+
+        half = BODY_WIDTH / 2
+        verts = np.empty((n - 1, 4, 2))
+        verts[:, 0, 0] = verts[:, 1, 0] = x - half
+        verts[:, 2, 0] = verts[:, 3, 0] = x + half
+        verts[:, 0, 1] = verts[:, 3, 1] = o
+        verts[:, 1, 1] = verts[:, 2, 1] = c
+        self.bodies.set_verts(verts)
+        self.bodies.set_facecolors(colors)
+
+        self._set_live(n - 1, cols['open'][-1], cols['high'][-1], cols['low'][-1], cols['close'][-1])
+
+        self.ax.set_xlim(-1, n)
+        self._fit_y(self.ax, [cols['low'], cols['high']] +
+                    [v for _, pane, v in series if pane is None])
+        for pane, ax in self.panes.items():
+            if ax.get_visible():
+                self._fit_y(ax, [v for _, p, v in series if p == pane])
+
+    @staticmethod
+    def _fit_y(ax, arrays):
+        values = np.concatenate([np.asarray(a, dtype=float) for a in arrays]) if arrays else np.empty(0)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        lo, hi = float(values.min()), float(values.max())
+        pad = (hi - lo) * 0.05 or abs(hi) * 0.001 or 1.0
+        ax.set_ylim(lo - pad, hi + pad)
+
+    def set_last(self, cols, series=()):
+        """形成中の足 (と指標の末尾の区間) だけを更新する"""
+        i = len(cols['ts']) - 1
+        self._set_live(i, cols['open'][i], cols['high'][i], cols['low'][i], cols['close'][i])
+        for label, _, values in series:
+            if i:
+                self.lines[label][2].set_data([i - 1, i], values[-2:])
+            else:
+                self.lines[label][2].set_data([0, 0], [values[-1]] * 2)
+
+    # --- 指標 ---
+    def _layout(self, panes):
+        """別枠の数に合わせて軸を縦に並べる"""
+        if panes == self.pane_order:
+            return
+        left, bottom, width, height = PLOT_RECT
+        step = PANE_HEIGHT + PANE_GAP
+        for name in panes:
+            if name not in self.panes:
+                ax = self.fig.add_axes(PLOT_RECT, sharex=self.ax)
+                ax.set_facecolor(CHART_BG)
+                ax.grid(True, linestyle=":", color=CHART_GRID)
+                ax.tick_params(colors="#ccc", labelsize=8)
+                for spine in ax.spines.values():
+                    spine.set_color(CHART_GRID)
+                ax.yaxis.tick_right()
+                ax.text(0.01, 0.95, name, transform=ax.transAxes, va="top", color="#888", fontsize=8)
+                self.panes[name] = ax
+        for name, ax in self.panes.items():
+            ax.set_visible(name in panes)
+        for i, name in enumerate(panes):
+            pane = self.panes[name]
+            pane.set_position((left, bottom + (len(panes) - 1 - i) * step, width, PANE_HEIGHT))
+            pane.tick_params(labelbottom=i == len(panes) - 1)
+        self.ax.set_position((left, bottom + len(panes) * step, width, height - len(panes) * step))
+        self.ax.tick_params(labelbottom=not panes)
+        self.pane_order = panes
+
+    def _set_series(self, series, n):
+        panes = tuple(dict.fromkeys(pane for _, pane, _ in series if pane is not None))
+        self._layout(panes)
+        wanted = [label for label, _, _ in series]
+        for label in [l for l in self.lines if l not in wanted]:
+            _, line, live = self.lines.pop(label)
+            line.remove()
+            live.remove()
+        x = np.arange(n, dtype=float)
+        for k, (label, pane, values) in enumerate(series):
+            if label not in self.lines:
+                ax = self.ax if pane is None else self.panes[pane]
+                color = LINE_COLORS[k % len(LINE_COLORS)]
+                line = Line2D([], [], linewidth=1, color=color)
+                live = Line2D([], [], linewidth=1, color=color, animated=True)
+                ax.add_line(line)
+                ax.add_line(live)
+                self.lines[label] = (ax, line, live)
+            _, line, live = self.lines[label]
+            line.set_data(x[:-1], values[:-1])
+            live.set_data(x[-2:], values[-2:])
+        # 表示順を要求順に揃える (needs_full_redraw の比較用)
+        self.lines = {label: self.lines[label] for label in wanted}
+
+    def _set_live(self, i, o, h, l, c):
+        color = self.up_color if c >= o else self.down_color
+        self.live_wick.set_data([i, i], [l, h])
+        self.live_wick.set_color(color)
+        self.live_body.set_xy((i - BODY_WIDTH / 2, min(o, c)))
+        self.live_body.set_height(abs(c - o))
+        self.live_body.set_facecolor(color)
+
+    def blit(self):
+        """保存済み背景に形成中の足だけを重ねて描く"""
+        if self._canvas is None or self.background is None:
+            return False
+        self._canvas.restore_region(self.background)
+        self._draw_live()
+        self._canvas.blit(self.fig.bbox)
+        return True
+
+    @staticmethod
+    def _rgba(color):
+        return np.array(to_rgba(color))
+
+
+class ChartRenderer:
+    """Agg キャンバス上で CandleChart を描き、RGBA バッファを返す
+
+    RenderService のワーカースレッドから呼ばれる前提。図に触るのは
+    常に1スレッドだけなので、UI スレッドとは画像バッファだけをやり取りする。
+    RendererPool で別のチャートへ渡すことがあるため、描画は lock の中で
+    行い、owner が変わった後に届いた古い描画要求は捨てる (render_for)。
+    """
+    def __init__(self, up_color, down_color):
+        self.chart = CandleChart(up_color, down_color)
+        self.canvas = FigureCanvasAgg(self.chart.fig)
+        self.chart.attach(self.canvas)
+        self.size = None
+        self.dirty = True  # True なら次回は必ず全体を描く
+        self.lock = threading.Lock()
+        self.owner = None  # 使用中のチャート
+        self.key = None    # 最後に描いた (銘柄, 時間足)
+
+    def invalidate(self):
+        self.dirty = True
+
+    def render(self, cols, width, height, time_format="%H:%M", series=()):
+        """描画して (幅, 高さ, RGBAバイト列) を返す"""
+        if (width, height) != self.size:
+            self.chart.resize(width, height)
+            self.size = (width, height)
+            self.dirty = True
+        if self.dirty or self.chart.needs_full_redraw(cols, series):
+            self.dirty = False
+            self.chart.set_bars(cols, time_format, series)
+            self.canvas.draw()
+        else:
+            # 形成中の足だけ: 保存済み背景に重ねるだけで済む (指標も末尾の区間のみ)
+            self.chart.set_last(cols, series)
+            self.chart.blit()
+        w, h = self.canvas.get_width_height()
+        return w, h, bytes(self.canvas.buffer_rgba())
+
+    def render_for(self, owner, *args):
+        """owner がまだ使用中なら描画する (手放した後の要求は None)"""
+        with self.lock:
+            if self.owner is not owner:
+                return None
+            return self.render(*args)
+
+    def close(self):
+        """図を破棄してメモリを返す"""
+        with self.lock:
+            self.owner = None
+            self.chart.fig.clear()
+            self.chart = self.canvas = None
+
+
+class RendererPool:
+    """ChartRenderer の LRU
+
+    チャートは表示中だけ描画器を借り、隠れたら返す。返された描画器は
+    (銘柄, 時間足) ごとに待機させておき、同じ銘柄を表示し直すときは
+    描画済みの状態のまま使う。上限を超えたら最も古い待機中のものを
+    別の銘柄に使い回し (Figure を作り直さない)、それも無ければ新しく作る。
+    待機中が上限からあふれた分は破棄する。UI スレッドから呼ぶ。
+    """
+    def __init__(self, up_color, down_color, capacity=RENDERER_CACHE):
+        self.up_color = up_color
+        self.down_color = down_color
+        self.capacity = capacity
+        self.idle = OrderedDict()  # 描画器 -> key (古い順)
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+
+    def acquire(self, owner, key):
+        renderer = next((r for r, k in reversed(self.idle.items()) if k == key), None)
+        if renderer is None and self.idle and self.in_use + len(self.idle) >= self.capacity:
+            renderer = next(iter(self.idle))
+        if renderer is None:
+            renderer = ChartRenderer(self.up_color, self.down_color)
+            self.created += 1
+        else:
+            del self.idle[renderer]
+            self.reused += 1
+        with renderer.lock:
+            renderer.owner = owner
+            if renderer.key != key:
+                renderer.key = key
+                renderer.dirty = True
+        self.in_use += 1
+        return renderer
+
+    def release(self, renderer):
+        with renderer.lock:
+            renderer.owner = None
+        self.in_use -= 1
+        self.idle[renderer] = renderer.key
+        while self.idle and self.in_use + len(self.idle) > self.capacity:
+            self.idle.popitem(last=False)[0].close()
+            self.closed += 1
+
+    def stats(self):
+        return {'renderers': self.in_use + len(self.idle), 'renderers_idle': len(self.idle),
+                'renderers_created': self.created, 'renderers_reused': self.reused}
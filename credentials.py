@@ -0,0 +1,164 @@
+import csv
+import hashlib
+import hmac
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+# ---------------------------------------------------------
+# ログイン情報 (SQLite + ソルト付きハッシュ)
+#   ユーザー名を主キーにしたテーブル1つ。検索・重複判定は索引で行い、
+#   同時登録は SQLite のトランザクションで直列化される。
+#   パスワードは PBKDF2-HMAC-SHA256 で保存する (数百 ms かかるので UI スレッドから呼ばない)。
+# 旧 login.csv (平文) は load_csv() で読み込み、migrate() で少しずつ PBKDF2 で保存する
+#   (認証ワーカーで MIGRATE_BATCH 件ずつ。途中でログインした人はその場で先に移す)。
+#   全件を保存し終えたら平文の CSV は削除する。
+# ---------------------------------------------------------
+CREDENTIALS_DB = "users.db"
+PBKDF2_ITERATIONS = 200_000
+SALT_BYTES = 16
+SCHEME = "pbkdf2_sha256"
+MIGRATE_BATCH = 8  # login.csv の取り込みで1回に保存する件数 (1件数百 ms。その間ログインを待たせる)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username   TEXT PRIMARY KEY,
+    scheme     TEXT NOT NULL,
+    iterations INTEGER NOT NULL,
+    salt       BLOB NOT NULL,
+    hash       BLOB NOT NULL,
+    created    REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def hash_password(password, salt, scheme=SCHEME, iterations=PBKDF2_ITERATIONS):
+    data = password.encode("utf-8")
+    if scheme == SCHEME:
+        return hashlib.pbkdf2_hmac("sha256", data, salt, iterations)
+    raise ValueError(f"unknown password scheme: {scheme}")
+
+
+class CredentialStore:
+    """ユーザー登録と照合 (どのスレッドからでも呼べる。接続はスレッドごと)
+
+    login.csv の取り込み (load_csv / migrate) と、取り込み中の register / verify は
+    同じ1本のスレッドから呼ぶこと (Login の認証ワーカー)。
+    """
+    def __init__(self, path=CREDENTIALS_DB, iterations=PBKDF2_ITERATIONS):
+        self.path = path
+        self.iterations = iterations
+        self._local = threading.local()
+        self._db().executescript(SCHEMA)
+        self.legacy = {}         # login.csv の未保存分: ユーザー名 -> 平文パスワード
+        self.legacy_path = None
+        # 存在しないユーザーでも照合と同じ時間をかけるためのダミー
+        self._dummy_salt = os.urandom(SALT_BYTES)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _write(self):
+        return _Transaction(self._db())
+
+    # --- 登録・照合 ---
+    def register(self, username, password):
+        """登録する。既に同じユーザー名があれば False"""
+        if not username or not password:
+            raise ValueError("username and password are required")
+        if self.exists(username) or username in self.legacy:
+            return False  # ハッシュ計算の前に弾く
+        salt = os.urandom(SALT_BYTES)
+        digest = hash_password(password, salt, SCHEME, self.iterations)
+        try:
+            with self._write() as db:
+                db.execute("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)",
+                           (username, SCHEME, self.iterations, salt, digest, time.time()))
+        except sqlite3.IntegrityError:
+            return False  # 同時に登録された
+        return True
+
+    def verify(self, username, password):
+        if username in self.legacy:
+            self._migrate([username])  # 取り込み待ちの人は先に保存してから照合する
+        row = self._db().execute("SELECT scheme, iterations, salt, hash FROM users WHERE username = ?",
+                                 (username,)).fetchone()
+        if row is None:
+            hash_password(password, self._dummy_salt, SCHEME, self.iterations)
+            return False
+        scheme, iterations, salt, digest = row
+        return hmac.compare_digest(hash_password(password, salt, scheme, iterations), digest)
+
+    def exists(self, username):
+        return self._db().execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def count(self):
+        return self._db().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    # --- 旧形式からの移行 ---
+    def load_csv(self, csv_path):
+        """login.csv (ユーザー名, 平文パスワード) を読み込み、未登録の件数を返す
+
+        同じユーザー名は最初の行を採用する。保存は migrate() で行う (読み込みだけでは書かない)。
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        with open(csv_path, newline="") as f:  # 旧版と同じ既定のエンコーディングで読む
+            for r in csv.reader(f):
+                if len(r) >= 2 and r[0] and r[1] and r[0] not in self.legacy and not self.exists(r[0]):
+                    self.legacy[r[0]] = r[1]
+        self.legacy_path = csv_path
+        if not self.legacy:
+            self._finish_csv()
+        return len(self.legacy)
+
+    def migrate(self, limit=MIGRATE_BATCH):
+        """読み込んだ login.csv の行を limit 件だけ PBKDF2 で保存し、残りの件数を返す
+
+        全件を保存し終えたら login.csv を削除する。
+        """
+        if self.legacy:
+            self._migrate(list(itertools.islice(self.legacy, limit)))
+            if not self.legacy:
+                self._finish_csv()
+        return len(self.legacy)
+
+    def _migrate(self, usernames):
+        records = []
+        for username in usernames:
+            salt = os.urandom(SALT_BYTES)
+            digest = hash_password(self.legacy[username], salt, SCHEME, self.iterations)
+            records.append((username, SCHEME, self.iterations, salt, digest, time.time()))
+        with self._write() as db:
+            db.executemany("INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?, ?, ?)", records)
+        for username in usernames:
+            del self.legacy[username]
+
+    def _finish_csv(self):
+        """全件を保存済み: 平文の login.csv を消す"""
+        with self._write() as db:
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('migrated_csv', ?)",
+                       (os.path.abspath(self.legacy_path),))
+        os.remove(self.legacy_path)
+        self.legacy_path = None
+
+
+class _Transaction:
+    """with 文で BEGIN IMMEDIATE ... COMMIT (例外なら ROLLBACK)。同時登録は書き込みロックで直列化"""
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,328 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from feed import FetchScheduler
+from probes import PROBES
+
+# ---------------------------------------------------------
+# データエンジン (Tkinter 非依存)
+#   フィード取得 → ティック保存 / 足集計 → 派生レート計算 → 購読者へ配信
+#   GUI はこのエンジンの購読者の1つ。サーバー・負荷試験・CI ではそのまま
+#   ヘッドレスで動かせる:  python engine.py --duration 10
+# ---------------------------------------------------------
+TICK_BUFFER_SIZE = 16384  # 1銘柄あたりのティック保持数
+
+# 派生レート (クロス): 提示ペアの通貨グラフから経路を探して合成する
+#   例) BTC/USD = BTC/JPY ÷ USD/JPY
+DERIVED_RATES = ["BTC_USD"]
+HISTORY_DAYS = 7  # 起動時にアーカイブから読み込む足の日数
+
+
+# ---------------------------------------------------------
+# データ管理クラス
+# ---------------------------------------------------------
+class DataManager:
+    @staticmethod
+    def create_dummy_dataframe():
+        import pandas as pd
+        # FXダミー
+        fx_data = []
+        for pair in ['USD_JPY', 'EUR_JPY', 'GBP_JPY', 'TRY_JPY']:
+            base = 150.0 if 'USD' in pair else 160.0
+            bid = base + random.uniform(-0.1, 0.1)
+            fx_data.append({
+                'symbol': pair, 'bid': bid, 'ask': bid + 0.003, 
+                'high': bid + 0.5, 'low': bid - 0.5
+            })
+        
+        # Cryptoダミー
+        crypto_data = []
+        for pair in ['BTC_JPY', 'ETH_JPY', 'XRP_JPY', 'DOGE_JPY']:
+            base = 14000000 if 'BTC' in pair else 500000
+            bid = base + random.uniform(-100, 100)
+            crypto_data.append({
+                'symbol': pair, 'bid': bid, 'ask': bid + 100, 
+                'high': bid * 1.01, 'low': bid * 0.99, 'volume': 1000
+            })
+            
+        return pd.DataFrame(fx_data), pd.DataFrame(crypto_data)
+
+    @staticmethod
+    def get_news():
+        titles = [
+            "米GDP速報値、市場予想を上回る", "日銀総裁「緩和的な金融環境を維持」",
+            "ドル円、一時156円台へ上昇", "欧州中銀、利下げ観測が後退",
+            "【市況】東京市場、前場は小幅反落", "原油先物、供給懸念で上昇"
+        ]
+        news_data = []
+        t = datetime.now()
+        for title in titles:
+            t_str = t.strftime("%m/%d %H:%M")
+            news_data.append((t_str, title))
+            t -= timedelta(minutes=random.randint(10, 60))
+        return news_data
+
+
+class SyntheticFeed:
+    """オフライン用の合成フィード (ベンチマーク・負荷試験用)
+
+    create_dummy_dataframe と同じ列構成の DataFrame を返す。
+    銘柄数とボラティリティを指定でき、価格は対数ランダムウォークで動く。
+    n_fx / n_crypto が既定の4銘柄より多い場合は FX004_JPY のような
+    合成銘柄を追加する。
+    """
+    FX_BASE = {'USD_JPY': 150.0, 'EUR_JPY': 160.0, 'GBP_JPY': 190.0, 'TRY_JPY': 4.5}
+    CRYPTO_BASE = {'BTC_JPY': 14000000.0, 'ETH_JPY': 500000.0, 'XRP_JPY': 90.0, 'DOGE_JPY': 20.0}
+
+    def __init__(self, n_fx=4, n_crypto=4, volatility=0.0002, seed=None):
+        import numpy as np
+        self.rng = np.random.default_rng(seed)
+        self.volatility = volatility
+        self.fx_symbols, fx_base = self._universe(self.FX_BASE, n_fx, "FX", 100.0)
+        self.crypto_symbols, cr_base = self._universe(self.CRYPTO_BASE, n_crypto, "CR", 1000.0)
+        self.fx_price = np.array(fx_base)
+        self.crypto_price = np.array(cr_base)
+        self.fx_open = self.fx_price.copy()
+        self.crypto_open = self.crypto_price.copy()
+
+    @staticmethod
+    def _universe(base, n, prefix, default_price):
+        symbols = list(base)[:n]
+        prices = [base[s] for s in symbols]
+        for i in range(len(symbols), n):
+            symbols.append(f"{prefix}{i:03d}_JPY")
+            prices.append(default_price * (1 + i % 50 / 10))
+        return symbols, prices
+
+    @property
+    def symbols(self):
+        return self.fx_symbols + self.crypto_symbols
+
+    def _step(self, price):
+        import numpy as np
+        return price * np.exp(self.rng.normal(0.0, self.volatility, len(price)))
+
+    def fetch(self):
+        """フィードのアダプタと同じ形 (fx_df, crypto_df) を返す"""
+        import numpy as np
+        import pandas as pd
+        fx = self.fx_price = self._step(self.fx_price)
+        cr = self.crypto_price = self._step(self.crypto_price)
+        fx_spread = fx * 0.00002
+        cr_spread = cr * 0.0001
+        fd = pd.DataFrame({
+            'symbol': self.fx_symbols, 'bid': fx, 'ask': fx + fx_spread,
+            'high': np.maximum(fx, self.fx_open * 1.003), 'low': np.minimum(fx, self.fx_open * 0.997),
+        })
+        fg = pd.DataFrame({
+            'symbol': self.crypto_symbols, 'bid': cr, 'ask': cr + cr_spread,
+            'high': np.maximum(cr, self.crypto_open * 1.01), 'low': np.minimum(cr, self.crypto_open * 0.99),
+            'volume': 1000.0,
+        })
+        return fd, fg
+
+
+class DataEngine:
+    """フィードの取得から派生レートまでを1本のワーカースレッドで処理する
+
+    購読者 (subscribe したコールバック) はワーカースレッド上で
+    RateSnapshot を受け取る。UI に渡す場合は購読者側で
+    feed.LatestDispatcher などを使って UI スレッドへ移すこと。
+    """
+    def __init__(self, fetch=None, interval=1.0, tick_capacity=TICK_BUFFER_SIZE,
+                 derived=DERIVED_RATES, adapter=None, archive=None):
+        from tickstore import TickStore
+        from bars import BarAggregator
+        from rates import CrossRateEngine
+        # fetch 未指定ならフィードアダプタを起動時に1回だけ解決する
+        self.adapter = None
+        if fetch is None:
+            from adapters import resolve_adapter
+            self.adapter = adapter or resolve_adapter()
+            fetch = self.adapter.fetch
+            if self.adapter.streaming:
+                interval = 0  # プッシュ型は届いたらすぐ取り込む
+        self.fetch_source = fetch
+        self.crosses = CrossRateEngine(derived)
+        self.tick_store = TickStore(tick_capacity)
+        self.bars = BarAggregator()
+        # アーカイブ: 取り込んだティックと確定足を書き込みスレッドへ渡す
+        self.archive = archive
+        self._history_loaded = archive is None
+        if archive is not None:
+            self.bars.listeners.append(archive.append_bar)
+        self.latest = None
+        self.subscribers = []
+        self._sub_lock = threading.Lock()
+        # 購読者への配信はワーカースレッド上でそのまま行う
+        self.scheduler = FetchScheduler(
+            self._fetch, self._publish, post=lambda fn: fn(),
+            interval=interval, ok=lambda snap: len(snap) > 0, name="engine")
+
+    # --- 購読 ---
+    def subscribe(self, callback):
+        """callback(snapshot) を登録する。戻り値は unsubscribe 用"""
+        with self._sub_lock:
+            self.subscribers = self.subscribers + [callback]
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._sub_lock:
+            self.subscribers = [cb for cb in self.subscribers if cb is not callback]
+
+    # --- 実行 ---
+    def start(self):
+        if self.adapter is not None:
+            self.adapter.start()
+        self.scheduler.start()
+
+    def stop(self, timeout=None):
+        self.scheduler.stop()
+        # プッシュ型の fetch() は受信待ちで止まっているので、先に閉じて起こす
+        if self.adapter is not None:
+            self.adapter.close()
+        self.scheduler.stop(timeout)
+        if self.archive is not None:
+            self.archive.close(timeout)
+
+    def set_interval(self, interval):
+        self.scheduler.set_interval(interval)
+
+    def request_cross(self, symbol):
+        """派生レートを追加する (例: 'EUR_USD')。次の取得から配信される"""
+        self.crosses.request(symbol)
+
+    def stats(self):
+        stats = self.scheduler.stats()
+        if self.adapter is not None:
+            stats.update(self.adapter.stats())
+        if self.archive is not None:
+            stats.update(self.archive.stats())
+        return stats
+
+    def load_history(self, days=HISTORY_DAYS):
+        """アーカイブから直近 days 日の足とティックを読み込む (ワーカースレッドで初回に1回)"""
+        import numpy as np
+        from archive import DAY
+        self._history_loaded = True
+        t0 = PROBES.now()
+        since = time.time() - days * DAY
+        for symbol in self.archive.symbols("bars"):
+            for tf in self.bars.timeframes:
+                self.bars.seed(symbol, tf, self.archive.read_bars(symbol, tf, since))
+        for symbol in self.archive.symbols("ticks"):
+            ticks = self.archive.read_ticks(symbol, time.time() - DAY)
+            if len(ticks):
+                self.tick_store.extend(symbol, np.asarray(ticks[-self.tick_store.capacity:]))
+        PROBES.record("load_history", t0)
+
+    # --- パイプライン ---
+    def _fetch(self):
+        """ワーカースレッド: 取得 → 保存 → スナップショット化"""
+        if not self._history_loaded:
+            self.load_history()
+        t0 = PROBES.now()
+        fd, fg = self.fetch_source()
+        PROBES.record("fetch", t0)
+        t0 = PROBES.now()
+        snap = self.ingest(fd, fg, time.time())
+        PROBES.record("ingest", t0)
+        return snap
+
+    def ingest(self, fx_df, crypto_df, ts):
+        """取得済みの DataFrame を取り込み、派生レート込みのスナップショットを返す"""
+        from rates import RateSnapshot
+        snap = RateSnapshot(fx_df, crypto_df, ts=ts)
+        self.tick_store.append_frame(fx_df, ts)
+        self.tick_store.append_frame(crypto_df, ts)
+        if self.archive is not None:
+            self.archive.append_frame(fx_df, ts)
+            self.archive.append_frame(crypto_df, ts)
+        self.bars.update_frame(fx_df, ts)
+        self.bars.update_frame(crypto_df, ts)
+        self._add_derived(snap, ts)
+        self.latest = snap
+        return snap
+
+    def _add_derived(self, snap, ts):
+        """値が変わった提示ペアに依存するクロスだけを再計算し、履歴に残す"""
+        for symbol in self.crosses.update(snap):
+            bid, ask = snap.get(symbol)[:2]
+            self.tick_store.append(symbol, ts, bid, ask)
+            self.bars.on_tick(symbol, ts, bid, ask)
+            if self.archive is not None:
+                self.archive.append_tick(symbol, ts, bid, ask)
+
+    def _publish(self, snap):
+        for callback in self.subscribers:
+            try:
+                callback(snap)
+            except Exception as e:
+                print(f"Subscriber Error: {e}")
+
+
+# ---------------------------------------------------------
+# ヘッドレス起動 (CLI)
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the data engine without the GUI")
+    parser.add_argument("--interval", type=float, default=1.0, help="fetch interval in seconds (may be < 1)")
+    parser.add_argument("--feed", default=None,
+                        help="feed adapter: auto, dummy, synthetic[:N], module:NAME, ws://..., sse+http://..."
+                             " (default: $TRADESOFT_FEED or auto)")
+    parser.add_argument("--duration", type=float, default=0, help="stop after N seconds (0 = run until Ctrl+C)")
+    parser.add_argument("--symbols", default="", help="comma separated symbols to print (default: all)")
+    parser.add_argument("--cross", default="", help="extra comma separated crosses to derive, e.g. EUR_USD,ETH_BTC")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per tick")
+    parser.add_argument("--quiet", action="store_true", help="print only the final stats")
+    parser.add_argument("--archive", metavar="DIR", help="persist ticks and bars under DIR and preload them")
+    parser.add_argument("--probes", metavar="PATH", help="enable stage timing and export it (.json/.csv) at exit")
+    args = parser.parse_args(argv)
+    if args.probes:
+        PROBES.enabled = True
+
+    symbols = [s for s in args.symbols.split(",") if s]
+    from adapters import resolve_adapter
+    archive = None
+    if args.archive:
+        from archive import Archive
+        archive = Archive(args.archive)
+    engine = DataEngine(interval=args.interval, adapter=resolve_adapter(args.feed), archive=archive)
+    for cross in filter(None, args.cross.split(",")):
+        engine.request_cross(cross)
+
+    def printer(snap):
+        names = symbols or snap.symbols
+        rows = {s: snap.get(s) for s in names if s in snap}
+        if args.json:
+            print(json.dumps({'ts': snap.ts, 'rates': {s: {'bid': float(r[0]), 'ask': float(r[1])}
+                                                      for s, r in rows.items()}}), flush=True)
+        else:
+            stamp = datetime.fromtimestamp(snap.ts).strftime("%H:%M:%S.%f")[:-3]
+            print(stamp, "  ".join(f"{s} {r[0]:.3f}/{r[1]:.3f}" for s, r in rows.items()), flush=True)
+
+    if not args.quiet:
+        engine.subscribe(printer)
+    engine.start()
+    try:
+        if args.duration > 0:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop(timeout=5)
+    print(json.dumps(engine.stats()), file=sys.stderr)
+    if args.probes:
+        PROBES.export(args.probes)
+
+
+if __name__ == "__main__":
+    main()
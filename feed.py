@@ -0,0 +1,153 @@
+import threading
+import time
+
+from probes import PROBES
+
+MIN_BACKOFF = 0.1  # 間隔 0 (プッシュ型) でもエラー時はこれを起点に待つ
+
+# ---------------------------------------------------------
+# 最新値だけを UI スレッドへ渡すディスパッチャ
+# ---------------------------------------------------------
+class LatestDispatcher:
+    """ワーカースレッドから UI スレッドへ「最新の値だけ」を渡す
+
+    - UIへの通知が処理待ちの間に届いた値は、最新の1件に置き換える (間引き)
+    - 値には連番を振り、反映済みより古い値は捨てる
+
+    post:     UIスレッドへ関数を渡す手段 (例: lambda fn: root.after(0, fn))
+    on_value: UIスレッドで呼ばれるコールバック on_value(value)
+    stage:    指定すると UI スレッドでの待ち時間をその名前で計測する
+    """
+    def __init__(self, post, on_value, stage=None):
+        self.post = post
+        self.on_value = on_value
+        self.stage = stage
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._pending = None       # (seq, value, 投入時刻) UI未反映の最新値
+        self._posted = False       # UIへの通知が未処理か
+        self._delivered_seq = 0
+        self.delivered = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def publish(self, value, seq=None):
+        with self._lock:
+            if seq is None:
+                self._seq += 1
+                seq = self._seq
+            if self._posted:
+                self.coalesced += 1
+            self._pending = (seq, value, PROBES.now() if self.stage else None)
+            if self._posted:
+                return
+            self._posted = True
+        self.post(self._drain)
+
+    def _drain(self):
+        """UIスレッド側: 最新の値だけを反映する"""
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._posted = False
+        if pending is None:
+            return
+        seq, value, t0 = pending
+        PROBES.record(self.stage, t0)
+        if seq <= self._delivered_seq:
+            self.dropped += 1
+            return
+        self._delivered_seq = seq
+        self.delivered += 1
+        self.on_value(value)
+
+
+# ---------------------------------------------------------
+# データ取得スケジューラ
+# ---------------------------------------------------------
+class FetchScheduler:
+    """常駐スレッド1本でフィードを定期取得する
+
+    - 取得は常に1件のみ (前回が終わるまで次を投げない)
+    - 結果には連番を振り、UI側で古い結果を破棄する
+    - UIへの通知が溜まっている間は最新結果だけを残して間引く
+    - エラー時は間隔を倍々に延ばし、成功したら元に戻す
+
+    fetch:     取得関数 (ワーカースレッドで実行)
+    on_result: UIスレッドで呼ばれるコールバック on_result(result)
+    post:      UIスレッドへ関数を渡す手段 (例: lambda fn: root.after(0, fn))
+    on_fetch:  取得直後にワーカースレッドで呼ばれるフック (ティック保存など)
+    ok:        結果の妥当性判定 (False ならエラー扱い)
+    """
+    def __init__(self, fetch, on_result, post, interval=1.0, max_backoff=30.0,
+                 on_fetch=None, ok=None, name="feed"):
+        self.fetch = fetch
+        self.on_result = on_result
+        self.post = post
+        self.on_fetch = on_fetch
+        self.ok = ok
+        self.name = name
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.current_interval = interval
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._seq = 0
+        self._dispatcher = LatestDispatcher(post, on_result)
+
+        self.fetched = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if timeout is not None and self._thread:
+            self._thread.join(timeout)
+
+    def set_interval(self, interval):
+        """取得間隔 (秒) を変更する。1秒未満も可"""
+        self.interval = interval
+        self.current_interval = interval
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            self._seq += 1
+            seq = self._seq
+            try:
+                result = self.fetch()
+                if self.ok is not None and not self.ok(result):
+                    raise ValueError("empty result")
+            except Exception as e:
+                if self._stop.is_set():
+                    break  # 停止時に待機中の取得が打ち切られた
+                self.errors += 1
+                self.current_interval = min(max(self.current_interval, MIN_BACKOFF) * 2, self.max_backoff)
+                print(f"[{self.name}] Fetch Error: {e} (retry in {self.current_interval:.2f}s)")
+            else:
+                self.fetched += 1
+                self.current_interval = self.interval
+                if self.on_fetch is not None:
+                    self.on_fetch(result)
+                self._dispatcher.publish(result, seq)
+
+            # 固定レートで待機 (取得が遅れた分は詰めずに次の周期へ)
+            next_time += self.current_interval
+            now = time.monotonic()
+            if next_time < now:
+                next_time = now
+            self._stop.wait(next_time - now)
+
+    def stats(self):
+        d = self._dispatcher
+        return {
+            'fetched': self.fetched, 'delivered': d.delivered,
+            'coalesced': d.coalesced, 'dropped': d.dropped,
+            'errors': self.errors, 'interval': self.current_interval,
+        }
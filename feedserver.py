@@ -0,0 +1,204 @@
+import argparse
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from adapters import HEARTBEAT, WebSocketError, ws_accept_key, ws_recv, ws_send
+
+# ---------------------------------------------------------
+# ローカル配信サーバー (合成ティックを websocket / SSE で流す)
+#   python feedserver.py --port 8765 --symbols 50 --rate 10
+#   TRADESOFT_FEED=ws://127.0.0.1:8765/ python main.py
+#   TRADESOFT_FEED=sse+http://127.0.0.1:8765/sse python engine.py --duration 10
+# ネットワークや外部モジュールが無くても、プッシュ型の経路を丸ごと試せる。
+# ---------------------------------------------------------
+CLIENT_QUEUE = 256  # 送信待ちメッセージの上限 (遅い接続は古いものから捨てる)
+
+
+class Broadcaster:
+    """合成フィードを一定間隔で取得し、接続中の全クライアントのキューへ配る"""
+    def __init__(self, feed, rate):
+        self.feed = feed
+        self.rate = rate
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.dropped = 0
+        self._stop = threading.Event()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=CLIENT_QUEUE)
+        with self.lock:
+            self.clients.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.clients.discard(q)
+
+    @staticmethod
+    def encode(market, df, ts):
+        return json.dumps({'market': market, 'ts': ts, 'quotes': df.to_dict("records")})
+
+    def run(self):
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            fd, fg = self.feed.fetch()
+            ts = time.time()
+            messages = [self.encode("fx", fd, ts), self.encode("crypto", fg, ts)]
+            with self.lock:
+                clients = list(self.clients)
+            for q in clients:
+                for msg in messages:
+                    try:
+                        q.put_nowait(msg)
+                    except queue.Full:
+                        # 遅い接続は最古のメッセージを捨てて最新を優先する
+                        try:
+                            q.get_nowait()
+                        except queue.Empty:
+                            pass
+                        q.put_nowait(msg)
+                        self.dropped += 1
+                    self.sent += 1
+            next_time = max(next_time + 1.0 / self.rate, time.monotonic())
+            self._stop.wait(next_time - time.monotonic())
+
+    def stop(self):
+        self._stop.set()
+
+
+class FeedHandler(socketserver.BaseRequestHandler):
+    """1接続分: "/" は websocket、"/sse" は Server-Sent Events で配信する"""
+    def handle(self):
+        sock = self.request
+        header = b""
+        while b"\r\n\r\n" not in header:
+            chunk = sock.recv(1024)
+            if not chunk:
+                return
+            header += chunk
+        lines = header.split(b"\r\n\r\n")[0].decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        path = parts[1] if len(parts) > 1 else "/"
+        fields = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+
+        closed = threading.Event()  # クライアントが閉じた (受信側のスレッドが立てる)
+        if fields.get("upgrade", "").lower() == "websocket":
+            sock.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {ws_accept_key(fields['sec-websocket-key'])}\r\n\r\n").encode())
+            send_lock = threading.Lock()  # 配信と pong / close の返信が同じソケットに書く
+
+            def send(payload, opcode=0x1):
+                with send_lock:
+                    ws_send(sock, payload, opcode=opcode)
+            self.read_in_background(self.read_frames, send, closed)
+            self.serve(send, lambda: send(b"", 0x9), closed)
+        elif path.split("?")[0] == "/sse":
+            sock.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+            self.read_in_background(self.read_until_eof, closed)
+            self.serve(lambda msg: sock.sendall(f"data: {msg}\n\n".encode()),
+                       lambda: sock.sendall(b": keepalive\n\n"), closed)
+        else:
+            sock.sendall(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)  # 受信待ちのスレッドを起こして終わらせる
+        except OSError:
+            pass
+
+    def read_in_background(self, target, *args):
+        threading.Thread(target=target, args=args, name="feed-client-read", daemon=True).start()
+
+    def read_frames(self, send, closed):
+        """websocket: クライアントのフレームを読む (ping には pong、close には close を返す)"""
+        try:
+            while True:
+                opcode, payload = ws_recv(self.request)
+                if opcode == 0x9:
+                    send(payload, 0xA)
+                elif opcode == 0x8:
+                    send(payload[:2], 0x8)  # 状態コードをそのまま返して閉じる
+                    break
+                # pong・データフレームは読み捨てる
+        except (OSError, WebSocketError):
+            pass  # 切断 (半分閉じたソケットもここで気づく)
+        finally:
+            closed.set()
+
+    def read_until_eof(self, closed):
+        """SSE: クライアントからは何も来ないので、切断 (EOF) だけを待つ"""
+        try:
+            while self.request.recv(1024):
+                pass
+        except OSError:
+            pass
+        finally:
+            closed.set()
+
+    def serve(self, send, heartbeat, closed):
+        broadcaster = self.server.broadcaster
+        q = broadcaster.subscribe()
+        try:
+            while not closed.is_set():
+                try:
+                    msg = q.get(timeout=HEARTBEAT / 2)
+                except queue.Empty:
+                    heartbeat()
+                    continue
+                send(msg)
+        except (OSError, WebSocketError):
+            pass  # クライアント切断
+        finally:
+            broadcaster.unsubscribe(q)
+
+
+class FeedServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, broadcaster):
+        super().__init__(address, FeedHandler)
+        self.broadcaster = broadcaster
+
+
+def serve(host="127.0.0.1", port=8765, symbols=8, rate=10.0, volatility=0.0002, seed=None):
+    """サーバーを別スレッドで起動して返す (テスト・ベンチマークから使う)"""
+    from engine import SyntheticFeed
+    n_fx = symbols // 2
+    feed = SyntheticFeed(n_fx=n_fx, n_crypto=symbols - n_fx, volatility=volatility, seed=seed)
+    broadcaster = Broadcaster(feed, rate)
+    server = FeedServer((host, port), broadcaster)
+    threading.Thread(target=broadcaster.run, name="feed-broadcast", daemon=True).start()
+    threading.Thread(target=server.serve_forever, name="feed-server", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay synthetic ticks over websocket and SSE")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--symbols", type=int, default=8, help="number of instruments (half FX, half crypto)")
+    parser.add_argument("--rate", type=float, default=10.0, help="ticks per second")
+    parser.add_argument("--volatility", type=float, default=0.0002, help="per-tick log-return stdev")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port, args.symbols, args.rate, args.volatility, args.seed)
+    print(f"Serving ws://{args.host}:{args.port}/ and sse+http://{args.host}:{args.port}/sse")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.broadcaster.stop()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import csv
+import threading
+import time
+import numpy as np
+
+# ---------------------------------------------------------
+# 約定履歴 (列ごとの配列 + 列ごとの並び順索引)
+#   何十万件でも表示は見えている行だけ取り出す (rows)。
+#   並び順索引は初めてその列で並べ替えたときに作り、以降は増えた行だけを
+#   まとめて差し込む (表示時に1回、O(n) のコピー + 追加分のソート)。
+# ---------------------------------------------------------
+FILL_COLUMNS = ('id', 'ts', 'symbol', 'side', 'qty', 'price', 'realized')
+FILL_DTYPES = {'id': np.int64, 'ts': float, 'symbol': 'U24', 'side': 'U8',
+               'qty': float, 'price': float, 'realized': float}
+EXPORT_CHUNK = 50_000  # CSV 書き出しで1度にロックを取って写す行数
+
+
+class SortIndex:
+    """1列分の並び順 (値の昇順に並べた行番号。同じ値は古い行が先)"""
+    def __init__(self):
+        self.keys = None
+        self.order = np.empty(0, dtype=np.int64)
+        self.size = 0
+
+    def sync(self, column, size):
+        """size 行目までを索引に取り込む (増えた分だけソートして差し込む)"""
+        if size == self.size:
+            return
+        new = column[self.size:size]
+        o = np.argsort(new, kind="stable")
+        new = new[o]
+        if self.keys is None:
+            self.keys, self.order = new, o.astype(np.int64)
+        else:
+            pos = np.searchsorted(self.keys, new, side="right")
+            self.keys = np.insert(self.keys, pos, new)
+            self.order = np.insert(self.order, pos, o + self.size)
+        self.size = size
+
+
+class FillStore:
+    """約定を列ごとの配列に溜める (OrderEngine.on_fill から呼ぶ)"""
+    columns = FILL_COLUMNS
+
+    def __init__(self, capacity=4096):
+        self.cols = {c: np.empty(capacity, dtype=FILL_DTYPES[c]) for c in FILL_COLUMNS}
+        self.size = 0
+        self.indexes = {}  # 列名 -> SortIndex
+        self.version = 0   # 行が増えるたびに増える
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, fills):
+        with self.lock:
+            need = self.size + len(fills)
+            if need > len(self.cols['id']):
+                capacity = max(need, len(self.cols['id']) * 2)
+                for c, arr in self.cols.items():
+                    grown = np.empty(capacity, dtype=arr.dtype)
+                    grown[:self.size] = arr[:self.size]
+                    self.cols[c] = grown
+            for i, f in enumerate(fills, self.size):
+                for c in FILL_COLUMNS:
+                    self.cols[c][i] = getattr(f, c)
+            self.size = need
+            self.version += 1
+
+    def _order(self, column, descending):
+        """並び順の行番号 (ロック取得済みで呼ぶ)"""
+        if column in (None, 'id'):
+            order = np.arange(self.size)  # 約定番号順 = 追加順 (OrderEngine はロック内で通知する)
+        else:
+            index = self.indexes.get(column)
+            if index is None:
+                index = self.indexes[column] = SortIndex()
+            index.sync(self.cols[column], self.size)
+            order = index.order
+        return order[::-1] if descending else order
+
+    def rows(self, start, stop, column=None, descending=True):
+        """並べ替えた上で start〜stop 行目だけを (FILL_COLUMNS の順の) タプルで返す"""
+        with self.lock:
+            sel = self._order(column, descending)[start:stop]
+            return list(zip(*(self.cols[c][sel].tolist() for c in FILL_COLUMNS)))
+
+    def chunks(self, size=EXPORT_CHUNK):
+        """約定番号順に size 行ずつ写して返す (ロックは1塊ごとにだけ取る)"""
+        with self.lock:
+            total = self.size
+        for start in range(0, total, size):
+            with self.lock:
+                cols = [self.cols[c][start:min(start + size, total)].tolist() for c in FILL_COLUMNS]
+            yield zip(*cols)
+
+    def export_csv(self, path, chunk=EXPORT_CHUNK):
+        """約定履歴を CSV に書き出し、書き出した行数を返す (ワーカースレッドから呼ぶ)"""
+        count = 0
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(FILL_COLUMNS)
+            ts = FILL_COLUMNS.index('ts')
+            for rows in self.chunks(chunk):
+                rows = [list(r) for r in rows]
+                for r in rows:
+                    r[ts] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r[ts]))
+                writer.writerows(rows)
+                count += len(rows)
+        return count
+
+    def stats(self):
+        return {'fills': self.size, 'fill_indexes': len(self.indexes)}
+
+
+class ListSource:
+    """件数の少ない一覧 (建玉・待機注文) を FillStore と同じ rows() で引けるようにする
+
+    fetch() は columns の順のタプルのリストを返す関数。rows() のたびに読み直して並べ替える。
+    """
+    version = None  # 読み直さないと変化が分からないので毎回描き直す
+
+    def __init__(self, fetch, columns):
+        self.fetch = fetch
+        self.columns = tuple(columns)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def rows(self, start, stop, column=None, descending=False):
+        rows = self.fetch()
+        self.size = len(rows)
+        if column is not None:
+            i = self.columns.index(column)
+            rows.sort(key=lambda r: (r[i] is None, r[i]), reverse=descending)  # None は数値と比べない
+        elif descending:
+            rows.reverse()
+        return rows[start:stop]
@@ -0,0 +1,503 @@
+import math
+import re
+import threading
+from collections import deque
+import numpy as np
+
+# ---------------------------------------------------------
+# テクニカル指標 (逐次更新 + NumPy 一括計算)
+#   push(o, h, l, c): 確定足を1本取り込む (O(1))
+#   peek(o, h, l, c): 形成中の足での値 (状態は変えない、O(1))
+#   batch(cols):      履歴をまとめて計算し、状態を末尾に合わせる (初回の埋め戻し用)
+# ---------------------------------------------------------
+NAN = float("nan")
+EWM_CHUNK_LOG = 8 * math.log(10)  # 一括 EMA の1区間で許す重みの幅 (1e8 倍まで)
+
+
+def _ewm(x, alpha, y0):
+    """y[k] = y[k-1] + alpha * (x[k] - y[k-1]) を y[-1] = y0 から一括で計算する
+
+    y[k] = d^(k+1) * (y0 + alpha * Σ x[j] * d^-(j+1))  (d = 1 - alpha)
+    d^-k が大きくなりすぎないよう区間に分けて累積和で求める。
+    """
+    x = np.asarray(x, dtype=float)
+    out = np.empty(len(x))
+    d = 1.0 - alpha
+    if d <= 0:
+        out[:] = x
+        return out
+    chunk = max(1, int(EWM_CHUNK_LOG / -math.log(d)))
+    for s in range(0, len(x), chunk):
+        seg = x[s:s + chunk]
+        k = np.arange(1, len(seg) + 1)
+        out[s:s + len(seg)] = d ** k * (y0 + alpha * np.cumsum(seg * d ** -k))
+        y0 = out[s + len(seg) - 1]
+    return out
+
+
+def _rolling_sum(x, n):
+    """長さ n の移動合計 (先頭 n-1 本は含まない)"""
+    cs = np.cumsum(x)
+    cs[n:] = cs[n:] - cs[:-n]
+    return cs[n - 1:]
+
+
+class Indicator:
+    """指標の共通部分
+
+    outputs: 出力名 (1本なら表示名そのまま、複数なら "表示名 出力名")
+    overlay: True ならローソク足と同じ軸に描く (False は別枠)
+    """
+    outputs = ('value',)
+    overlay = False
+
+    def __init__(self, *params):
+        self.params = params
+        self.label = f"{type(self).__name__}({','.join(str(p) for p in params)})"
+
+    def push(self, o, h, l, c):
+        raise NotImplementedError
+
+    def peek(self, o, h, l, c):
+        raise NotImplementedError
+
+    def batch(self, cols):
+        raise NotImplementedError
+
+
+class _Window:
+    """移動窓の合計 / 二乗和 (基準値からの差で持ち、桁落ちを防ぐ)
+
+    窓が一巡するたびに合計を窓から計算し直し、誤差の蓄積を断つ (償却 O(1))。
+    """
+    def __init__(self, n):
+        self.n = n
+        self.values = deque(maxlen=n)
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self._since_reset = 0
+
+    def load(self, x):
+        x = [float(v) for v in x[-self.n:]]
+        self.values.clear()
+        self.values.extend(x)
+        if x and self.shift is None:
+            self.shift = x[0]
+        self._reset()
+
+    def _reset(self):
+        d = [v - self.shift for v in self.values]
+        self.total = sum(d)
+        self.total_sq = sum(v * v for v in d)
+        self._since_reset = 0
+
+    def push(self, x):
+        if self.shift is None:
+            self.shift = x
+        total, total_sq = self._sums(x)
+        self.values.append(x)
+        self.total, self.total_sq = total, total_sq
+        self._since_reset += 1
+        if self._since_reset >= self.n:
+            self._reset()
+
+    def _sums(self, x):
+        """x を追加したときの (合計, 二乗和)"""
+        d = x - (self.shift if self.shift is not None else x)
+        total, total_sq = self.total + d, self.total_sq + d * d
+        if len(self.values) == self.n:
+            old = self.values[0] - self.shift
+            total, total_sq = total - old, total_sq - old * old
+        return total, total_sq
+
+    def stats(self, x, commit):
+        """x を追加した窓の (平均, 標準偏差)。窓が埋まるまでは NaN"""
+        full = len(self.values) >= self.n - 1
+        if commit:
+            self.push(x)
+            total, total_sq = self.total, self.total_sq
+        else:
+            total, total_sq = self._sums(x)
+        if not full:
+            return NAN, NAN
+        n = self.n
+        shift = self.shift if self.shift is not None else x
+        mean = total / n
+        return mean + shift, math.sqrt(max(total_sq / n - mean * mean, 0.0))
+
+
+class SMA(Indicator):
+    """単純移動平均"""
+    overlay = True
+
+    def __init__(self, n=20):
+        super().__init__(n)
+        self.n = n
+        self.window = _Window(n)
+
+    def push(self, o, h, l, c):
+        return (self.window.stats(c, True)[0],)
+
+    def peek(self, o, h, l, c):
+        return (self.window.stats(c, False)[0],)
+
+    def batch(self, cols):
+        c = np.asarray(cols['close'], dtype=float)
+        out = np.full(len(c), NAN)
+        if len(c) >= self.n:
+            shift = c[0]
+            out[self.n - 1:] = _rolling_sum(c - shift, self.n) / self.n + shift
+        self.window.load(c)
+        return {'value': out}
+
+
+class EMA(Indicator):
+    """指数移動平均 (最初の n 本の単純平均から開始)"""
+    overlay = True
+
+    def __init__(self, n=20):
+        super().__init__(n)
+        self.n = n
+        self.alpha = 2.0 / (n + 1)
+        self.count = 0
+        self.value = NAN
+        self.seed_sum = 0.0
+
+    def _next(self, x):
+        count = self.count + 1
+        if count < self.n:
+            return count, NAN, self.seed_sum + x
+        if count == self.n:
+            return count, (self.seed_sum + x) / self.n, 0.0
+        return count, self.value + self.alpha * (x - self.value), 0.0
+
+    def push_value(self, x):
+        self.count, self.value, self.seed_sum = self._next(x)
+        return self.value
+
+    def peek_value(self, x):
+        return self._next(x)[1]
+
+    def push(self, o, h, l, c):
+        return (self.push_value(c),)
+
+    def peek(self, o, h, l, c):
+        return (self.peek_value(c),)
+
+    def batch_values(self, x):
+        x = np.asarray(x, dtype=float)
+        n = self.n
+        out = np.full(len(x), NAN)
+        self.count = len(x)
+        if len(x) < n:
+            self.value, self.seed_sum = NAN, float(x.sum())
+            return out
+        out[n - 1] = x[:n].mean()
+        out[n:] = _ewm(x[n:], self.alpha, out[n - 1])
+        self.value, self.seed_sum = float(out[-1]), 0.0
+        return out
+
+    def batch(self, cols):
+        return {'value': self.batch_values(cols['close'])}
+
+
+class BB(Indicator):
+    """ボリンジャーバンド (中心線 ± k × 標準偏差、母標準偏差)"""
+    outputs = ('mid', 'upper', 'lower')
+    overlay = True
+
+    def __init__(self, n=20, k=2):
+        super().__init__(n, k)
+        self.n = n
+        self.k = k
+        self.window = _Window(n)
+
+    def _bands(self, mean, std):
+        return mean, mean + self.k * std, mean - self.k * std
+
+    def push(self, o, h, l, c):
+        return self._bands(*self.window.stats(c, True))
+
+    def peek(self, o, h, l, c):
+        return self._bands(*self.window.stats(c, False))
+
+    def batch(self, cols):
+        c = np.asarray(cols['close'], dtype=float)
+        mean = np.full(len(c), NAN)
+        std = np.full(len(c), NAN)
+        if len(c) >= self.n:
+            d = c - c[0]
+            m = _rolling_sum(d, self.n) / self.n
+            var = _rolling_sum(d * d, self.n) / self.n - m * m
+            mean[self.n - 1:] = m + c[0]
+            std[self.n - 1:] = np.sqrt(np.maximum(var, 0.0))
+        self.window.load(c)
+        return dict(zip(self.outputs, self._bands(mean, std)))
+
+
+class RSI(Indicator):
+    """RSI (ワイルダーの平滑化)"""
+    def __init__(self, n=14):
+        super().__init__(n)
+        self.n = n
+        self.prev = None
+        self.count = 0          # 値幅の個数
+        self.avg_gain = self.avg_loss = 0.0
+
+    @staticmethod
+    def _rsi(gain, loss):
+        if loss == 0:
+            return 100.0 if gain > 0 else 50.0
+        return 100.0 - 100.0 / (1.0 + gain / loss)
+
+    def _next(self, c):
+        if self.prev is None:
+            return 0, 0.0, 0.0, NAN
+        change = c - self.prev
+        g, l = max(change, 0.0), max(-change, 0.0)
+        count, n = self.count + 1, self.n
+        if count <= n:
+            # 最初の n 本は単純平均 (合計を持っておく)
+            gain, loss = self.avg_gain + g, self.avg_loss + l
+            if count < n:
+                return count, gain, loss, NAN
+            gain, loss = gain / n, loss / n
+        else:
+            gain = self.avg_gain + (g - self.avg_gain) / n
+            loss = self.avg_loss + (l - self.avg_loss) / n
+        return count, gain, loss, self._rsi(gain, loss)
+
+    def push(self, o, h, l, c):
+        self.count, self.avg_gain, self.avg_loss, value = self._next(c)
+        self.prev = c
+        return (value,)
+
+    def peek(self, o, h, l, c):
+        return (self._next(c)[3],)
+
+    def batch(self, cols):
+        c = np.asarray(cols['close'], dtype=float)
+        n = self.n
+        out = np.full(len(c), NAN)
+        change = np.diff(c)
+        gains, losses = np.maximum(change, 0.0), np.maximum(-change, 0.0)
+        self.prev = float(c[-1]) if len(c) else None
+        self.count = len(change)
+        if len(change) < n:
+            self.avg_gain, self.avg_loss = float(gains.sum()), float(losses.sum())
+            return {'value': out}
+        ag = np.empty(len(change) - n + 1)
+        al = np.empty_like(ag)
+        ag[0], al[0] = gains[:n].mean(), losses[:n].mean()
+        ag[1:] = _ewm(gains[n:], 1.0 / n, ag[0])
+        al[1:] = _ewm(losses[n:], 1.0 / n, al[0])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = 100.0 - 100.0 / (1.0 + ag / al)
+        rsi[al == 0] = np.where(ag[al == 0] > 0, 100.0, 50.0)
+        out[n:] = rsi
+        self.avg_gain, self.avg_loss = float(ag[-1]), float(al[-1])
+        return {'value': out}
+
+
+class MACD(Indicator):
+    """MACD (短期 EMA − 長期 EMA、シグナルは MACD の EMA)"""
+    outputs = ('macd', 'signal', 'hist')
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        super().__init__(fast, slow, signal)
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def push(self, o, h, l, c):
+        macd = self.fast.push_value(c) - self.slow.push_value(c)
+        if math.isnan(macd):
+            return NAN, NAN, NAN
+        sig = self.signal.push_value(macd)
+        return macd, sig, macd - sig
+
+    def peek(self, o, h, l, c):
+        macd = self.fast.peek_value(c) - self.slow.peek_value(c)
+        if math.isnan(macd):
+            return NAN, NAN, NAN
+        sig = self.signal.peek_value(macd)
+        return macd, sig, macd - sig
+
+    def batch(self, cols):
+        c = np.asarray(cols['close'], dtype=float)
+        macd = self.fast.batch_values(c) - self.slow.batch_values(c)
+        sig = np.full(len(c), NAN)
+        valid = np.flatnonzero(~np.isnan(macd))
+        start = valid[0] if len(valid) else len(c)
+        sig[start:] = self.signal.batch_values(macd[start:])
+        return {'macd': macd, 'signal': sig, 'hist': macd - sig}
+
+
+class ATR(Indicator):
+    """ATR (真の値幅のワイルダー平滑化)"""
+    def __init__(self, n=14):
+        super().__init__(n)
+        self.n = n
+        self.prev = None
+        self.count = 0
+        self.value = 0.0  # 埋まるまでは合計
+
+    def _next(self, h, l):
+        tr = h - l if self.prev is None else max(h - l, abs(h - self.prev), abs(l - self.prev))
+        count, n = self.count + 1, self.n
+        if count < n:
+            return count, self.value + tr, NAN
+        if count == n:
+            value = (self.value + tr) / n
+        else:
+            value = self.value + (tr - self.value) / n
+        return count, value, value
+
+    def push(self, o, h, l, c):
+        self.count, self.value, out = self._next(h, l)
+        self.prev = c
+        return (out,)
+
+    def peek(self, o, h, l, c):
+        return (self._next(h, l)[2],)
+
+    def batch(self, cols):
+        h = np.asarray(cols['high'], dtype=float)
+        l = np.asarray(cols['low'], dtype=float)
+        c = np.asarray(cols['close'], dtype=float)
+        n = self.n
+        out = np.full(len(c), NAN)
+        tr = h - l
+        if len(c) > 1:
+            pc = c[:-1]
+            tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(h[1:] - pc), np.abs(l[1:] - pc)))
+        self.prev = float(c[-1]) if len(c) else None
+        self.count = len(c)
+        if len(c) < n:
+            self.value = float(tr.sum())
+            return {'value': out}
+        out[n - 1] = tr[:n].mean()
+        out[n:] = _ewm(tr[n:], 1.0 / n, out[n - 1])
+        self.value = float(out[-1])
+        return {'value': out}
+
+
+INDICATORS = {cls.__name__: cls for cls in (SMA, EMA, BB, RSI, MACD, ATR)}
+
+
+def make_indicator(spec):
+    """'SMA(20)' / 'BB(20,2)' / 'MACD' のような指定から指標を作る"""
+    m = re.fullmatch(r"\s*(\w+)\s*(?:\((.*)\))?\s*", spec)
+    if m is None or m.group(1).upper() not in INDICATORS:
+        raise ValueError(f"unknown indicator: {spec}")
+    params = [float(p) if "." in p else int(p) for p in (m.group(2) or "").split(",") if p.strip()]
+    return INDICATORS[m.group(1).upper()](*params)
+
+
+# ---------------------------------------------------------
+# 銘柄・時間足ごとの指標値 (チャート用)
+# ---------------------------------------------------------
+class IndicatorSeries:
+    """1つの指標の確定足ぶんの値 (容量は倍々で拡張)"""
+    def __init__(self, indicator):
+        self.indicator = indicator
+        self.values = np.empty((1024, len(indicator.outputs)))
+        self.size = 0
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=float).reshape(-1, len(self.indicator.outputs))
+        need = self.size + len(rows)
+        if need > len(self.values):
+            grown = np.empty((max(need, len(self.values) * 2), self.values.shape[1]))
+            grown[:self.size] = self.values[:self.size]
+            self.values = grown
+        self.values[self.size:need] = rows
+        self.size = need
+
+
+class _View:
+    """1つのチャートに渡した指標値 (表示範囲 idx と、そのとき確定していた足の本数)"""
+    __slots__ = ('idx', 'values', 'size')
+
+    def __init__(self, idx, width):
+        self.idx = idx
+        self.values = np.full((len(idx), width), NAN)
+        self.size = 0
+
+
+class IndicatorStore:
+    """BarAggregator の足から指標を求める (チャートで表示中の銘柄・指標のみ)
+
+    初回は確定足の履歴を batch() で一括計算し、以降は増えた確定足だけを
+    push() し、形成中の足は peek() で求める。チャートには表示範囲の
+    値だけを渡し、表示範囲が前回と同じなら前回から変わった末尾
+    (新しく確定した足と形成中の足) だけを書き換える。
+    """
+    def __init__(self, bars):
+        self.bars = bars
+        self.series = {}  # (symbol, tf, spec) -> IndicatorSeries
+        self.views = {}   # (owner, symbol, tf, spec) -> _View
+        self.lock = threading.Lock()
+
+    def _sync(self, symbol, tf, spec):
+        """増えた確定足を取り込み、(系列, 形成中の足の値) を返す"""
+        key = (symbol, tf, spec)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = IndicatorSeries(make_indicator(spec))
+        ind = series.indicator
+        cols, bar = self.bars.tail(symbol, tf, series.size)
+        if series.size == 0 and len(cols['ts']):
+            out = ind.batch(cols)
+            series.extend(np.column_stack([out[o] for o in ind.outputs]))
+        elif len(cols['ts']):
+            series.extend([ind.push(*row) for row in zip(
+                *(cols[f].tolist() for f in ('open', 'high', 'low', 'close')))])
+        live = ind.peek(*bar[1:5]) if bar is not None else None
+        return series, live
+
+    def drop(self, symbol, tf):
+        """表示しなくなった銘柄・時間足の指標を捨てる"""
+        with self.lock:
+            for key in [k for k in self.series if k[:2] == (symbol, tf)]:
+                del self.series[key]
+            for key in [k for k in self.views if k[1:3] == (symbol, tf)]:
+                del self.views[key]
+
+    def forget(self, owner):
+        """チャートが描画器を手放したときに、そのチャートに渡した値を捨てる"""
+        with self.lock:
+            for key in [k for k in self.views if k[0] is owner]:
+                del self.views[key]
+
+    def values(self, symbol, tf, specs, idx, owner=None):
+        """基準足の番号 idx (昇順) ごとの指標値
+
+        戻り値: [(表示名, 別枠名 (None = ローソク足と同じ軸), 値の配列), ...]
+        値の配列は owner ごとに使い回し、表示範囲が前回と同じなら
+        前回の確定足の本数以降 (変わった末尾) だけを書き換える。
+        """
+        idx = np.asarray(idx, dtype=np.intp)
+        result = []
+        with self.lock:
+            for spec in specs:
+                series, live = self._sync(symbol, tf, spec)
+                ind = series.indicator
+                key = (owner, symbol, tf, spec)
+                view = self.views.get(key)
+                if view is None or not np.array_equal(view.idx, idx):
+                    view = self.views[key] = _View(idx, len(ind.outputs))
+                start = int(np.searchsorted(idx, min(view.size, series.size)))
+                tail, values = idx[start:], view.values[start:]
+                closed = tail < series.size
+                values[:] = NAN
+                values[closed] = series.values[tail[closed]]
+                if live is not None:
+                    values[tail == series.size] = live
+                view.size = series.size
+                pane = None if ind.overlay else ind.label
+                for j, name in enumerate(ind.outputs):
+                    label = ind.label if len(ind.outputs) == 1 else f"{ind.label} {name}"
+                    result.append((label, pane, view.values[:, j]))
+        return result
@@ -1,25 +1,45 @@
+import time
+STARTUP_T0 = time.perf_counter()  # 起動時間の計測用
+
 import tkinter as tk
 from tkinter import ttk
 import threading
-import time
+import importlib
 import sys
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-import random
-import csv
 import math
+from concurrent.futures import ThreadPoolExecutor
 
-# --- グラフ描画用 ---
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import mplfinance as mpf
+from engine import DataManager
+from feed import LatestDispatcher
+from render import FrameScheduler, RenderService, TextCells, render_rate_rows
+from orders import BUY, SELL, MARKET, LIMIT, STOP
+from probes import PROBES
+
+# 重いモジュール (pandas / numpy / matplotlib / PIL) は初回使用時に読み込む。
+# ログイン画面を先に出すため、ここでは import しない。
+HEAVY_MODULES = ("numpy", "pandas", "chart", "PIL.ImageTk")
 
 # ---------------------------------------------------------
 # 設定・定数・配色 (GMOクリック証券風ダークテーマ)
 # ---------------------------------------------------------
-CSV_FILE = "login.csv"
-UPDATE_INTERVAL = 1000  # 更新間隔 (ms) = 1秒
+CSV_FILE = "login.csv"  # 旧形式のログイン情報 (初回起動時に CREDENTIALS_DB へ取り込む)
+CREDENTIALS_DB = "users.db"  # ログイン情報 (SQLite, ソルト付きハッシュ)
+UPDATE_INTERVAL = 1000  # 更新間隔 (ms) = 1秒 (1秒未満も可)
+FRAME_RATE = 30  # 画面反映の上限 (回/秒)。ティックが何件届いても表示中の画面を1フレームに1回だけ描く
+TICK_BUFFER_SIZE = 16384  # 1銘柄あたりのティック保持数
+ARCHIVE_DIR = "data"  # ティック・確定足の保存先 (None で保存しない)。起動時に直近分を読み込む
+CHART_BARS = 100  # チャートに表示する足の本数 (初期値)
+CHART_MIN_BARS = 20  # ズームインの下限
+CHART_PX_PER_BAR = 4  # 1本あたりの最小ピクセル幅 (これ以上細かい分は間引く)
+CHART_INDICATORS = ("SMA(20)", "EMA(50)", "BB(20,2)", "RSI(14)", "MACD(12,26,9)", "ATR(14)")  # チャートで選べる指標
+CHART_LAYOUTS = {"1": (1, 1), "1×2": (1, 2), "2×2": (2, 2)}  # 分割表示 (行, 列)
+CHART_LAYOUT = "1"  # 初期レイアウト
+CHART_DEFAULTS = (("USD_JPY", "1m"), ("EUR_JPY", "1m"), ("GBP_JPY", "5m"), ("BTC_JPY", "1m"))  # 分割時の初期銘柄
+PREWARM_VIEWS = True  # ログイン後、未表示の画面を裏で先に作っておく
+PORTFOLIO_REFRESH = 250  # ホーム画面の口座評価を反映する最短間隔 (ms)
+ALERT_TOAST_MS = 5000  # アラート通知を画面右下に出しておく時間 (ms)
+ALERT_TOAST_LINES = 5  # 通知に並べる最大件数 (残りは件数だけ表示)
+STATS_REFRESH = 500  # 計測オーバーレイの更新間隔 (ms)。F12 で表示切替、F11 で書き出し
 
 # 配色定義
 COLOR_BG_LOGIN = "#0e1629"     # ログイン画面背景
@@ -57,79 +77,6 @@ def center_window(window, width, height):
     y = (screen_height // 2) - (height // 2)
     window.geometry(f"{width}x{height}+{x}+{y}")
 
-# ---------------------------------------------------------
-# データ管理クラス
-# ---------------------------------------------------------
-class DataManager:
-    @staticmethod
-    def fetch_real_data():
-        """外部モジュールまたはダミーからデータを取得"""
-        try:
-            import repRateModu01
-            fd = repRateModu01.fetch_get_FXrate()
-            fg = repRateModu01.fetch_get_Cryptorate()
-            return fd, fg
-        except ImportError:
-            return DataManager.create_dummy_dataframe()
-        except Exception as e:
-            print(f"Data Fetch Error: {e}")
-            return pd.DataFrame(), pd.DataFrame()
-
-    @staticmethod
-    def create_dummy_dataframe():
-        # FXダミー
-        fx_data = []
-        for pair in ['USD_JPY', 'EUR_JPY', 'GBP_JPY', 'TRY_JPY']:
-            base = 150.0 if 'USD' in pair else 160.0
-            bid = base + random.uniform(-0.1, 0.1)
-            fx_data.append({
-                'symbol': pair, 'bid': bid, 'ask': bid + 0.003, 
-                'high': bid + 0.5, 'low': bid - 0.5
-            })
-        
-        # Cryptoダミー
-        crypto_data = []
-        for pair in ['BTC_JPY', 'ETH_JPY', 'XRP_JPY', 'DOGE_JPY']:
-            base = 14000000 if 'BTC' in pair else 500000
-            bid = base + random.uniform(-100, 100)
-            crypto_data.append({
-                'symbol': pair, 'bid': bid, 'ask': bid + 100, 
-                'high': bid * 1.01, 'low': bid * 0.99, 'volume': 1000
-            })
-            
-        return pd.DataFrame(fx_data), pd.DataFrame(crypto_data)
-
-    @staticmethod
-    def get_ohlc(periods=60):
-        end_time = datetime.now()
-        start_time = end_time - timedelta(minutes=periods)
-        index = pd.date_range(start=start_time, periods=periods, freq='1min')
-        base = 155.50
-        close = base + np.cumsum(np.random.randn(periods) * 0.05)
-        high = close + np.random.rand(periods) * 0.03
-        low = close - np.random.rand(periods) * 0.03
-        open_ = close - np.random.randn(periods) * 0.02
-        df = pd.DataFrame({
-            'Open': open_, 'High': high, 'Low': low, 'Close': close,
-            'Volume': np.random.randint(100, 1000, size=periods)
-        }, index=index)
-        return df
-
-    @staticmethod
-    def get_news():
-        titles = [
-            "米GDP速報値、市場予想を上回る", "日銀総裁「緩和的な金融環境を維持」",
-            "ドル円、一時156円台へ上昇", "欧州中銀、利下げ観測が後退",
-            "【市況】東京市場、前場は小幅反落", "原油先物、供給懸念で上昇"
-        ]
-        news_data = []
-        t = datetime.now()
-        for title in titles:
-            t_str = t.strftime("%m/%d %H:%M")
-            news_data.append((t_str, title))
-            t -= timedelta(minutes=random.randint(10, 60))
-        return news_data
-
 # ---------------------------------------------------------
 # 各画面（タブ）のクラス
 # ---------------------------------------------------------
@@ -149,18 +96,25 @@ class HomeView(tk.Frame):
             f = tk.Frame(info_frame, bg=COLOR_PANEL_WHITE)
             f.grid(row=0, column=col, sticky="nsew", padx=10)
             tk.Label(f, text=label, font=("Meiryo UI", 10), fg="#666", bg=COLOR_PANEL_WHITE).pack(anchor="w")
-            tk.Label(f, text=val_text, font=("Arial", size, "bold"), fg=color, bg=COLOR_PANEL_WHITE).pack(anchor="e")
-
-        add_info(0, "余力", "9,788,123円")
-        add_info(1, "時価評価総額", "14,198,000円")
-        add_info(2, "評価損益", "+1,091,000円", COLOR_ACCENT_RED)
-        add_info(3, "証拠金維持率", "321.95%", "blue")
+            value = tk.Label(f, text=val_text, font=("Arial", size, "bold"), fg=color, bg=COLOR_PANEL_WHITE)
+            value.pack(anchor="e")
+            return value
+
+        # 口座評価 (PortfolioValuer) の値で update_summary() が書き換える
+        self.info_labels = {
+            'buying_power': add_info(0, "余力", "-"),
+            'equity': add_info(1, "時価評価総額", "-"),
+            'unrealized': add_info(2, "評価損益", "-", COLOR_ACCENT_RED),
+            'margin_ratio': add_info(3, "証拠金維持率", "-", "blue"),
+        }
+        self.info_texts = {}
 
         menu_frame = tk.Frame(self, bg=COLOR_BG_MAIN)
         menu_frame.pack(fill="both", expand=True, padx=20)
         menus = [("✉️", "お知らせ"), ("To", "入出金/振替"), ("⚙️", "注文設定"), ("📓", "トレード日記"),
                  ("🔔", "アラート"), ("💰", "スワップ"), ("📄", "報告書"), ("👤", "登録情報"),
                  ("ℹ️", "ヘルプ"), ("🔧", "設定"), ("❓", "問い合わせ"), ("🔒", "ログアウト")]
+        commands = {"アラート": self.open_alerts, "報告書": self.export_report}
         cols = 6
         for i in range(cols): menu_frame.columnconfigure(i, weight=1)
         for i, (icon, text) in enumerate(menus):
@@ -168,16 +122,433 @@ class HomeView(tk.Frame):
             btn_f = tk.Frame(menu_frame, bg=COLOR_BG_MAIN, padx=5, pady=5)
             btn_f.grid(row=r, column=c, sticky="nsew")
             btn = tk.Button(btn_f, text=f"{icon}\n{text}", font=FONT_M, bg=COLOR_BTN_MENU, fg="white", 
-                            relief="flat", activebackground="#354675", activeforeground="white")
+                            relief="flat", activebackground="#354675", activeforeground="white",
+                            command=commands.get(text))
             btn.pack(fill="both", expand=True, ipady=20)
 
+    def open_alerts(self):
+        """アラート設定ウィンドウ (開いていれば前面へ)"""
+        app = self.winfo_toplevel()
+        if app.alert_dialog is None or not app.alert_dialog.winfo_exists():
+            app.alert_dialog = AlertDialog(app)
+        app.alert_dialog.lift()
+
+    def export_report(self):
+        """報告書: 約定履歴を CSV に書き出す (書き出しは裏スレッドで塊ごとに行う)"""
+        app = self.winfo_toplevel()
+        if not len(app.history):
+            app.show_toast("約定履歴がありません", title="📄 報告書")
+            return
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(parent=app, title="報告書の保存先", defaultextension=".csv",
+                                            initialfile=time.strftime("report_%Y%m%d_%H%M%S.csv"),
+                                            filetypes=[("CSV", "*.csv")])
+        if not path:
+            return
+
+        def job():
+            try:
+                text = f"{app.history.export_csv(path):,}件を書き出しました\n{path}"
+            except Exception as e:
+                print(f"Report Error: {e}")
+                text = f"書き出しに失敗しました\n{e}"
+            app.after(0, lambda: app.show_toast(text, title="📄 報告書"))
+        threading.Thread(target=job, name="report", daemon=True).start()
+
+    def update_summary(self, summary):
+        """口座の4項目を反映 (表示文字列が変わったラベルだけ書き換える)"""
+        ratio = summary['margin_ratio']
+        texts = {
+            'buying_power': f"{summary['buying_power']:,.0f}円",
+            'equity': f"{summary['equity']:,.0f}円",
+            'unrealized': f"{summary['unrealized']:+,.0f}円",
+            'margin_ratio': "-" if ratio is None else f"{ratio:,.2f}%",
+        }
+        for key, text in texts.items():
+            if self.info_texts.get(key) != text:
+                self.info_texts[key] = text
+                self.info_labels[key].config(text=text)
+        color = COLOR_ACCENT_BLUE if summary['unrealized'] < 0 else COLOR_ACCENT_RED
+        self.info_labels['unrealized'].config(fg=color)
+
+
+class AlertDialog(tk.Toplevel):
+    """アラートの登録・削除と発火履歴"""
+    KINDS = (("上抜け", "above"), ("下抜け", "below"), ("変動率 (%)", "percent"), ("スプレッド拡大", "spread"))
+    HISTORY = 200  # 履歴に残す通知の件数
+
+    def __init__(self, app):
+        super().__init__(app, bg=COLOR_BG_MAIN)
+        self.app = app
+        self.title("アラート")
+        self.geometry("720x520")
+        self.create_layout()
+        self.refresh()
+
+    def create_layout(self):
+        form = tk.Frame(self, bg=COLOR_PANEL_BG, padx=10, pady=10)
+        form.pack(fill="x", padx=10, pady=10)
+        latest = self.app.orders.latest
+        symbols = sorted(latest.symbols) if latest is not None else []
+        self.symbol = ttk.Combobox(form, values=symbols, width=12)
+        self.symbol.set(SpeedOrderView.SYMBOL)
+        self.symbol.pack(side="left", padx=5)
+        self.kind = ttk.Combobox(form, values=[k for k, _ in self.KINDS], state="readonly", width=14)
+        self.kind.current(0)
+        self.kind.pack(side="left", padx=5)
+        self.value_entry = tk.Entry(form, font=("Arial", 12), width=12, justify="center")
+        self.value_entry.pack(side="left", padx=5)
+        self.repeat = tk.BooleanVar(value=True)
+        tk.Checkbutton(form, text="繰り返し", variable=self.repeat, bg=COLOR_PANEL_BG, fg="white",
+                       selectcolor=COLOR_PANEL_BG, activebackground=COLOR_PANEL_BG).pack(side="left", padx=5)
+        tk.Button(form, text="追加", bg=COLOR_BTN_MENU, fg="white", width=8, command=self.add).pack(side="left", padx=5)
+        tk.Button(form, text="削除", bg="#555", fg="white", width=8, command=self.remove).pack(side="left", padx=5)
+
+        cols = ("ID", "内容", "発火", "最終")
+        self.tree = ttk.Treeview(self, columns=cols, show="headings", height=10)
+        for c, w in zip(cols, (50, 330, 60, 100)):
+            self.tree.heading(c, text=c)
+            self.tree.column(c, width=w, anchor="w" if c == "内容" else "center")
+        self.tree.pack(fill="both", expand=True, padx=10)
+        self.message = tk.Label(self, text="", font=FONT_S, fg=COLOR_ACCENT_GOLD, bg=COLOR_BG_MAIN)
+        self.message.pack(fill="x", padx=10)
+        self.history = tk.Listbox(self, height=8, bg=COLOR_PANEL_BG, fg="white", font=FONT_S)
+        self.history.pack(fill="x", padx=10, pady=(0, 10))
+
+    def add(self):
+        kind = dict(self.KINDS)[self.kind.get()]
+        # 入力欄は手入力もできるので、配信中の銘柄名 (USD_JPY 形式) に直してから確かめる
+        symbol = self.symbol.get().strip().upper().replace("/", "_")
+        latest = self.app.orders.latest
+        if latest is None or symbol not in latest:
+            self.message.config(text=f"登録エラー: 配信されていない銘柄です ({symbol or '未入力'})")
+            return
+        self.symbol.set(symbol)
+        try:
+            alert = self.app.alerts.add(symbol, kind, self.value_entry.get(), repeat=self.repeat.get())
+        except ValueError as e:
+            self.message.config(text=f"登録エラー: {e}")
+            return
+        self.message.config(text=f"登録: #{alert.id} {alert.describe()}")
+        self.refresh()
+
+    def remove(self):
+        for iid in self.tree.selection():
+            self.app.alerts.remove(int(iid))
+        self.refresh()
+
+    def refresh(self):
+        """登録一覧を書き直す (登録・削除のときだけ呼ぶ)"""
+        self.tree.delete(*self.tree.get_children())
+        for alert in self.app.alerts.list():
+            self.tree.insert("", "end", iid=str(alert.id), values=self.row_values(alert))
+
+    @staticmethod
+    def row_values(alert):
+        last = time.strftime("%H:%M:%S", time.localtime(alert.last_fired)) if alert.last_fired else "-"
+        return (alert.id, alert.describe(), alert.fired, last)
+
+    def add_events(self, events):
+        """発火したアラートの行だけを書き換える (1回限りで外れたものは行を消す)"""
+        for event in events:
+            stamp = time.strftime("%H:%M:%S", time.localtime(event.ts))
+            self.history.insert(0, f"{stamp}  {event.message()}")
+        self.history.delete(self.HISTORY, "end")
+        for alert in {event.alert.id: event.alert for event in events}.values():
+            iid = str(alert.id)
+            if not self.tree.exists(iid):
+                continue
+            if self.app.alerts.active(alert.id):
+                self.tree.item(iid, values=self.row_values(alert))
+            else:
+                self.tree.delete(iid)
+
+
+class RateGrid(tk.Frame):
+    """仮想スクロールのレート表
+
+    1枚の Canvas 上に「画面に見えている行数分」だけテキストを用意し、
+    スクロール時は銘柄を差し替えて使い回す。銘柄数が何千あっても
+    生成・更新コストは表示行数ぶんで一定。
+    """
+    ROW_HEIGHT = 44
+    HEADER_HEIGHT = 28
+    # (見出し, x位置(幅に対する比率), anchor, フォント, 色)
+    COLUMNS = [
+        ("通貨ペア", 0.02, "w", FONT_M, "white"),
+        ("Bid (売)", 0.42, "e", FONT_NUM_S, COLOR_ACCENT_BLUE),
+        ("Ask (買)", 0.64, "e", FONT_NUM_S, COLOR_ACCENT_RED),
+        ("High", 0.81, "e", FONT_S, "white"),
+        ("Low", 0.98, "e", FONT_S, "white"),
+    ]
+
+    def __init__(self, master, pairs=(), formatter=None):
+        super().__init__(master, bg=COLOR_BG_MAIN)
+        self.formatter = formatter or (lambda pair: "{:,.3f}")
+        self.canvas = tk.Canvas(self, bg=COLOR_BG_MAIN, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.pairs = []
+        self.symbols = []
+        self.formats = []
+        self.top = 0            # 先頭に表示している行番号
+        self.slots = []         # 行ごとの [テキストID x5, 区切り線ID]
+        # テキストID -> 表示中の文字列 (同じ値なら書き換えない、チラつき防止)
+        self.cells = TextCells(lambda item, text: self.canvas.itemconfigure(item, text=text))
+        self.snapshot = None    # 直近の RateSnapshot
+        self.width = 1
+
+        self.header_items = [
+            self.canvas.create_text(0, self.HEADER_HEIGHT // 2, text=h, anchor=a, font=FONT_S, fill="#888")
+            for h, _, a, _, _ in self.COLUMNS
+        ]
+        self.canvas.bind("<Configure>", self._on_configure)
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.canvas.bind(seq, self._on_wheel)
+        self.set_pairs(pairs)
+
+    # --- 表示対象 ---
+    def set_pairs(self, pairs):
+        self.pairs = list(pairs)
+        self.symbols = [p.replace("/", "_") for p in self.pairs]
+        self.formats = [self.formatter(p) for p in self.pairs]
+        self.top = 0
+        self._render()
+
+    def visible_symbols(self):
+        return self.symbols[self.top:self.top + len(self.slots)]
+
+    def refresh(self, snapshot):
+        """最新のスナップショットで、見えている行だけを更新する"""
+        self.snapshot = snapshot
+        self._render()
+
+    # --- 行プール ---
+    def _on_configure(self, event):
+        self.width = max(event.width, 1)
+        need = max(1, math.ceil((event.height - self.HEADER_HEIGHT) / self.ROW_HEIGHT))
+        while len(self.slots) < need:
+            self._create_slot(len(self.slots))
+        while len(self.slots) > need:
+            for item in self.slots.pop():
+                self.canvas.delete(item)
+                self.cells.discard(item)
+        self._layout()
+        self.top = min(self.top, self._max_top())
+        self._render()
+
+    def _create_slot(self, i):
+        y = self.HEADER_HEIGHT + i * self.ROW_HEIGHT + self.ROW_HEIGHT // 2
+        items = [self.canvas.create_text(0, y, text="", anchor=a, font=f, fill=c)
+                 for _, _, a, f, c in self.COLUMNS]
+        line_y = self.HEADER_HEIGHT + (i + 1) * self.ROW_HEIGHT
+        items.append(self.canvas.create_line(0, line_y, self.width, line_y, fill="#333"))
+        self.slots.append(items)
+
+    def _layout(self):
+        """横幅変更時に列の x 位置を合わせ直す"""
+        xs = [self.width * x for _, x, _, _, _ in self.COLUMNS]
+        for item, x in zip(self.header_items, xs):
+            self.canvas.coords(item, x, self.HEADER_HEIGHT // 2)
+        for i, items in enumerate(self.slots):
+            y = self.HEADER_HEIGHT + i * self.ROW_HEIGHT + self.ROW_HEIGHT // 2
+            for item, x in zip(items, xs):
+                self.canvas.coords(item, x, y)
+            line_y = self.HEADER_HEIGHT + (i + 1) * self.ROW_HEIGHT
+            self.canvas.coords(items[-1], 0, line_y, self.width, line_y)
+
+    # --- 描画 ---
+    def _render(self):
+        render_rate_rows(self.cells, self.snapshot, self.pairs, self.symbols, self.formats, self.top,
+                         [items[:5] for items in self.slots])
+        self._update_scrollbar()
+
+    # --- スクロール ---
+    def _max_top(self):
+        return max(0, len(self.pairs) - len(self.slots))
+
+    def _scroll_to(self, top):
+        top = max(0, min(int(top), self._max_top()))
+        if top != self.top:
+            self.top = top
+            self._render()
+
+    def yview(self, *args):
+        """Scrollbar からの操作 (moveto / scroll)"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._scroll_to(round(float(args[1]) * len(self.pairs)))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (len(self.slots) if args[2] == "pages" else 1)
+            self._scroll_to(self.top + step)
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self._scroll_to(self.top - 3)
+        else:
+            self._scroll_to(self.top + 3)
+
+    def _update_scrollbar(self):
+        total = max(len(self.pairs), 1)
+        first = self.top / total
+        last = min(1.0, (self.top + len(self.slots)) / total)
+        self.scrollbar.set(first, last)
+
+
+class PagedTable(tk.Frame):
+    """仮想スクロールの表 (建玉・注文・約定履歴)
+
+    Treeview には見えている行数分の行だけを入れておき、スクロール・並べ替え・
+    データ更新のたびに source.rows() で必要な範囲を引いて中身を差し替える。
+    値が変わったセルの行だけ item() で書き換え、行の削除・再挿入はしない。
+
+    source: len() と rows(start, stop, column, descending) と columns を持つもの
+            (history.FillStore / history.ListSource)。version が変わっていなければ描き直さない
+    columns: [(見出し, 列名, 幅, 書式関数)]
+    """
+    ROW_HEIGHT = 30   # Treeview の rowheight と同じ
+    HEADER_HEIGHT = 30
+
+    def __init__(self, master, source, columns, sort=None, descending=True):
+        super().__init__(master, bg=COLOR_BG_MAIN)
+        self.source = source
+        self.columns = columns
+        self.positions = [source.columns.index(name) for _, name, _, _ in columns]
+        self.sort = sort
+        self.descending = descending
+        self.top = 0
+        self.page = 1        # 表示行数 (高さから決まる)
+        self.total = 0
+        self.slots = []      # 行ごとの表示中の values
+        self.rows = []       # 行ごとの元データ (選択行の取得用)
+        self.drawn = None    # 直前に描いたときの (version, top, 並び順, 行数)
+
+        names = [name for _, name, _, _ in columns]
+        self.tree = ttk.Treeview(self, columns=names, show="headings", height=1, selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+        for _, name, width, _ in columns:
+            self.tree.column(name, width=width, anchor="center")
+            self.tree.heading(name, command=lambda n=name: self.sort_by(n))
+        self._update_headings()
+        self.tree.bind("<Configure>", self._on_configure)
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(seq, self._on_wheel)
+
+    # --- 並べ替え ---
+    def sort_by(self, name):
+        """見出しクリック: 同じ列なら昇順/降順を切り替え、別の列なら昇順から"""
+        if self.sort == name:
+            self.descending = not self.descending
+        else:
+            self.sort, self.descending = name, False
+        self.top = 0
+        self._update_headings()
+        self.refresh()
+
+    def _update_headings(self):
+        for title, name, _, _ in self.columns:
+            mark = (" ▼" if self.descending else " ▲") if name == self.sort else ""
+            self.tree.heading(name, text=title + mark)
+
+    # --- 描画 ---
+    def refresh(self, force=False):
+        """見えている範囲を引き直して、変わった行だけ書き換える"""
+        version = getattr(self.source, "version", None)
+        state = (version, self.top, self.sort, self.descending, self.page)
+        if not force and version is not None and state == self.drawn:
+            return
+        self.drawn = state
+        rows = self.source.rows(self.top, self.top + self.page, self.sort, self.descending)
+        self.total = len(self.source)
+        if self.top and self.top > self._max_top():
+            # 件数が減った (建玉の解消・注文の約定) ので末尾に合わせて引き直す
+            self.top = self._max_top()
+            rows = self.source.rows(self.top, self.top + self.page, self.sort, self.descending)
+        self.rows = rows
+        for i, row in enumerate(rows):
+            values = tuple(fmt(row[p]) for (_, _, _, fmt), p in zip(self.columns, self.positions))
+            if i < len(self.slots):
+                if self.slots[i] != values:
+                    self.tree.item(i, values=values)
+                    self.slots[i] = values
+            else:
+                self.tree.insert("", "end", iid=i, values=values)
+                self.slots.append(values)
+        while len(self.slots) > len(rows):
+            self.slots.pop()
+            self.tree.delete(len(self.slots))
+        self._update_scrollbar()
+
+    def selected(self):
+        """選択中の行の元データ (なければ None)"""
+        sel = self.tree.selection()
+        if not sel or int(sel[0]) >= len(self.rows):
+            return None
+        return self.rows[int(sel[0])]
+
+    def _on_configure(self, event):
+        page = max(1, (event.height - self.HEADER_HEIGHT) // self.ROW_HEIGHT)
+        if page != self.page:
+            self.page = page
+            self.refresh()
+
+    # --- スクロール ---
+    def _max_top(self):
+        return max(0, self.total - self.page)
+
+    def _scroll_to(self, top):
+        top = max(0, min(int(top), self._max_top()))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def yview(self, *args):
+        """Scrollbar からの操作 (moveto / scroll)"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._scroll_to(round(float(args[1]) * self.total))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self.page if args[2] == "pages" else 1)
+            self._scroll_to(self.top + step)
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self._scroll_to(self.top - 3)
+        else:
+            self._scroll_to(self.top + 3)
+        return "break"  # Treeview 自身のスクロールはさせない
+
+    def _update_scrollbar(self):
+        total = max(self.total, 1)
+        first = self.top / total
+        last = min(1.0, (self.top + self.page) / total)
+        self.scrollbar.set(first, last)
+
+
+def _fmt_time(ts):
+    return time.strftime("%m/%d %H:%M:%S", time.localtime(ts))
+
+
+def _fmt_side(side):
+    return "買" if side == BUY else "売"
+
+
+def _fmt_price(v):
+    return "-" if v is None else f"{v:,.3f}"
+
 
 class TradeView(tk.Frame):
     """【トレード】 リアルタイムレート一覧 (軽量化済み)"""
+    TABS = ("建玉サマリ", "建玉一覧", "注文一覧", "約定履歴")
+
     def __init__(self, master):
         super().__init__(master, bg=COLOR_BG_MAIN)
-        self.rate_labels = {} 
-        self.prev_values = {} # チラつき防止用の前回値保存
         self.create_layout()
 
     def create_layout(self):
@@ -185,126 +556,171 @@ class TradeView(tk.Frame):
         self.columnconfigure(1, weight=2)
         self.rowconfigure(0, weight=1)
 
-        # --- レート表 ---
+        # --- レート表 (仮想スクロール) ---
         left_panel = tk.Frame(self, bg=COLOR_BG_MAIN, padx=10, pady=10)
         left_panel.grid(row=0, column=0, sticky="nsew")
 
-        tk.Label(left_panel, text="リアルタイムレート一覧", font=FONT_M, bg=COLOR_BG_MAIN, fg="white").grid(row=0, column=0, columnspan=5, sticky="w", pady=5)
-
-        headers = ["通貨ペア", "Bid (売)", "Ask (買)", "High", "Low"]
-        for idx, h in enumerate(headers):
-            tk.Label(left_panel, text=h, font=FONT_S, bg=COLOR_BG_MAIN, fg="#888").grid(row=1, column=idx, sticky="ew", padx=5)
+        tk.Label(left_panel, text="リアルタイムレート一覧", font=FONT_M, bg=COLOR_BG_MAIN, fg="white").pack(anchor="w", pady=5)
 
         self.display_pairs = [
             "USD/JPY", "EUR/JPY", "GBP/JPY", "TRY/JPY",
             "BTC/JPY", "ETH/JPY", "XRP/JPY", "DOGE/JPY",
             "BTC/USD"
         ]
+        self.rate_grid = RateGrid(left_panel, self.display_pairs, formatter=self.pair_format)
+        self.rate_grid.pack(fill="both", expand=True)
 
-        for i, pair in enumerate(self.display_pairs, start=2):
-            tk.Label(left_panel, text=pair, font=FONT_M, bg=COLOR_BG_MAIN, fg="white").grid(row=i, column=0, sticky="w", pady=8, padx=5)
-            
-            # ラベル生成・配置
-            self.rate_labels[f"{pair}_bid"] = tk.Label(left_panel, text="-", font=FONT_NUM_S, bg=COLOR_BG_MAIN, fg=COLOR_ACCENT_BLUE)
-            self.rate_labels[f"{pair}_bid"].grid(row=i, column=1, sticky="e", padx=5)
-
-            self.rate_labels[f"{pair}_ask"] = tk.Label(left_panel, text="-", font=FONT_NUM_S, bg=COLOR_BG_MAIN, fg=COLOR_ACCENT_RED)
-            self.rate_labels[f"{pair}_ask"].grid(row=i, column=2, sticky="e", padx=5)
-
-            self.rate_labels[f"{pair}_high"] = tk.Label(left_panel, text="-", font=FONT_S, bg=COLOR_BG_MAIN, fg="white")
-            self.rate_labels[f"{pair}_high"].grid(row=i, column=3, sticky="e", padx=5)
-
-            self.rate_labels[f"{pair}_low"] = tk.Label(left_panel, text="-", font=FONT_S, bg=COLOR_BG_MAIN, fg="white")
-            self.rate_labels[f"{pair}_low"].grid(row=i, column=4, sticky="e", padx=5)
-            
-            ttk.Separator(left_panel, orient="horizontal").grid(row=i*10+5, column=0, columnspan=5, sticky="ew", pady=0)
-
-        # --- 建玉一覧 ---
+        # --- 建玉・注文・約定 (タブ切替) ---
         right_panel = tk.Frame(self, bg=COLOR_BG_MAIN, padx=10, pady=10)
         right_panel.grid(row=0, column=1, sticky="nsew")
 
         tab_box = tk.Frame(right_panel, bg=COLOR_BG_MAIN)
         tab_box.pack(fill="x", pady=5)
-        for t in ["建玉サマリ", "建玉一覧", "注文一覧", "約定履歴"]:
-            tk.Button(tab_box, text=t, font=FONT_S, bg="#333", fg="white", width=10).pack(side="left", padx=1)
+        self.tab_buttons = {}
+        for t in self.TABS:
+            btn = tk.Button(tab_box, text=t, font=FONT_S, bg="#333", fg="white", width=10,
+                            command=lambda name=t: self.select_tab(name))
+            btn.pack(side="left", padx=1)
+            self.tab_buttons[t] = btn
 
-        cols = ("通貨", "売買", "数量", "損益")
-        tree = ttk.Treeview(right_panel, columns=cols, show="headings", height=15)
         style = ttk.Style()
         style.theme_use("clam")
         style.configure("Treeview", background=COLOR_PANEL_BG, foreground="white", fieldbackground=COLOR_PANEL_BG, rowheight=30)
         style.configure("Treeview.Heading", background="#333", foreground="white", font=FONT_S)
-        
+
+        self.tab_body = tk.Frame(right_panel, bg=COLOR_BG_MAIN)
+        self.tab_body.pack(fill="both", expand=True)
+        self.tab_body.rowconfigure(0, weight=1)
+        self.tab_body.columnconfigure(0, weight=1)
+
+        cols = ("通貨", "売買", "数量", "損益")
+        self.position_tree = tree = ttk.Treeview(self.tab_body, columns=cols, show="headings", height=15)
         for c in cols:
             tree.heading(c, text=c)
             tree.column(c, width=60, anchor="center")
 
-        tree.pack(fill="both", expand=True)
-        tree.insert("", "end", values=("USD/JPY", "買", "10,000", "+12,500"))
-
-    def update_table(self, fx_df, crypto_df):
-        """データ更新処理"""
-        try:
-            # 1. FX
-            for sym in ["USD_JPY", "EUR_JPY", "GBP_JPY", "TRY_JPY"]:
-                row = fx_df.loc[fx_df['symbol'] == sym]
-                if not row.empty:
-                    self._update_row(sym.replace("_", "/"), row.iloc[0], is_crypto=False)
-
-            # 2. Crypto
-            for sym in ["BTC_JPY", "ETH_JPY", "XRP_JPY", "DOGE_JPY"]:
-                row = crypto_df.loc[crypto_df['symbol'] == sym]
-                if not row.empty:
-                    self._update_row(sym.replace("_", "/"), row.iloc[0], is_crypto=True)
-
-            # 3. BTC/USD 計算
-            usd = fx_df.loc[fx_df['symbol'] == 'USD_JPY']
-            btc = crypto_df.loc[crypto_df['symbol'] == 'BTC_JPY']
-            
-            if not usd.empty and not btc.empty:
-                u_ask = float(usd.iloc[0]['ask'])
-                u_bid = float(usd.iloc[0]['bid'])
-                b_bid = float(btc.iloc[0]['bid'])
-                b_ask = float(btc.iloc[0]['ask'])
-                
-                # クロスレート
-                calc_bid = b_bid / u_ask
-                calc_ask = b_ask / u_bid
-                data = {'bid': calc_bid, 'ask': calc_ask, 'high': 0, 'low': 0}
-                self._update_row("BTC/USD", pd.Series(data), is_crypto=False)
-
-        except Exception:
-            pass
-
-    def _update_row(self, pair, data, is_crypto):
-        """値が変わった場合のみラベルを更新する（チラつき防止）"""
-        fmt = "{:,.0f}" if is_crypto and "BTC" in pair else "{:,.3f}"
-        if pair == "BTC/USD": fmt = "{:,.2f}"
-
-        vals = {
-            'bid': fmt.format(float(data['bid'])),
-            'ask': fmt.format(float(data['ask'])),
-            'high': fmt.format(float(data.get('high', 0))),
-            'low': fmt.format(float(data.get('low', 0)))
-        }
-
-        if f"{pair}_bid" in self.rate_labels:
-            self._set_text(f"{pair}_bid", vals['bid'])
-            self._set_text(f"{pair}_ask", vals['ask'])
-            if float(data.get('high', 0)) > 0: self._set_text(f"{pair}_high", vals['high'])
-            if float(data.get('low', 0)) > 0: self._set_text(f"{pair}_low", vals['low'])
+        tree.grid(row=0, column=0, sticky="nsew")
+        self.position_rows = {}  # symbol -> 表示中の values (変化した行だけ書き換える)
+        self.tables = {"建玉サマリ": tree}  # タブ名 -> 表 (建玉サマリ以外は初めて開いたときに作る)
+        self.tab = None
+        self.snapshot = None
+        self.select_tab("建玉サマリ")
+
+    def update_table(self, snapshot):
+        """データ更新処理 (エンジンが作ったスナップショットから表示中の行だけ更新)"""
+        self.rate_grid.refresh(snapshot)
+
+    # --- 建玉・注文・約定タブ ---
+    def select_tab(self, name):
+        if name not in self.tables:
+            self.tables[name] = self.create_table(name)
+            self.tables[name].grid(row=0, column=0, sticky="nsew")
+        for t, btn in self.tab_buttons.items():
+            btn.config(bg=COLOR_BTN_MENU if t == name else "#333")
+        self.tab = name
+        self.tables[name].tkraise()
+        if name == "建玉サマリ":
+            return
+        self.tables[name].refresh(force=True)
+
+    def create_table(self, name):
+        from history import ListSource
+        app = self.winfo_toplevel()
+        if name == "建玉一覧":
+            source = ListSource(self.position_details,
+                                ('symbol', 'side', 'qty', 'avg_price', 'mark', 'unrealized', 'realized'))
+            columns = [("通貨", 'symbol', 70, lambda s: s.replace("_", "/")), ("売買", 'side', 40, _fmt_side),
+                       ("数量", 'qty', 70, "{:,.0f}".format), ("平均単価", 'avg_price', 80, _fmt_price),
+                       ("評価レート", 'mark', 80, _fmt_price), ("評価損益", 'unrealized', 80, "{:+,.0f}".format),
+                       ("確定損益", 'realized', 80, "{:+,.0f}".format)]
+            return PagedTable(self.tab_body, source, columns, sort='symbol', descending=False)
+        if name == "注文一覧":
+            source = ListSource(lambda: [(o.id, o.ts, o.symbol, o.side, o.type, o.qty, o.price)
+                                         for o in app.orders.open_orders()],
+                                ('id', 'ts', 'symbol', 'side', 'type', 'qty', 'price'))
+            types = {MARKET: "成行", LIMIT: "指値", STOP: "逆指値"}
+            columns = [("注文番号", 'id', 60, str), ("時刻", 'ts', 100, _fmt_time),
+                       ("通貨", 'symbol', 70, lambda s: s.replace("_", "/")), ("売買", 'side', 40, _fmt_side),
+                       ("種類", 'type', 50, types.get), ("数量", 'qty', 70, "{:,.0f}".format),
+                       ("価格", 'price', 80, _fmt_price)]
+            table = PagedTable(self.tab_body, source, columns, sort='id', descending=True)
+            tk.Button(table, text="選択した注文を取消", font=FONT_S, bg="#333", fg="white",
+                      command=self.cancel_selected).pack(side="bottom", anchor="e", pady=(5, 0), before=table.scrollbar)
+            return table
+        # 約定履歴: 何十万件でも見えている行だけを FillStore から引く
+        columns = [("約定番号", 'id', 60, str), ("時刻", 'ts', 100, _fmt_time),
+                   ("通貨", 'symbol', 70, lambda s: s.replace("_", "/")), ("売買", 'side', 40, _fmt_side),
+                   ("数量", 'qty', 70, "{:,.0f}".format), ("価格", 'price', 80, _fmt_price),
+                   ("確定損益", 'realized', 80, "{:+,.0f}".format)]
+        return PagedTable(self.tab_body, app.history, columns, sort='id', descending=True)
+
+    def position_details(self):
+        """建玉一覧の行 (評価レートは決済する側: 買いは Bid、売りは Ask)"""
+        rows = []
+        snapshot = self.snapshot
+        for pos in self.winfo_toplevel().orders.open_positions():
+            row = snapshot.get(pos.symbol) if snapshot is not None else None
+            if row is None:
+                mark, pnl = None, 0.0
+            else:
+                bid, ask = float(row[0]), float(row[1])
+                mark, pnl = (bid if pos.qty > 0 else ask), pos.unrealized(bid, ask)
+            rows.append((pos.symbol, BUY if pos.qty > 0 else SELL, abs(pos.qty),
+                         pos.avg_price, mark, pnl, pos.realized))
+        return rows
+
+    def cancel_selected(self):
+        row = self.tables["注文一覧"].selected()
+        if row is not None and self.winfo_toplevel().orders.cancel(row[0]):
+            self.tables["注文一覧"].refresh()
+
+    def update_positions(self, positions, snapshot):
+        """建玉: 銘柄ごとの行をその場で書き換える (行の作り直しはしない)。表示中のタブの表も更新"""
+        self.snapshot = snapshot
+        if self.tab != "建玉サマリ":
+            self.tables[self.tab].refresh()
+        tree = self.position_tree
+        rows = self.position_rows
+        live = set()
+        for pos in positions:
+            live.add(pos.symbol)
+            row = snapshot.get(pos.symbol) if snapshot is not None else None
+            pnl = pos.unrealized(float(row[0]), float(row[1])) if row is not None else 0.0
+            values = (pos.symbol.replace("_", "/"), "買" if pos.qty > 0 else "売",
+                      f"{abs(pos.qty):,.0f}", f"{pnl:+,.0f}")
+            if rows.get(pos.symbol) == values:
+                continue
+            if pos.symbol in rows:
+                tree.item(pos.symbol, values=values)
+            else:
+                tree.insert("", "end", iid=pos.symbol, values=values)
+            rows[pos.symbol] = values
+        for symbol in [s for s in rows if s not in live]:
+            tree.delete(symbol)
+            del rows[symbol]
+
+    def set_watchlist(self, pairs):
+        """表示する通貨ペアを差し替える (数千銘柄でも可)"""
+        self.display_pairs = list(pairs)
+        self.rate_grid.set_pairs(self.display_pairs)
 
-    def _set_text(self, key, text):
-        """前回と同じ値なら更新しない"""
-        if self.prev_values.get(key) != text:
-            self.rate_labels[key].config(text=text)
-            self.prev_values[key] = text
+    @staticmethod
+    def pair_format(pair):
+        """通貨ペアごとの表示書式"""
+        if pair == "BTC/USD": return "{:,.2f}"
+        if pair == "BTC/JPY": return "{:,.0f}"
+        return "{:,.3f}"
 
 
 class SpeedOrderView(tk.Frame):
-    """【スピード注文】"""
+    """【スピード注文】 ペーパートレード (OrderEngine へ発注)"""
+    SYMBOL = "USD_JPY"
+    ORDER_TYPES = (("成行", MARKET), ("指値", LIMIT), ("逆指値", STOP))
+    LOT = 10000  # 数量の単位
+
     def __init__(self, master):
         super().__init__(master, bg=COLOR_BG_MAIN)
+        self.quote = None
         self.create_layout()
 
     def create_layout(self):
@@ -315,17 +731,82 @@ class SpeedOrderView(tk.Frame):
         rate_frame = tk.Frame(container, bg=COLOR_BG_MAIN)
         rate_frame.pack(pady=20)
 
-        tk.Button(rate_frame, text="BID (売)\n155.497", font=("Arial", 20, "bold"),
-                  bg=COLOR_ACCENT_BLUE, fg="white", width=15, height=3, relief="flat").pack(side="left", padx=10)
-        tk.Label(rate_frame, text="0.2", font=("Arial", 14), fg="white", bg="#333", width=4).pack(side="left")
-        tk.Button(rate_frame, text="ASK (買)\n155.499", font=("Arial", 20, "bold"),
-                  bg=COLOR_ACCENT_RED, fg="white", width=15, height=3, relief="flat").pack(side="left", padx=10)
+        self.bid_button = tk.Button(rate_frame, text="BID (売)\n-", font=("Arial", 20, "bold"),
+                                    bg=COLOR_ACCENT_BLUE, fg="white", width=15, height=3, relief="flat",
+                                    command=lambda: self.send(SELL))
+        self.bid_button.pack(side="left", padx=10)
+        self.spread_label = tk.Label(rate_frame, text="-", font=("Arial", 14), fg="white", bg="#333", width=4)
+        self.spread_label.pack(side="left")
+        self.ask_button = tk.Button(rate_frame, text="ASK (買)\n-", font=("Arial", 20, "bold"),
+                                    bg=COLOR_ACCENT_RED, fg="white", width=15, height=3, relief="flat",
+                                    command=lambda: self.send(BUY))
+        self.ask_button.pack(side="left", padx=10)
 
         ctrl_frame = tk.Frame(container, bg=COLOR_PANEL_BG, padx=20, pady=20)
         ctrl_frame.pack(fill="x", pady=20)
         tk.Label(ctrl_frame, text="取引数量 (×10,000)", font=FONT_M, fg="white", bg=COLOR_PANEL_BG).pack()
-        tk.Spinbox(ctrl_frame, from_=1, to=100, font=("Arial", 20), width=10, justify="center").pack(pady=10)
-        tk.Button(ctrl_frame, text="全決済", bg="#555", fg="white", font=FONT_M, width=20).pack(pady=10)
+        self.qty_spin = tk.Spinbox(ctrl_frame, from_=1, to=100, font=("Arial", 20), width=10, justify="center")
+        self.qty_spin.pack(pady=10)
+
+        type_box = tk.Frame(ctrl_frame, bg=COLOR_PANEL_BG)
+        type_box.pack(pady=5)
+        self.order_type = tk.StringVar(value=MARKET)
+        for text, value in self.ORDER_TYPES:
+            tk.Radiobutton(type_box, text=text, value=value, variable=self.order_type, indicatoron=0,
+                           font=FONT_S, width=8, bg="#333", fg="white", selectcolor=COLOR_BTN_MENU).pack(side="left", padx=2)
+        price_box = tk.Frame(ctrl_frame, bg=COLOR_PANEL_BG)
+        price_box.pack(pady=5)
+        tk.Label(price_box, text="注文価格", font=FONT_S, fg="white", bg=COLOR_PANEL_BG).pack(side="left", padx=5)
+        self.price_entry = tk.Entry(price_box, font=("Arial", 14), width=12, justify="center")
+        self.price_entry.pack(side="left")
+
+        tk.Button(ctrl_frame, text="全決済", bg="#555", fg="white", font=FONT_M, width=20,
+                  command=self.close_all).pack(pady=10)
+        self.message = tk.Label(ctrl_frame, text="", font=FONT_S, fg=COLOR_ACCENT_GOLD, bg=COLOR_PANEL_BG)
+        self.message.pack()
+
+    def update_quote(self, snapshot):
+        """最新レートをボタンに反映 (値が変わったときだけ書き換える)"""
+        row = snapshot.get(self.SYMBOL)
+        if row is None:
+            return
+        quote = (float(row[0]), float(row[1]))
+        if quote == self.quote:
+            return
+        self.quote = bid, ask = quote
+        self.bid_button.config(text=f"BID (売)\n{bid:.3f}")
+        self.ask_button.config(text=f"ASK (買)\n{ask:.3f}")
+        self.spread_label.config(text=f"{(ask - bid) * 100:.1f}")
+
+    def on_show(self):
+        latest = self.winfo_toplevel().orders.latest
+        if latest is not None:
+            self.update_quote(latest)
+
+    def send(self, side):
+        """BID ボタンで売り、ASK ボタンで買い"""
+        orders = self.winfo_toplevel().orders
+        try:
+            qty = int(self.qty_spin.get()) * self.LOT
+            order_type = self.order_type.get()
+            price = None
+            if order_type != MARKET:
+                text = self.price_entry.get().strip()
+                price = float(text) if text else None
+            order = orders.submit(self.SYMBOL, side, qty, order_type, price)
+        except ValueError as e:
+            self.message.config(text=f"注文エラー: {e}")
+            return
+        label = "買" if side == BUY else "売"
+        self.message.config(text=f"注文 #{order.id} {label} {qty:,} ({order.status})")
+
+    def close_all(self):
+        try:
+            fills = self.winfo_toplevel().orders.close_all()
+        except ValueError as e:
+            self.message.config(text=f"決済エラー: {e}")
+            return
+        self.message.config(text=f"全決済: {len(fills)} 件" if fills else "決済する建玉はありません")
 
 
 class MarketView(tk.Frame):
@@ -350,43 +831,307 @@ class MarketView(tk.Frame):
             tree.insert("", "end", values=(date, title))
 
 
-class ChartView(tk.Frame):
-    """【チャート】 軽量化・リサイズ対応済み"""
-    def __init__(self, master):
-        super().__init__(master, bg=COLOR_BG_MAIN)
-        self.chart_frame = None
-        self.resize_timer = None
-        self.create_layout()
-
-    def create_layout(self):
-        ctrl_bar = tk.Frame(self, bg=COLOR_HEADER, height=40)
+class ChartPane(tk.Frame):
+    """1枚分のチャート (銘柄・時間足・指標をチャートごとに選ぶ)
+
+    表示中だけ activate() で足の参照と描画器を借り、deactivate() で返す。
+    描画はワーカースレッド、UI側は完成した画像を貼るだけ。
+    """
+    def __init__(self, master, workspace, symbol, timeframe, specs=(), detachable=True):
+        super().__init__(master, bg="black")
+        self.workspace = workspace
+        self.app = workspace.app
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.renderer = None  # 表示中だけ RendererPool から借りる
+        self.photo = None
+        self.size = (1000, 600)
+        self.view_bars = CHART_BARS  # 表示幅 (基準足の本数)
+        self.view_offset = 0         # 右端からのスクロール量 (0 = 最新足に追従)
+        self.drag_start = None
+        self.create_layout(specs, detachable)
+
+    def create_layout(self, specs, detachable):
+        from bars import TIMEFRAMES
+        ctrl_bar = tk.Frame(self, bg=COLOR_HEADER)
         ctrl_bar.pack(fill="x", side="top")
-        tk.Label(ctrl_bar, text="USD/JPY 1分足", font=FONT_M, fg="white", bg=COLOR_HEADER).pack(side="left", padx=20)
-        
+        self.symbol_box = ttk.Combobox(ctrl_bar, width=10, postcommand=self._fill_symbols)
+        self.symbol_box.set(self.symbol)
+        self.symbol_box.bind("<<ComboboxSelected>>", self.on_select)
+        self.symbol_box.bind("<Return>", self.on_select)
+        self.symbol_box.pack(side="left", padx=(10, 4), pady=4)
+        self.tf_box = ttk.Combobox(ctrl_bar, values=list(TIMEFRAMES), state="readonly", width=5)
+        self.tf_box.set(self.timeframe)
+        self.tf_box.bind("<<ComboboxSelected>>", self.on_select)
+        self.tf_box.pack(side="left", padx=4)
+        # 指標の表示切替
+        menu_button = tk.Menubutton(ctrl_bar, text="指標 ▾", font=FONT_S, fg="white", bg=COLOR_HEADER,
+                                    activebackground=COLOR_BTN_MENU, activeforeground="white", relief="flat")
+        menu = tk.Menu(menu_button, tearoff=0)
+        self.indicator_vars = {}
+        for spec in CHART_INDICATORS:
+            var = tk.BooleanVar(value=spec in specs)
+            menu.add_checkbutton(label=spec, variable=var, command=self._request)
+            self.indicator_vars[spec] = var
+        menu_button.config(menu=menu)
+        menu_button.pack(side="left", padx=4)
+        if detachable:
+            tk.Button(ctrl_bar, text="⧉ 別窓", font=FONT_S, fg="white", bg=COLOR_HEADER, bd=0,
+                      activebackground=COLOR_BTN_MENU, activeforeground="white",
+                      command=lambda: self.workspace.detach(self)).pack(side="right", padx=10)
+
         self.chart_frame = tk.Frame(self, bg="black")
         self.chart_frame.pack(fill="both", expand=True)
-        
-        self.draw_chart()
+        self.image_label = tk.Label(self.chart_frame, bg="black", bd=0)
+        self.image_label.place(x=0, y=0, relwidth=1, relheight=1)
+
+        # リサイズ: 要求は描画サービス側で最新の1件に間引かれる
         self.chart_frame.bind("<Configure>", self.on_resize)
+        # ズーム (ホイール) / スクロール (ドラッグ)
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.image_label.bind(seq, self.on_zoom)
+        self.image_label.bind("<ButtonPress-1>", self.on_drag_start)
+        self.image_label.bind("<B1-Motion>", self.on_drag)
+
+    def _fill_symbols(self):
+        latest = self.app.orders.latest
+        if latest is not None:
+            self.symbol_box.config(values=sorted(latest.symbols))
+
+    def specs(self):
+        return [spec for spec, var in self.indicator_vars.items() if var.get()]
+
+    # --- 表示・非表示 ---
+    def activate(self):
+        """足の参照と描画器を借りて描き始める (表示済みなら描き直すだけ)"""
+        if self.renderer is None:
+            self.workspace.acquire(self)
+        self.draw_chart()
 
+    def deactivate(self):
+        """描画器を返す (待機中の図として LRU に残る)"""
+        if self.renderer is None:
+            return
+        self.app.render_service.cancel(id(self))
+        self.workspace.release(self)
+
+    def on_select(self, event=None):
+        symbol = self.symbol_box.get().strip().upper().replace("/", "_")
+        timeframe = self.tf_box.get()
+        if not symbol or (symbol, timeframe) == (self.symbol, self.timeframe):
+            return
+        active = self.renderer is not None
+        self.deactivate()
+        self.symbol, self.timeframe = symbol, timeframe
+        self.symbol_box.set(symbol)
+        self.view_offset = 0
+        if active:
+            self.activate()
+
+    # --- 操作 ---
     def on_resize(self, event):
-        """リサイズ時の負荷軽減（デバウンス処理）"""
-        if self.resize_timer:
-            self.after_cancel(self.resize_timer)
-        self.resize_timer = self.after(500, self.draw_chart)
-
+        if event.width > 1 and event.height > 1:
+            self.size = (event.width, event.height)
+            self._request()
+
+    def _total_bars(self):
+        return self.app.bars.count(self.symbol, self.timeframe)
+
+    def on_zoom(self, event):
+        zoom_in = getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0
+        scale = 1 / 1.25 if zoom_in else 1.25
+        total = self._total_bars()
+        self.view_bars = int(max(CHART_MIN_BARS, min(self.view_bars * scale, max(total, CHART_MIN_BARS))))
+        self.view_offset = max(0, min(self.view_offset, total - self.view_bars))
+        self._request()
+
+    def on_drag_start(self, event):
+        self.drag_start = (event.x, self.view_offset)
+
+    def on_drag(self, event):
+        if self.drag_start is None:
+            return
+        x0, offset0 = self.drag_start
+        bars_per_px = self.view_bars / max(self.size[0], 1)
+        offset = int(offset0 + (event.x - x0) * bars_per_px)
+        offset = max(0, min(offset, self._total_bars() - self.view_bars))
+        if offset != self.view_offset:
+            self.view_offset = offset
+            self._request()
+
+    # --- 描画 ---
     def draw_chart(self):
-        for widget in self.chart_frame.winfo_children():
-            widget.destroy()
+        """全体を描き直す (表示切替時など)"""
+        if self.renderer is not None:
+            self.renderer.invalidate()
+        self._request()
+
+    def update_chart(self):
+        """ティック受信時: 形成中の足だけならワーカー側で部分更新される"""
+        self._request()
+
+    def _request(self):
+        from bars import TIMEFRAMES
+        import numpy as np
+        renderer = self.renderer
+        if renderer is None:
+            return
+        bars, indicators = self.app.bars, self.app.indicators
+        symbol, timeframe = self.symbol, self.timeframe
+        width, height = self.size
+        view_bars, offset = self.view_bars, self.view_offset
+        max_points = max(width // CHART_PX_PER_BAR, CHART_MIN_BARS)
+        specs = self.specs()
+
+        def job():
+            # ワーカースレッドで実行: 表示範囲の足を画面幅ぶんに間引いて描画
+            total = bars.count(symbol, timeframe)
+            end = total - offset
+            cols, step = bars.window(symbol, timeframe, end - view_bars, end, max_points)
+            span = step * TIMEFRAMES[timeframe] * len(cols['ts'])
+            time_format = "%m/%d" if span >= 7 * 86400 else "%m/%d %H:%M" if span >= 86400 else "%H:%M"
+            series = ()
+            if specs:
+                # 間引いた1本ごとに、その区間の最後の基準足 (表示範囲の end まで) での指標値を使う
+                g0 = max(0, min(end - view_bars, total)) // step
+                idx = np.minimum((g0 + 1 + np.arange(len(cols['ts']))) * step, min(end, total)) - 1
+                series = indicators.values(symbol, timeframe, specs, idx, owner=self)
+            t0 = PROBES.now()
+            # 描画器を手放した後に残っていた要求なら None (描かずに捨てる)
+            result = renderer.render_for(self, cols, width, height, time_format, series)
+            PROBES.record("chart_render", t0)
+            return result
+
+        self.app.render_service.request(id(self), job, self._show_image)
+
+    def _show_image(self, result):
+        """UIスレッド側: 画像バッファを PhotoImage に貼り替えるだけ"""
+        from PIL import Image, ImageTk
+        t0 = PROBES.now()
+        width, height, buf = result
+        image = Image.frombuffer("RGBA", (width, height), buf, "raw", "RGBA", 0, 1)
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == (width, height):
+            self.photo.paste(image)
+        else:
+            self.photo = ImageTk.PhotoImage(image)
+            self.image_label.configure(image=self.photo)
+        PROBES.record("chart_show", t0)
+
+
+class ChartWindow(tk.Toplevel):
+    """別ウィンドウのチャート (タブを切り替えても更新され続ける)"""
+    def __init__(self, workspace, symbol, timeframe, specs=()):
+        super().__init__(workspace.app, bg=COLOR_BG_MAIN)
+        self.workspace = workspace
+        self.title(f"チャート - {symbol.replace('_', '/')} {timeframe}")
+        self.geometry("900x560")
+        self.pane = ChartPane(self, workspace, symbol, timeframe, specs, detachable=False)
+        self.pane.pack(fill="both", expand=True)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.pane.activate()
+
+    def close(self):
+        self.pane.deactivate()
+        self.workspace.closed(self)
+        self.destroy()
+
+
+class ChartView(tk.Frame):
+    """【チャート】 複数チャートのワークスペース (分割表示 / 別ウィンドウ)
+
+    足は全チャートで BarAggregator を共有し、表示中の銘柄・時間足を参照カウントする
+    (誰も見なくなったら表示用のピラミッドと指標を捨てる)。図は RendererPool の
+    LRU から借り、隠れたチャートは返す。
+    """
+    def __init__(self, master):
+        from chart import RendererPool
+        super().__init__(master, bg=COLOR_BG_MAIN)
+        self.app = master.winfo_toplevel()
+        # 図 (Figure) は描画ワーカー専用。UIスレッドからは触らない
+        self.pool = RendererPool(COLOR_ACCENT_RED, COLOR_ACCENT_BLUE)
+        self.panes = []    # 分割表示のチャート (レイアウトを戻したときのため設定ごと残す)
+        self.windows = []  # 別ウィンドウのチャート
+        self.shown = 0     # panes のうち表示中の数
+        self.visible = False
+        self.create_layout()
 
-        df = DataManager.get_ohlc(100)
-        mc = mpf.make_marketcolors(up=COLOR_ACCENT_RED, down=COLOR_ACCENT_BLUE, 
-                                   edge='inherit', wick='inherit', volume='in')
-        s = mpf.make_mpf_style(marketcolors=mc, base_mpf_style='nightclouds', gridstyle=':')
-        fig, axes = mpf.plot(df, type='candle', style=s, volume=False, returnfig=True, figsize=(10, 6))
-        canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
+    def create_layout(self):
+        ctrl_bar = tk.Frame(self, bg=COLOR_HEADER, height=40)
+        ctrl_bar.pack(fill="x", side="top")
+        tk.Label(ctrl_bar, text="チャート", font=FONT_M, fg="white", bg=COLOR_HEADER).pack(side="left", padx=20)
+        self.layout_var = tk.StringVar(value=CHART_LAYOUT)
+        for name in CHART_LAYOUTS:
+            tk.Radiobutton(ctrl_bar, text=name, value=name, variable=self.layout_var, indicatoron=0,
+                           command=lambda: self.set_layout(self.layout_var.get()), font=FONT_S, width=5,
+                           bg="#333", fg="white", selectcolor=COLOR_BTN_MENU).pack(side="left", padx=2, pady=4)
+        self.grid_frame = tk.Frame(self, bg="black")
+        self.grid_frame.pack(fill="both", expand=True)
+        self.set_layout(CHART_LAYOUT)
+
+    def set_layout(self, name):
+        rows, cols = CHART_LAYOUTS[name]
+        self.shown = rows * cols
+        while len(self.panes) < self.shown:
+            symbol, timeframe = CHART_DEFAULTS[len(self.panes) % len(CHART_DEFAULTS)]
+            self.panes.append(ChartPane(self.grid_frame, self, symbol, timeframe))
+        max_rows = max(r for r, _ in CHART_LAYOUTS.values())
+        max_cols = max(c for _, c in CHART_LAYOUTS.values())
+        for r in range(max_rows):
+            self.grid_frame.rowconfigure(r, weight=1 if r < rows else 0, uniform="chart")
+        for c in range(max_cols):
+            self.grid_frame.columnconfigure(c, weight=1 if c < cols else 0, uniform="chart")
+        for i, pane in enumerate(self.panes):
+            if i < self.shown:
+                pane.grid(row=i // cols, column=i % cols, sticky="nsew", padx=1, pady=1)
+                if self.visible:
+                    pane.activate()
+            else:
+                # 隠したチャートは図を返す
+                pane.grid_remove()
+                pane.deactivate()
+
+    # --- 足の参照と描画器の貸し借り (ChartPane から呼ぶ) ---
+    def acquire(self, pane):
+        self.app.bars.acquire(pane.symbol, pane.timeframe)
+        pane.renderer = self.pool.acquire(pane, (pane.symbol, pane.timeframe))
+
+    def release(self, pane):
+        self.pool.release(pane.renderer)
+        pane.renderer = None
+        self.app.indicators.forget(pane)
+        if self.app.bars.release(pane.symbol, pane.timeframe):
+            self.app.indicators.drop(pane.symbol, pane.timeframe)
+
+    # --- 別ウィンドウ ---
+    def detach(self, pane):
+        self.windows.append(ChartWindow(self, pane.symbol, pane.timeframe, pane.specs()))
+        # 別ウィンドウはタブの切り替えによらず更新する
+        self.app.scheduler.pin("ChartWindows")
+
+    def closed(self, window):
+        self.windows.remove(window)
+        if not self.windows:
+            self.app.scheduler.unpin("ChartWindows")
+
+    # --- 表示 ---
+    def on_show(self):
+        """タブ表示時に最新の足で描き直す"""
+        self.visible = True
+        for pane in self.panes[:self.shown]:
+            pane.activate()
+
+    def on_hide(self):
+        self.visible = False
+        for pane in self.panes[:self.shown]:
+            pane.deactivate()
+
+    def update_chart(self):
+        for pane in self.panes[:self.shown]:
+            pane.update_chart()
+
+    def update_windows(self):
+        for window in self.windows:
+            window.pane.update_chart()
 
 
 # ---------------------------------------------------------
@@ -409,19 +1154,40 @@ class MainApp(tk.Tk):
         self.container.grid_rowconfigure(0, weight=1)    # 【重要】
         self.container.grid_columnconfigure(0, weight=1) # 【重要】
 
-        # 各画面
+        # データ系 (ログイン後に start() で生成)
+        self.engine = None
+        self.tick_store = None
+        self.bars = None
+        self.indicators = None
+        self.orders = None
+        self.portfolio = None
+        self.portfolio_version = -1
+        self.alerts = None
+        self.alert_dialog = None
+        self.alert_toast = None
+        self.alert_toast_job = None
+        # チャート描画 (ワーカースレッドで画像化)
+        self.render_service = RenderService(post=lambda fn: self.after(0, fn))
+        # 画面反映: 画面ごとの汚れを溜め、表示中の画面だけをフレーム単位で描く
+        self.scheduler = FrameScheduler(lambda fn: self.after(0, fn), self.after, FRAME_RATE)
+        self.register_handlers()
+
+        # 各画面 (初めて表示するときに生成する)
+        self.view_classes = {F.__name__: F for F in (HomeView, TradeView, SpeedOrderView, MarketView, ChartView)}
         self.frames = {}
-        for F in (HomeView, TradeView, SpeedOrderView, MarketView, ChartView):
-            page_name = F.__name__
-            frame = F(master=self.container)
-            self.frames[page_name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
 
+        self.startup_ms = None
+        self.stats_bar = tk.Label(self, text="", font=("Consolas", 9), anchor="w",
+                                  bg=COLOR_HEADER, fg="#8f8", padx=10)
+        self.bind_all("<F12>", self.toggle_stats)
+        self.bind_all("<F11>", self.export_stats)
+        self.current_frame = None
         self.running = False
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def start(self, username):
         """ログイン後に呼び出されるメソッド"""
+        self.init_engine()
         self.deiconify()
         self.show_frame("TradeView")
         
@@ -431,6 +1197,73 @@ class MainApp(tk.Tk):
         # データ更新ループ開始
         self.running = True
         self.update_data()
+        self._refresh_portfolio()
+        if PREWARM_VIEWS:
+            self.prewarm()
+
+    def init_engine(self):
+        """データエンジンを用意し、画面を購読者として登録する (numpy はここで初めて読み込まれる)"""
+        from engine import DataEngine
+        archive = None
+        if ARCHIVE_DIR:
+            from archive import Archive
+            archive = Archive(ARCHIVE_DIR)
+        self.engine = DataEngine(interval=UPDATE_INTERVAL / 1000, tick_capacity=TICK_BUFFER_SIZE,
+                                 archive=archive)
+        # ティック履歴・時間足 (チャート・指標・損益計算から参照)
+        self.tick_store = self.engine.tick_store
+        self.bars = self.engine.bars
+        # テクニカル指標 (チャートで表示中のものだけ、描画ワーカー上で更新)
+        from indicators import IndicatorStore
+        self.indicators = IndicatorStore(self.bars)
+        # エンジンのワーカースレッドでは画面の汚れを記録するだけ (反映はフレームごと)
+        self.engine.subscribe(self._on_snapshot)
+        # ペーパートレード: 約定判定はエンジンのワーカースレッドで行い、建玉表示は次の更新で反映
+        from orders import OrderEngine
+        self.orders = OrderEngine()
+        self.engine.subscribe(self.orders.on_snapshot)
+        # 口座評価: 値動きのあった建玉だけを評価し直す (約定は先に反映してから画面へ通知)
+        from portfolio import PortfolioValuer
+        self.portfolio = PortfolioValuer(request_rate=self.engine.request_cross)
+        self.engine.subscribe(self.portfolio.on_snapshot)
+        self.orders.on_fill(lambda fills: self.portfolio.apply_fills(fills, self.orders.positions, self.orders.latest))
+        # 約定履歴 (約定履歴タブ・報告書の書き出し)
+        from history import FillStore
+        self.history = FillStore()
+        self.orders.on_fill(self.history.extend)
+        self.orders.on_fill(lambda fills: self.scheduler.mark("TradeView", "positions"))
+        # アラート: 判定はワーカースレッド、UI は起こされたら溜まった通知をまとめて受け取る
+        from alerts import AlertEngine
+        self.alerts = AlertEngine()
+        self.engine.subscribe(self.alerts.on_snapshot)
+        self.alert_dispatcher = LatestDispatcher(lambda fn: self.after(0, fn), self._on_alerts)
+        self.alerts.on_alert(self.alert_dispatcher.publish)
+
+    def get_frame(self, page_name):
+        """画面を返す (未生成ならここで生成)"""
+        frame = self.frames.get(page_name)
+        if frame is None:
+            frame = self.view_classes[page_name](master=self.container)
+            frame.grid(row=0, column=0, sticky="nsew")
+            self.frames[page_name] = frame
+        return frame
+
+    def prewarm(self):
+        """重いモジュールを裏スレッドで読み込み、残りの画面をアイドル時に1つずつ生成"""
+        def load():
+            for name in HEAVY_MODULES:
+                importlib.import_module(name)
+            self.after(0, build_next)
+
+        def build_next():
+            pending = [name for name in self.view_classes if name not in self.frames]
+            if not self.running or not pending:
+                return
+            # 生成した画面が表示中の画面の上に重ならないよう下げておく
+            self.get_frame(pending[0]).lower()
+            self.after(50, build_next)
+
+        threading.Thread(target=load, name="prewarm", daemon=True).start()
 
     def create_footer(self):
         footer = tk.Frame(self, bg=COLOR_HEADER, height=60)
@@ -444,23 +1277,125 @@ class MainApp(tk.Tk):
             btn.pack(side="left", fill="both", expand=True)
 
     def show_frame(self, page_name):
-        frame = self.frames[page_name]
+        frame = self.get_frame(page_name)
+        previous = self.frames.get(self.current_frame)
+        if previous is not None and previous is not frame and hasattr(previous, "on_hide"):
+            previous.on_hide()
         frame.tkraise()
+        self.current_frame = page_name
+        if hasattr(frame, "on_show"):
+            frame.on_show()
+        # 非表示の間に溜まった更新を最新の値で反映する
+        self.scheduler.show(page_name)
 
     def update_data(self):
-        """データ更新ループ (スレッド + after)"""
+        """データ更新ループ (エンジンの常駐スレッド1本、取得は常に1件のみ)"""
+        self.engine.start()
+
+    def register_handlers(self):
+        """画面ごとの反映処理 (FrameScheduler が表示中の画面の分だけ UI スレッドで呼ぶ)"""
+        def update_table(snapshot):
+            t0 = PROBES.now()
+            self.frames["TradeView"].update_table(snapshot)
+            PROBES.record("update_table", t0)
+
+        register = self.scheduler.register
+        register("TradeView", "rates", update_table)
+        register("TradeView", "positions", lambda _: self.frames["TradeView"].update_positions(
+            self.orders.open_positions(), self.orders.latest))
+        register("SpeedOrderView", "quote", lambda snapshot: self.frames["SpeedOrderView"].update_quote(snapshot))
+        register("ChartView", "chart", lambda _: self.frames["ChartView"].update_chart())
+        register("ChartWindows", "chart", lambda _: self.frames["ChartView"].update_windows())
+        register("HomeView", "summary", lambda summary: self.frames["HomeView"].update_summary(summary))
+
+    def _on_snapshot(self, snapshot):
+        """ワーカースレッド側: スナップショットを各画面の汚れとして記録する"""
+        mark = self.scheduler.mark
+        mark("TradeView", "rates", snapshot)
+        mark("TradeView", "positions", snapshot)
+        mark("SpeedOrderView", "quote", snapshot)
+        mark("ChartView", "chart", snapshot)
+        mark("ChartWindows", "chart", snapshot)
+
+    def _on_alerts(self, _events):
+        """UIスレッド側: 未受信の通知を右下にまとめて表示する"""
         if not self.running: return
-        threading.Thread(target=self._fetch_and_update, daemon=True).start()
-        self.after(UPDATE_INTERVAL, self.update_data)
-
-    def _fetch_and_update(self):
-        fd, fg = DataManager.fetch_real_data()
-        if not fd.empty and not fg.empty:
-            self.after(0, lambda: self.frames["TradeView"].update_table(fd, fg))
+        events = self.alerts.drain()
+        if not events:
+            return
+        if self.alert_dialog is not None and self.alert_dialog.winfo_exists():
+            self.alert_dialog.add_events(events)
+        lines = [e.message() for e in events[-ALERT_TOAST_LINES:]]
+        if len(events) > ALERT_TOAST_LINES:
+            lines.insert(0, f"ほか {len(events) - ALERT_TOAST_LINES} 件")
+        self.show_toast("\n".join(lines))
+        self.bell()
+
+    def show_toast(self, text, title="🔔 アラート"):
+        """画面右下の通知 (表示中なら内容を差し替えて時間を延長)"""
+        if self.alert_toast is None:
+            self.alert_toast = tk.Toplevel(self, bg=COLOR_ACCENT_GOLD)
+            self.alert_toast.overrideredirect(True)
+            self.alert_toast_label = tk.Label(self.alert_toast, font=FONT_S, justify="left",
+                                              bg=COLOR_PANEL_BG, fg="white", padx=12, pady=8)
+            self.alert_toast_label.pack(padx=2, pady=2)
+        self.alert_toast_label.config(text=f"{title}\n{text}")
+        self.alert_toast.deiconify()
+        self.alert_toast.update_idletasks()
+        x = self.winfo_rootx() + self.winfo_width() - self.alert_toast.winfo_reqwidth() - 20
+        y = self.winfo_rooty() + self.winfo_height() - self.alert_toast.winfo_reqheight() - 80
+        self.alert_toast.geometry(f"+{x}+{y}")
+        self.alert_toast.lift()
+        if self.alert_toast_job is not None:
+            self.after_cancel(self.alert_toast_job)
+        self.alert_toast_job = self.after(ALERT_TOAST_MS, self._hide_toast)
+
+    def _hide_toast(self):
+        self.alert_toast_job = None
+        self.alert_toast.withdraw()
+
+    def _refresh_portfolio(self):
+        """口座評価をホーム画面へ反映 (ティック頻度によらず PORTFOLIO_REFRESH ごとに最大1回)"""
+        if not self.running: return
+        summary = self.portfolio.summary()
+        if summary['version'] != self.portfolio_version:
+            self.portfolio_version = summary['version']
+            self.scheduler.mark("HomeView", "summary", summary)
+        self.after(PORTFOLIO_REFRESH, self._refresh_portfolio)
+
+    # --- 計測オーバーレイ ---
+    def toggle_stats(self, event=None):
+        """F12: 計測の有効化とステータスバー表示を切り替える"""
+        if self.stats_bar.winfo_ismapped():
+            self.stats_bar.pack_forget()
+            PROBES.enabled = False
+            return
+        PROBES.enabled = True
+        self.stats_bar.pack(side="bottom", fill="x", before=self.container)
+        self._refresh_stats()
+
+    def _refresh_stats(self):
+        if not self.stats_bar.winfo_ismapped():
+            return
+        text = PROBES.format_line()
+        if self.engine:
+            s = self.engine.stats()
+            f = self.scheduler
+            text += f"   |  fetched {s['fetched']}  frames {f.frames}  coalesced {f.coalesced}  errors {s['errors']}"
+        self.stats_bar.config(text=text)
+        self.after(STATS_REFRESH, self._refresh_stats)
+
+    def export_stats(self, event=None):
+        """F11: 計測結果を JSON に書き出す"""
+        path = PROBES.export(time.strftime("probes_%Y%m%d_%H%M%S.json"))
+        print(f"Probes exported to {path}")
 
     def on_close(self):
         self.running = False
-        plt.close('all')
+        self.scheduler.stop()
+        if self.engine:
+            self.engine.stop()
+        self.render_service.shutdown()
         self.destroy()
         sys.exit()
 
@@ -472,7 +1407,12 @@ class Login:
         self.master = master
         self.main = main
         self.widgets = []
+        # 照合・登録 (ハッシュ計算と DB アクセス) は UI スレッドの外で1件ずつ行う
+        self.auth = ThreadPoolExecutor(max_workers=1, thread_name_prefix="auth")
+        self.store = None
         self.create_widgets()
+        # 画面を出している間に DB を開き、旧 login.csv があれば取り込んでおく
+        self.run_async(self.open_store, lambda _: None)
 
     def create_widgets(self):
         self.master.configure(bg=COLOR_BG_LOGIN)
@@ -556,26 +1496,70 @@ class Login:
         c.create_oval(circle_x-7, 3, circle_x+7, 17, fill="white", outline="")
         return c
 
+    # --- 認証 (ワーカースレッド) ---
+    def open_store(self):
+        if self.store is None:
+            from credentials import CredentialStore
+            self.store = CredentialStore(CREDENTIALS_DB)
+            pending = self.store.load_csv(CSV_FILE)
+            if pending:
+                print(f"Migrating {pending} users from {CSV_FILE} to {CREDENTIALS_DB}")
+                self.auth.submit(self.migrate_step)
+        return self.store
+
+    def migrate_step(self):
+        """login.csv を少しずつ取り込む (1回ごとに積み直し、間に照合・登録が割り込めるようにする)"""
+        try:
+            if self.store.migrate():
+                self.auth.submit(self.migrate_step)
+            else:
+                print(f"Migrated {CSV_FILE} to {CREDENTIALS_DB} (removed {CSV_FILE})")
+        except RuntimeError:
+            pass  # 終了処理中 (残りは次回起動時に取り込む)
+        except Exception as e:
+            print(f"Auth Error: {e}")
+
+    def run_async(self, fn, on_done):
+        """fn() を認証ワーカーで実行し、結果 (例外ならその例外) で on_done を UI スレッドから呼ぶ"""
+        def job():
+            try:
+                result = fn()
+            except Exception as e:
+                print(f"Auth Error: {e}")
+                result = e
+            self.master.after(0, lambda: on_done(result))
+        self.auth.submit(job)
+
     def login(self):
         username = self.name_entry.get()
         password = self.pass_entry.get()
-        try:
-            with open(CSV_FILE, 'r') as f:
-                csv_data = csv.reader(f)
-                for user in csv_data:
-                    if len(user) >= 2 and user[0] == username and user[1] == password:
-                        self.success(username)
-                        return
-        except FileNotFoundError:
-            pass
-        self.fail()
+        self.login_button.config(state="disabled", text="確認中...")
+
+        def done(ok):
+            self.login_button.config(state="normal", text="ログイン")
+            if ok is True:
+                self.success(username)
+            else:
+                self.fail()
+        self.run_async(lambda: self.open_store().verify(username, password), done)
 
     def register(self):
         username = self.name_entry.get()
         password = self.pass_entry.get()
-        if username and password:
-            with open(CSV_FILE, 'a', newline='') as f:
-                csv.writer(f).writerow([username, password])
+        if not (username and password):
+            self.notify_register("IDとパスワードを入力")
+            return
+        self.reg_button.config(state="disabled")
+
+        def done(ok):
+            self.reg_button.config(state="normal")
+            self.notify_register("登録しました" if ok is True else
+                                 "登録済みのIDです" if ok is False else "登録エラー")
+        self.run_async(lambda: self.open_store().register(username, password), done)
+
+    def notify_register(self, text):
+        self.reg_button.config(text=text)
+        self.master.after(1500, lambda: self.reg_button.config(text="無料で口座開設"))
 
     def fail(self):
         self.login_button.config(bg="red", text="失敗")
@@ -606,4 +1590,13 @@ if __name__ == "__main__":
     # 2. 「ウィンドウ枠」と「アプリ本体」の2つを渡す
     login = Login(login_window, app)
 
+    # 起動からログイン画面表示までの時間 (--startup-time で表示)
+    def on_login_mapped(event):
+        if event.widget is not login_window or app.startup_ms is not None:
+            return
+        app.startup_ms = (time.perf_counter() - STARTUP_T0) * 1000
+        if "--startup-time" in sys.argv:
+            print(f"Startup: login window shown in {app.startup_ms:.0f} ms")
+    login_window.bind("<Map>", on_login_mapped)
+
     app.mainloop()
\ No newline at end of file
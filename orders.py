@@ -0,0 +1,273 @@
+import bisect
+import itertools
+import threading
+import time
+
+# ---------------------------------------------------------
+# ペーパートレード (模擬約定エンジン)
+# ---------------------------------------------------------
+BUY, SELL = "buy", "sell"
+MARKET, LIMIT, STOP = "market", "limit", "stop"
+
+
+class Order:
+    __slots__ = ('id', 'symbol', 'side', 'type', 'qty', 'price', 'ts', 'status')
+
+    def __init__(self, id, symbol, side, type, qty, price, ts):
+        self.id = id
+        self.symbol = symbol
+        self.side = side
+        self.type = type
+        self.qty = qty
+        self.price = price
+        self.ts = ts
+        self.status = "open"
+
+
+class Fill:
+    __slots__ = ('id', 'order_id', 'symbol', 'side', 'qty', 'price', 'ts', 'realized')
+
+    def __init__(self, id, order_id, symbol, side, qty, price, ts, realized):
+        self.id = id
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.qty = qty
+        self.price = price
+        self.ts = ts
+        self.realized = realized
+
+
+class Position:
+    """銘柄ごとのネット建玉 (数量は買いが正、売りが負)"""
+    __slots__ = ('symbol', 'qty', 'avg_price', 'realized')
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.qty = 0.0
+        self.avg_price = 0.0
+        self.realized = 0.0
+
+    def apply(self, side, qty, price):
+        """約定を反映し、今回確定した損益を返す"""
+        signed = qty if side == BUY else -qty
+        realized = 0.0
+        if self.qty == 0 or (self.qty > 0) == (signed > 0):
+            # 同方向: 平均単価を更新
+            total = abs(self.qty) + qty
+            self.avg_price = (self.avg_price * abs(self.qty) + price * qty) / total
+            self.qty += signed
+            return realized
+        # 反対方向: 決済 (超過分はドテン)
+        closed = min(abs(self.qty), qty)
+        direction = 1 if self.qty > 0 else -1
+        realized = (price - self.avg_price) * closed * direction
+        self.realized += realized
+        self.qty += signed
+        if self.qty == 0:
+            self.avg_price = 0.0
+        elif (self.qty > 0) != (direction > 0):
+            self.avg_price = price
+        return realized
+
+    def unrealized(self, bid, ask):
+        """評価損益 (買いは Bid、売りは Ask で評価)"""
+        if self.qty > 0:
+            return (bid - self.avg_price) * self.qty
+        if self.qty < 0:
+            return (self.avg_price - ask) * -self.qty
+        return 0.0
+
+
+class PriceIndex:
+    """発動価格でソートした注文の索引
+
+    rising=True : 価格が P 以上になったら発動 (買い逆指値 / 売り指値)
+    rising=False: 価格が P 以下になったら発動 (買い指値 / 売り逆指値)
+    発動判定は二分探索で境界を求め、端から切り出すだけ。
+    """
+    def __init__(self, rising):
+        self.rising = rising
+        self.keys = []  # (price, seq) 昇順
+        self.ids = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, price, seq, order_id):
+        i = bisect.bisect_left(self.keys, (price, seq))
+        self.keys.insert(i, (price, seq))
+        self.ids.insert(i, order_id)
+
+    def remove(self, price, seq):
+        i = bisect.bisect_left(self.keys, (price, seq))
+        if i < len(self.keys) and self.keys[i] == (price, seq):
+            del self.keys[i]
+            del self.ids[i]
+            return True
+        return False
+
+    def pop_triggered(self, price):
+        """price で発動する注文IDを取り出す (発動価格の若い順)"""
+        if self.rising:
+            i = bisect.bisect_right(self.keys, (price, float("inf")))
+            ids = self.ids[:i]
+            del self.keys[:i], self.ids[:i]
+            return ids
+        i = bisect.bisect_left(self.keys, (price, -1))
+        ids = self.ids[i:][::-1]
+        del self.keys[i:], self.ids[i:]
+        return ids
+
+
+class OrderBook:
+    """1銘柄分の待機注文 (4種類の索引)"""
+    def __init__(self):
+        self.buy_limit = PriceIndex(rising=False)   # Ask <= P で約定
+        self.buy_stop = PriceIndex(rising=True)     # Ask >= P で約定
+        self.sell_limit = PriceIndex(rising=True)   # Bid >= P で約定
+        self.sell_stop = PriceIndex(rising=False)   # Bid <= P で約定
+
+    def index_for(self, side, type):
+        if side == BUY:
+            return self.buy_limit if type == LIMIT else self.buy_stop
+        return self.sell_limit if type == LIMIT else self.sell_stop
+
+    def __len__(self):
+        return len(self.buy_limit) + len(self.buy_stop) + len(self.sell_limit) + len(self.sell_stop)
+
+
+class OrderEngine:
+    """成行・指値・逆指値をティックに対して約定させる
+
+    DataEngine の購読者として on_snapshot() をワーカースレッドで受ける。
+    各ティックでは待機注文のある銘柄だけを見て、発動価格を越えた
+    注文だけを索引から取り出す (注文数に対して O(log n + 約定数))。
+    約定は on_fill に登録したコールバックへ通知する (約定させたスレッド上で、ロックを
+    持ったまま呼ぶので約定番号順に届く。コールバックでは待たされる処理をしないこと)。
+    約定の履歴はここでは持たない (画面用は history.FillStore、バックテストは Backtest が受け取る)。
+
+    clock: 注文・約定に付ける時刻 (バックテストでは再生中の足の時刻を返す)
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.orders = {}      # id -> Order (待機中)
+        self.books = {}       # symbol -> OrderBook
+        self.positions = {}   # symbol -> Position
+        self.latest = None    # 直近の RateSnapshot
+        self.listeners = []
+        self.lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._fill_ids = itertools.count(1)
+
+    def on_fill(self, callback):
+        self.listeners.append(callback)
+        return callback
+
+    # --- 発注 ---
+    def quote(self, symbol):
+        snap = self.latest
+        row = snap.get(symbol) if snap is not None else None
+        if row is None:
+            raise ValueError(f"no quote for {symbol}")
+        return float(row[0]), float(row[1])
+
+    def submit(self, symbol, side, qty, type=MARKET, price=None):
+        """注文を出す。成行は即時約定し、指値・逆指値は待機させる"""
+        if side not in (BUY, SELL):
+            raise ValueError(f"invalid side: {side}")
+        if qty <= 0:
+            raise ValueError("quantity must be positive")
+        if type != MARKET and price is None:
+            raise ValueError(f"{type} order needs a price")
+        fills = []
+        with self.lock:
+            order = Order(next(self._ids), symbol, side, type, qty, price, self.clock())
+            if type == MARKET:
+                bid, ask = self.quote(symbol)
+                fills.append(self._execute(order, ask if side == BUY else bid))
+            else:
+                self.orders[order.id] = order
+                book = self.books.get(symbol)
+                if book is None:
+                    book = self.books[symbol] = OrderBook()
+                book.index_for(side, type).add(price, order.id, order.id)
+                # 発注時点で既に条件を満たしていれば即約定
+                if self.latest is not None and symbol in self.latest:
+                    fills.extend(self._match(symbol, *self.quote(symbol)))
+            self._notify(fills)
+        return order
+
+    def cancel(self, order_id):
+        with self.lock:
+            order = self.orders.pop(order_id, None)
+            if order is None:
+                return False
+            self.books[order.symbol].index_for(order.side, order.type).remove(order.price, order.id)
+            order.status = "cancelled"
+            return True
+
+    def close_all(self):
+        """全決済: 全銘柄の建玉を反対売買でまとめて解消する
+
+        気配のない銘柄があれば何も約定させずに ValueError (途中まで決済した状態にしない)。
+        """
+        fills = []
+        with self.lock:
+            quotes = {symbol: self.quote(symbol) for symbol, pos in self.positions.items() if pos.qty != 0}
+            for symbol, (bid, ask) in quotes.items():
+                pos = self.positions[symbol]
+                side = SELL if pos.qty > 0 else BUY
+                order = Order(next(self._ids), symbol, side, MARKET, abs(pos.qty), None, self.clock())
+                fills.append(self._execute(order, bid if side == SELL else ask))
+            self._notify(fills)
+        return fills
+
+    # --- ティック処理 ---
+    def on_snapshot(self, snapshot):
+        fills = []
+        with self.lock:
+            self.latest = snapshot
+            for symbol in [s for s, b in self.books.items() if len(b)]:
+                row = snapshot.get(symbol)
+                if row is not None:
+                    fills.extend(self._match(symbol, float(row[0]), float(row[1])))
+            self._notify(fills)
+
+    def _match(self, symbol, bid, ask):
+        book = self.books[symbol]
+        fills = []
+        for index, price in ((book.buy_limit, ask), (book.buy_stop, ask),
+                             (book.sell_limit, bid), (book.sell_stop, bid)):
+            for order_id in index.pop_triggered(price):
+                order = self.orders.pop(order_id)
+                fills.append(self._execute(order, price))
+        return fills
+
+    def _execute(self, order, price):
+        pos = self.positions.get(order.symbol)
+        if pos is None:
+            pos = self.positions[order.symbol] = Position(order.symbol)
+        realized = pos.apply(order.side, order.qty, price)
+        order.status = "filled"
+        fill = Fill(next(self._fill_ids), order.id, order.symbol, order.side,
+                    order.qty, price, self.clock(), realized)
+        return fill
+
+    def _notify(self, fills):
+        if not fills:
+            return
+        for callback in self.listeners:
+            try:
+                callback(fills)
+            except Exception as e:
+                print(f"Fill Listener Error: {e}")
+
+    # --- 参照 ---
+    def open_positions(self):
+        with self.lock:
+            return [p for p in self.positions.values() if p.qty != 0]
+
+    def open_orders(self):
+        with self.lock:
+            return list(self.orders.values())
@@ -0,0 +1,170 @@
+import threading
+import numpy as np
+
+from rates import split_pair
+
+# ---------------------------------------------------------
+# 口座評価 (時価評価の差分更新)
+# ---------------------------------------------------------
+ACCOUNT_CCY = "JPY"
+INITIAL_DEPOSIT = 10_000_000  # 模擬口座の預託額 (円)
+LEVERAGE = 25                 # 必要証拠金 = 想定元本 / レバレッジ
+
+
+class PortfolioValuer:
+    """建玉を配列で持ち、値動きのあった銘柄の建玉だけを評価し直す
+
+    各建玉は「価格の銘柄」と「円換算の銘柄 (例: BTC_USD なら USD_JPY)」の
+    2本に依存する。監視銘柄ごとに依存する建玉の行番号を覚えておき、
+    前回から bid/ask が変わった監視銘柄に依存する行だけを再計算する。
+    合計値は再計算した行の差分だけを足し込む。
+
+    request_rate: 換算に必要なクロスを要求する関数 (DataEngine.request_cross)
+    """
+    def __init__(self, deposit=INITIAL_DEPOSIT, leverage=LEVERAGE, account_ccy=ACCOUNT_CCY,
+                 request_rate=None):
+        self.deposit = deposit
+        self.leverage = leverage
+        self.account_ccy = account_ccy
+        self.request_rate = request_rate
+        self.lock = threading.Lock()
+
+        self.symbols = []                 # 行番号 -> 銘柄
+        self.rows = {}                    # 銘柄 -> 行番号
+        self.qty = np.zeros(0)            # 買いが正、売りが負
+        self.avg_price = np.zeros(0)
+        self.pnl = np.zeros(0)            # 評価損益 (口座通貨)
+        self.notional = np.zeros(0)       # 想定元本 (口座通貨)
+        self.realized = 0.0
+        self.total_pnl = 0.0
+        self.total_notional = 0.0
+        self.version = 0                  # 合計値が変わるたびに増える
+
+        self._watch = None                # 監視銘柄 (価格 + 換算)
+        self._price_leg = None            # 行 -> 監視銘柄番号
+        self._conv_leg = None             # 行 -> 監視銘柄番号 (末尾 = 換算不要)
+        self._deps = {}                   # 監視銘柄番号 -> 依存する行
+        self._quotes = None               # 前回の [bid, ask] (監視銘柄 + 恒等行)
+
+    # --- 建玉 ---
+    def conversion_symbol(self, symbol):
+        """口座通貨への換算に使う銘柄 (換算不要なら None)"""
+        quote = split_pair(symbol)[1]
+        return None if quote in ("", self.account_ccy) else f"{quote}_{self.account_ccy}"
+
+    def apply_fills(self, fills, positions, snapshot=None):
+        """約定を反映する (OrderEngine.on_fill から呼ぶ)
+
+        positions: 銘柄 -> Position (約定後の数量・平均単価)
+        snapshot:  確定損益の円換算に使うレート
+        """
+        with self.lock:
+            touched = []
+            for fill in fills:
+                self.realized += fill.realized * self._conversion_rate(fill.symbol, snapshot)
+                pos = positions[fill.symbol]
+                i = self.rows.get(fill.symbol)
+                if i is None:
+                    i = self._add_row(fill.symbol)
+                self.qty[i] = pos.qty
+                self.avg_price[i] = pos.avg_price
+                touched.append(i)
+            # 数量が変わった行は次のティックを待たずに評価し直す
+            if self._watch is not None:
+                self._revalue(np.unique(np.array(touched, dtype=np.intp)))
+            elif snapshot is not None:
+                self._mark(snapshot)
+            self.version += 1
+
+    def _add_row(self, symbol):
+        i = self.rows[symbol] = len(self.symbols)
+        self.symbols.append(symbol)
+        self.qty = np.append(self.qty, 0.0)
+        self.avg_price = np.append(self.avg_price, 0.0)
+        self.pnl = np.append(self.pnl, 0.0)
+        self.notional = np.append(self.notional, 0.0)
+        self._watch = None  # 監視銘柄を作り直す
+        conv = self.conversion_symbol(symbol)
+        if conv and self.request_rate is not None:
+            self.request_rate(conv)
+        return i
+
+    def _conversion_rate(self, symbol, snapshot):
+        """口座通貨への換算レート (仲値)。取得できなければ 1 (換算なし)"""
+        conv = self.conversion_symbol(symbol)
+        row = snapshot.get(conv) if conv and snapshot is not None else None
+        return 1.0 if row is None else float(row[0] + row[1]) / 2
+
+    def _build(self):
+        watch = []
+        pos = {}
+        for sym in self.symbols:
+            for s in (sym, self.conversion_symbol(sym)):
+                if s and s not in pos:
+                    pos[s] = len(watch)
+                    watch.append(s)
+        identity = len(watch)
+        self._price_leg = np.array([pos[s] for s in self.symbols], dtype=np.intp)
+        self._conv_leg = np.array([pos.get(self.conversion_symbol(s), identity) for s in self.symbols],
+                                  dtype=np.intp)
+        deps = {}
+        for row, (p, c) in enumerate(zip(self._price_leg.tolist(), self._conv_leg.tolist())):
+            deps.setdefault(p, []).append(row)
+            if c != identity and c != p:
+                deps.setdefault(c, []).append(row)
+        self._deps = {k: np.array(v, dtype=np.intp) for k, v in deps.items()}
+        self._quotes = np.full((identity + 1, 2), np.nan)
+        self._quotes[identity] = 1.0
+        self._watch = watch
+
+    # --- 評価 ---
+    def on_snapshot(self, snapshot):
+        """DataEngine の購読者 (ワーカースレッド)。値動きのあった建玉だけ評価する"""
+        with self.lock:
+            if self.symbols and self._mark(snapshot):
+                self.version += 1
+
+    def _mark(self, snapshot):
+        """前回から bid/ask が変わった監視銘柄に依存する行だけ評価する (ロック取得済みで呼ぶ)"""
+        if self._watch is None:
+            self._build()
+        found, vals = snapshot.take(self._watch)
+        current = self._quotes.copy()
+        current[found] = vals[:, :2]
+        new, old = current[:-1], self._quotes[:-1]
+        # 気配のない足は NaN のまま (NaN != NaN なので、両方 NaN は変化なしとして扱う)
+        diff = (new != old) & ~(np.isnan(new) & np.isnan(old))
+        changed = np.flatnonzero(np.any(diff, axis=1))
+        if not len(changed):
+            return False
+        self._quotes = current
+        self._revalue(np.unique(np.concatenate([self._deps[i] for i in changed.tolist()])))
+        return True
+
+    def _revalue(self, rows):
+        """指定行の評価損益・想定元本を計算し直し、合計へ差分を反映する (ロック取得済みで呼ぶ)"""
+        quotes = self._quotes
+        price = quotes[self._price_leg[rows]]
+        conv = quotes[self._conv_leg[rows]].mean(axis=1)
+        qty = self.qty[rows]
+        # 買いは Bid、売りは Ask で評価
+        mark = np.where(qty > 0, price[:, 0], price[:, 1])
+        pnl = np.nan_to_num((mark - self.avg_price[rows]) * qty * conv)
+        notional = np.nan_to_num(np.abs(qty) * price.mean(axis=1) * conv)
+        self.total_pnl += pnl.sum() - self.pnl[rows].sum()
+        self.total_notional += notional.sum() - self.notional[rows].sum()
+        self.pnl[rows] = pnl
+        self.notional[rows] = notional
+
+    def summary(self):
+        """ホーム画面の4項目 (余力 / 時価評価総額 / 評価損益 / 証拠金維持率)"""
+        with self.lock:
+            equity = float(self.deposit + self.realized + self.total_pnl)
+            margin = float(self.total_notional) / self.leverage
+            return {
+                'buying_power': equity - margin,
+                'equity': equity,
+                'unrealized': float(self.total_pnl),
+                'margin_ratio': equity / margin * 100 if margin > 0 else None,
+                'version': self.version,
+            }
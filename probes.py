@@ -0,0 +1,130 @@
+import bisect
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# ---------------------------------------------------------
+# 計測プローブ (処理段ごとの遅延ヒストグラム)
+#   t0 = PROBES.now()
+#   ...処理...
+#   PROBES.record("fetch", t0)
+# 無効時は now() が None を返し、record() は即 return するだけ。
+# ---------------------------------------------------------
+# バケット上限 (ms): 0.01ms〜約 10秒 を対数間隔で
+BUCKET_BOUNDS_MS = [0.01 * 10 ** (i / 8) for i in range(49)]
+SLOW_EVENT_MS = 100.0  # これを超えた計測は時刻付きで記録する
+
+
+class LatencyHistogram:
+    """固定バケットの遅延ヒストグラム (記録は O(log バケット数))"""
+    def __init__(self, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最後は上限超え
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        """p パーセンタイル (該当バケットの上限値で近似)"""
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': min(self.percentile(50), self.max),
+            'p99_ms': min(self.percentile(99), self.max),
+            'max_ms': self.max,
+        }
+
+
+class Probes:
+    """処理段ごとのヒストグラムをまとめて持つ"""
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.slow_events = deque(maxlen=1000)  # (時刻, 処理段, ms)
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter() if self.enabled else None
+
+    def record(self, stage, t0):
+        """t0 (now() の戻り値) からの経過時間を記録する"""
+        if t0 is None:
+            return
+        self.record_ms(stage, (time.perf_counter() - t0) * 1000)
+
+    def record_ms(self, stage, ms):
+        if not self.enabled:
+            return
+        with self.lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = LatencyHistogram()
+            hist.record(ms)
+            if ms >= SLOW_EVENT_MS:
+                self.slow_events.append((time.time(), stage, ms))
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.slow_events.clear()
+
+    def summary(self):
+        with self.lock:
+            return {stage: h.summary() for stage, h in self.histograms.items()}
+
+    def format_line(self):
+        """ステータスバー用の1行表示"""
+        parts = [f"{stage} {s['p50_ms']:.1f}/{s['p99_ms']:.1f}/{s['max_ms']:.0f}ms"
+                 for stage, s in self.summary().items()]
+        return "p50/p99/max  " + "   ".join(parts) if parts else "計測中..."
+
+    def export(self, path):
+        """集計を書き出す (.csv なら表形式、それ以外は JSON)"""
+        summary = self.summary()
+        with self.lock:
+            slow = list(self.slow_events)
+        exported_at = time.time()
+        if os.path.splitext(path)[1].lower() == ".csv":
+            with open(path, "w", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(["exported_at", "stage", "count", "mean_ms", "p50_ms", "p99_ms", "max_ms"])
+                for stage, s in summary.items():
+                    w.writerow([exported_at, stage, s['count'], s['mean_ms'], s['p50_ms'], s['p99_ms'], s['max_ms']])
+                w.writerow([])
+                w.writerow(["slow_event_time", "stage", "ms"])
+                w.writerows(slow)
+        else:
+            with open(path, "w") as f:
+                json.dump({
+                    'exported_at': exported_at,
+                    'stages': summary,
+                    'buckets_ms': BUCKET_BOUNDS_MS,
+                    'bucket_counts': {st: h.counts for st, h in self.histograms.items()},
+                    'slow_events': [{'time': t, 'stage': st, 'ms': ms} for t, st, ms in slow],
+                }, f, indent=2)
+        return path
+
+
+# アプリ全体で共有するプローブ (環境変数 TRADESOFT_PROBES=1 で起動時から有効)
+PROBES = Probes(enabled=os.environ.get("TRADESOFT_PROBES") == "1")
@@ -0,0 +1,217 @@
+from collections import deque
+import numpy as np
+
+# ---------------------------------------------------------
+# レートのスナップショット
+# ---------------------------------------------------------
+RATE_FIELDS = ('bid', 'ask', 'high', 'low')
+REQUIRED_FIELDS = ('symbol', 'bid', 'ask')  # high/low は無ければ 0
+
+
+class RateSnapshot:
+    """1回分の取得結果を銘柄キーで引ける形にまとめる
+
+    ts:     取得時刻 (エポック秒)
+    index:  銘柄 -> 行番号 (フレームごとに1回だけ構築)
+    values: (行数, 4) の配列 [bid, ask, high, low]
+    必須列が欠けている場合は KeyError
+    """
+    def __init__(self, *frames, ts=None):
+        self.ts = ts  # 取得時刻
+        symbols = []
+        blocks = []
+        for df in frames:
+            if df is None or df.empty:
+                continue
+            n = len(df)
+            missing = [f for f in REQUIRED_FIELDS if f not in df.columns]
+            if missing:
+                raise KeyError(", ".join(missing))
+            symbols.extend(df['symbol'].tolist())
+            blocks.append(np.column_stack([
+                df[f].to_numpy(dtype=float) if f in df.columns else np.zeros(n)
+                for f in RATE_FIELDS
+            ]))
+        self.symbols = symbols
+        self.index = {sym: i for i, sym in enumerate(symbols)}
+        self.values = np.vstack(blocks) if blocks else np.empty((0, len(RATE_FIELDS)))
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def get(self, symbol):
+        """[bid, ask, high, low] の行 (無ければ None)"""
+        i = self.index.get(symbol)
+        return None if i is None else self.values[i]
+
+    def add(self, symbol, bid, ask, high=0.0, low=0.0):
+        """計算で求めたレート (クロスレート等) を追加する"""
+        row = np.array([[bid, ask, high, low]])
+        i = self.index.get(symbol)
+        if i is not None:
+            self.values[i] = row[0]
+            return
+        self.index[symbol] = len(self.symbols)
+        self.symbols.append(symbol)
+        self.values = np.vstack([self.values, row])
+
+    def add_many(self, symbols, bid, ask):
+        """計算で求めたレートをまとめて追加する (high/low は 0)"""
+        new = [s for s in symbols if s not in self.index]
+        if new:
+            for s in new:
+                self.index[s] = len(self.symbols)
+                self.symbols.append(s)
+            self.values = np.vstack([self.values, np.zeros((len(new), len(RATE_FIELDS)))])
+        pos = np.fromiter((self.index[s] for s in symbols), dtype=np.intp, count=len(symbols))
+        self.values[pos, 0] = bid
+        self.values[pos, 1] = ask
+
+    def take(self, symbols):
+        """指定銘柄の行をまとめて取り出す
+
+        戻り値: (見つかった銘柄の位置, その値の配列)
+        """
+        pos = np.fromiter((self.index.get(s, -1) for s in symbols), dtype=np.intp, count=len(symbols))
+        found = np.flatnonzero(pos >= 0)
+        return found, self.values[pos[found]]
+
+
+# ---------------------------------------------------------
+# クロスレート計算
+# ---------------------------------------------------------
+def split_pair(symbol):
+    """'BTC_JPY' -> ('BTC', 'JPY')"""
+    base, _, quote = symbol.partition("_")
+    return base, quote
+
+
+class CrossRateEngine:
+    """提示されている通貨ペアから通貨グラフを作り、任意のクロスを合成する
+
+    X/Y の経路 X→…→Y を幅優先探索で求め、各区間で
+      A→B (A_B が提示):  Bid = A_B の Bid,   Ask = A_B の Ask
+      A→B (B_A が提示):  Bid = 1 / B_A の Ask, Ask = 1 / B_A の Bid
+    を掛け合わせる (例: BTC/USD の Bid = BTC/JPY Bid ÷ USD/JPY Ask)。
+
+    区間 (提示ペア) ごとに依存するクロスを覚えておき、値が変わった
+    提示ペアに依存するクロスだけを、まとめてベクトル演算で再計算する。
+    """
+    def __init__(self, crosses=()):
+        self.crosses = []        # 要求されたクロス (登録順)
+        self._graph_key = None   # グラフを作ったときの提示ペア一覧
+        self._resolved = []      # 経路が見つかったクロス
+        self._legs = []          # 経路で使う提示ペア
+        self._leg_idx = None     # (クロス数, 最大区間数) 提示ペアの番号 (末尾 = 恒等)
+        self._inverted = None    # 同形: 逆向きに使う区間か
+        self._deps = {}          # 提示ペア番号 -> 依存するクロスの行番号
+        self._leg_values = None  # 前回の [bid, ask] (提示ペア + 恒等行)
+        self._values = None      # 前回計算したクロスの [bid, ask]
+        for c in crosses:
+            self.request(c)
+
+    def request(self, symbol):
+        """合成したいクロスを追加する"""
+        if symbol not in self.crosses:
+            self.crosses.append(symbol)
+            self._graph_key = None
+
+    # --- グラフ構築 ---
+    def _build(self, quoted):
+        adj = {}
+        for i, sym in enumerate(quoted):
+            base, quote = split_pair(sym)
+            if not quote:
+                continue
+            adj.setdefault(base, []).append((quote, i, False))
+            adj.setdefault(quote, []).append((base, i, True))
+
+        quoted_set = set(quoted)
+        paths = []
+        for cross in self.crosses:
+            if cross in quoted_set:
+                continue  # 直接提示されていれば合成しない
+            path = self._find_path(adj, *split_pair(cross))
+            if path:
+                paths.append((cross, path))
+
+        legs = sorted({i for _, path in paths for i, _ in path})
+        leg_pos = {q: n for n, q in enumerate(legs)}
+        identity = len(legs)
+        width = max((len(p) for _, p in paths), default=1)
+        self._resolved = [c for c, _ in paths]
+        self._legs = [quoted[i] for i in legs]
+        self._leg_idx = np.full((len(paths), width), identity, dtype=np.intp)
+        self._inverted = np.zeros((len(paths), width), dtype=bool)
+        self._deps = {}
+        for row, (_, path) in enumerate(paths):
+            for col, (i, inv) in enumerate(path):
+                self._leg_idx[row, col] = leg_pos[i]
+                self._inverted[row, col] = inv
+                self._deps.setdefault(leg_pos[i], []).append(row)
+        self._deps = {k: np.array(v, dtype=np.intp) for k, v in self._deps.items()}
+        self._leg_values = np.full((len(legs) + 1, 2), np.nan)
+        self._leg_values[identity] = 1.0
+        self._values = np.full((len(paths), 2), np.nan)
+        self._graph_key = tuple(quoted)
+
+    @staticmethod
+    def _find_path(adj, src, dst):
+        """src→dst の最短経路 [(提示ペア番号, 逆向きか), ...]"""
+        if src not in adj or dst not in adj:
+            return None
+        prev = {src: None}
+        q = deque([src])
+        while q:
+            cur = q.popleft()
+            if cur == dst:
+                break
+            for nxt, i, inv in adj[cur]:
+                if nxt not in prev:
+                    prev[nxt] = (cur, i, inv)
+                    q.append(nxt)
+        if dst not in prev:
+            return None
+        path = []
+        node = dst
+        while prev[node] is not None:
+            cur, i, inv = prev[node]
+            path.append((i, inv))
+            node = cur
+        return path[::-1]
+
+    # --- 更新 ---
+    def update(self, snapshot):
+        """スナップショットの提示レートからクロスを更新し、スナップショットに追加する
+
+        戻り値: 今回再計算したクロスの銘柄リスト
+        """
+        if self._graph_key != tuple(snapshot.symbols):
+            self._build(list(snapshot.symbols))
+        if not self._resolved:
+            return []
+
+        found, vals = snapshot.take(self._legs)
+        current = self._leg_values.copy()
+        current[found] = vals[:, :2]
+        changed = np.flatnonzero(np.any(current[:-1] != self._leg_values[:-1], axis=1))
+        rows = np.empty(0, dtype=np.intp)
+        if len(changed):
+            self._leg_values = current
+            rows = np.unique(np.concatenate([self._deps[i] for i in changed]))
+            # 依存するクロスだけをまとめて計算
+            idx = self._leg_idx[rows]
+            inv = self._inverted[rows]
+            bid_leg = np.where(inv, 1.0 / current[idx, 1], current[idx, 0])
+            ask_leg = np.where(inv, 1.0 / current[idx, 0], current[idx, 1])
+            self._values[rows, 0] = bid_leg.prod(axis=1)
+            self._values[rows, 1] = ask_leg.prod(axis=1)
+
+        # 再計算しなかったクロスも前回値のままスナップショットに載せる
+        ok = ~np.isnan(self._values[:, 0])
+        symbols = [c for c, v in zip(self._resolved, ok.tolist()) if v]
+        snapshot.add_many(symbols, self._values[ok, 0], self._values[ok, 1])
+        return [self._resolved[r] for r in rows.tolist() if ok[r]]
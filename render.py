@@ -0,0 +1,248 @@
+import threading
+import time
+
+from probes import PROBES
+
+# ---------------------------------------------------------
+# 描画サービス (ワーカースレッドでのラスタライズ)
+# ---------------------------------------------------------
+class RenderService:
+    """重い描画をワーカースレッドで実行し、結果だけを UI スレッドへ返す
+
+    - 描画要求はキー (チャート) ごとに最新の1件だけを保持する。
+      未着手の古い要求は新しい要求で置き換えられる (キャンセル)。
+    - 同じキーの描画は同時に1本しか走らせない (図は1スレッドからのみ触る)。
+    - 描画中に新しい要求が来た場合、古い結果は UI に渡さず捨てる。
+
+    post: UIスレッドへ関数を渡す手段 (例: lambda fn: root.after(0, fn))
+    """
+    def __init__(self, post, workers=2):
+        self.post = post
+        self._cond = threading.Condition()
+        self._pending = {}   # key -> (gen, job, callback)
+        self._busy = set()
+        self._latest = {}    # key -> 最新の要求番号
+        self._gen = 0
+        self._stopped = False
+
+        self.rendered = 0
+        self.cancelled = 0
+        self.discarded = 0
+        self._threads = [threading.Thread(target=self._worker, name=f"render-{i}", daemon=True)
+                         for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def request(self, key, job, callback):
+        """job() をワーカーで実行し、戻り値で callback(result) を UI スレッドから呼ぶ"""
+        with self._cond:
+            self._gen += 1
+            self._latest[key] = self._gen
+            if key in self._pending:
+                self.cancelled += 1
+            self._pending[key] = (self._gen, job, callback)
+            self._cond.notify()
+
+    def cancel(self, key):
+        with self._cond:
+            if self._pending.pop(key, None) is not None:
+                self.cancelled += 1
+            self._latest[key] = -1
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def _next_job(self):
+        """実行中でないキーの要求を1件取り出す (ロック取得済みで呼ぶ)"""
+        for key in self._pending:
+            if key not in self._busy:
+                return key, self._pending.pop(key)
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                item = self._next_job()
+                while item is None and not self._stopped:
+                    self._cond.wait()
+                    item = self._next_job()
+                if self._stopped:
+                    return
+                key, (gen, job, callback) = item
+                self._busy.add(key)
+            try:
+                result = job()
+            except Exception as e:
+                print(f"Render Error ({key}): {e}")
+                result = None
+            with self._cond:
+                self._busy.discard(key)
+                current = self._latest.get(key) == gen
+                # 同じキーの要求が溜まっていれば別ワーカーが拾えるようにする
+                self._cond.notify()
+            if result is None:
+                continue
+            if not current:
+                self.discarded += 1
+                continue
+            self.rendered += 1
+            self.post(lambda k=key, g=gen, r=result, cb=callback: self._deliver(k, g, r, cb))
+
+    def _deliver(self, key, gen, result, callback):
+        """UIスレッド側: 反映直前にも古い結果でないか確認する"""
+        if self._latest.get(key) != gen:
+            self.discarded += 1
+            return
+        callback(result)
+
+    def stats(self):
+        return {'rendered': self.rendered, 'cancelled': self.cancelled, 'discarded': self.discarded}
+
+
+# ---------------------------------------------------------
+# 画面反映のフレームスケジューラ (UI スレッド)
+# ---------------------------------------------------------
+class FrameScheduler:
+    """UI への反映をフレーム単位にまとめ、表示中の画面だけを描く
+
+    - mark(view, name, value) は任意のスレッドから呼べる。画面・項目ごとに
+      最新の値だけを「汚れ」として残し、その場では描かない。
+    - 表示中の画面に汚れがあれば、1フレーム (1/fps 秒) に最大1回まとめて反映する。
+    - 非表示の画面の汚れは溜めておき、show() で表示されたときに最新の値で追いつく。
+    - pin() した画面 (別ウィンドウなど) はタブの切り替えによらず常に表示中として扱う。
+
+    post:  UIスレッドへ関数を渡す手段 (例: lambda fn: root.after(0, fn))
+    after: UIスレッドで遅延実行する手段 (例: root.after)
+    """
+    def __init__(self, post, after, fps=30):
+        self.post = post
+        self.after = after
+        self.interval = 1.0 / fps
+        self.handlers = {}    # (view, name) -> handler(value)
+        self.visible = None
+        self.pinned = set()
+        self._lock = threading.Lock()
+        self._dirty = {}      # (view, name) -> (最新の値, 最初に汚れた時刻)
+        self._armed = False   # 反映を予約済みか
+        self._stopped = False
+        self._last_flush = 0.0
+
+        self.frames = 0
+        self.coalesced = 0    # 反映前に新しい値で置き換えた回数
+
+    def register(self, view, name, handler):
+        self.handlers[(view, name)] = handler
+
+    def mark(self, view, name, value=None):
+        key = (view, name)
+        with self._lock:
+            old = self._dirty.get(key)
+            if old is not None:
+                self.coalesced += 1
+            self._dirty[key] = (value, PROBES.now() if old is None else old[1])
+            if (view != self.visible and view not in self.pinned) or self._armed or self._stopped:
+                return
+            self._armed = True
+        self.post(self._arm)
+
+    def show(self, view):
+        """表示中の画面を切り替え、溜まっていた汚れをすぐに反映する (UIスレッド)"""
+        with self._lock:
+            self.visible = view
+        self._flush_views({view})
+
+    def pin(self, view):
+        with self._lock:
+            self.pinned.add(view)
+
+    def unpin(self, view):
+        with self._lock:
+            self.pinned.discard(view)
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._dirty.clear()
+
+    def _arm(self):
+        """UIスレッド側: 前回の反映から1フレーム空けて反映を予約する"""
+        delay = self._last_flush + self.interval - time.monotonic()
+        self.after(max(0, int(delay * 1000)), self._flush)
+
+    def _flush(self):
+        with self._lock:
+            self._armed = False
+            views = self.pinned | {self.visible}
+        self._flush_views(views)
+
+    def _flush_views(self, views):
+        with self._lock:
+            if self._stopped:
+                return
+            items = [(key, self._dirty.pop(key)) for key in [k for k in self._dirty if k[0] in views]]
+        if not items:
+            return
+        self._last_flush = time.monotonic()
+        self.frames += 1
+        for key, (value, t0) in items:
+            PROBES.record("dispatch", t0)
+            handler = self.handlers.get(key)
+            if handler is None:
+                continue
+            try:
+                handler(value)
+            except Exception as e:
+                print(f"Render Error ({key[0]}.{key[1]}): {e}")
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._dirty)
+        return {'frames': self.frames, 'frame_coalesced': self.coalesced, 'frame_pending': pending}
+
+
+# ---------------------------------------------------------
+# レート表の表示文字列 (RateGrid とベンチマークのヘッドレス経路で共用)
+# ---------------------------------------------------------
+class TextCells:
+    """セルごとの表示中の文字列を覚えておき、変わったセルだけ write(key, text) する"""
+    def __init__(self, write):
+        self.write = write
+        self.values = {}  # key -> 表示中の文字列
+
+    def set(self, key, text):
+        if self.values.get(key) != text:
+            self.write(key, text)
+            self.values[key] = text
+
+    def discard(self, key):
+        self.values.pop(key, None)
+
+
+def render_rate_rows(cells, snapshot, pairs, symbols, formats, top, slots):
+    """レート表の見えている行を書く
+
+    slots[i]: 画面上 i 行目のセルのキー [通貨ペア, Bid, Ask, High, Low] (top + i 番目の銘柄を表示)
+    気配の無い銘柄は "-"、銘柄の無い行は空欄にする。
+    """
+    rows = {}
+    if snapshot is not None and slots:
+        found, vals = snapshot.take(symbols[top:top + len(slots)])
+        rows = dict(zip(found.tolist(), vals.tolist()))
+    for i, keys in enumerate(slots):
+        idx = top + i
+        if idx >= len(pairs):
+            for key in keys:
+                cells.set(key, "")
+            continue
+        cells.set(keys[0], pairs[idx])
+        row = rows.get(i)
+        if row is None:
+            for key in keys[1:]:
+                cells.set(key, "-")
+            continue
+        fmt = formats[idx]
+        for key, v in zip(keys[1:], row):
+            cells.set(key, fmt.format(v) if v > 0 else "-")
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from indicators import IndicatorStore, make_indicator
+
+SPECS = ["SMA(20)", "EMA(50)", "BB(20,2)", "RSI(14)", "MACD(12,26,9)", "ATR(14)"]
+FIELDS = ('open', 'high', 'low', 'close')
+
+
+def make_bars(n, seed=0):
+    """ランダムウォークの OHLC (ts は1分刻み)"""
+    rng = np.random.default_rng(seed)
+    close = 150 + np.cumsum(rng.normal(0, 0.05, n))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.03, n))
+    return {'ts': np.arange(n, dtype=float) * 60, 'open': open_,
+            'high': np.maximum(open_, close) + spread, 'low': np.minimum(open_, close) - spread,
+            'close': close}
+
+
+def rows(cols, start=0, stop=None):
+    return list(zip(*(cols[f][start:stop].tolist() for f in FIELDS)))
+
+
+def batch(ind, cols):
+    out = ind.batch(cols)
+    return np.column_stack([out[o] for o in ind.outputs])
+
+
+def assert_same(actual, expected):
+    """値が一致し、NaN (埋まるまでの区間) の位置も一致する"""
+    actual, expected = np.asarray(actual, dtype=float), np.asarray(expected, dtype=float)
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_push_matches_batch(spec):
+    cols = make_bars(500)
+    expected = batch(make_indicator(spec), cols)
+    ind = make_indicator(spec)
+    assert_same([ind.push(*r) for r in rows(cols)], expected)
+
+
+@pytest.mark.parametrize("spec", SPECS)
+@pytest.mark.parametrize("split", [5, 40, 300])
+def test_backfill_then_stream(spec, split):
+    """先頭を batch() で埋め戻した後に push() で続けても、全体を batch() したのと同じ"""
+    cols = make_bars(500, seed=1)
+    expected = batch(make_indicator(spec), cols)
+    ind = make_indicator(spec)
+    head = batch(ind, {k: v[:split] for k, v in cols.items()})
+    tail = [ind.push(*r) for r in rows(cols, split)]
+    assert_same(np.vstack([head, tail]), expected)
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_peek_does_not_change_state(spec):
+    cols = make_bars(200, seed=2)
+    ind = make_indicator(spec)
+    batch(ind, {k: v[:100] for k, v in cols.items()})
+    for r in rows(cols, 100):
+        peeked = ind.peek(*r)
+        assert_same(peeked, ind.push(*r))
+
+
+class FakeBars:
+    """IndicatorStore が使う BarAggregator.tail() だけを持つ足 (最後の1本は形成中)"""
+    def __init__(self, cols, closed):
+        self.cols = cols
+        self.closed = closed
+
+    def tail(self, symbol, tf, start):
+        cols = {k: v[start:self.closed] for k, v in self.cols.items()}
+        bar = None
+        if self.closed < len(self.cols['ts']):
+            bar = tuple(self.cols[k][self.closed] for k in ('ts',) + FIELDS)
+        return cols, bar
+
+
+def store_values(bars, specs, idx, store=None, owner=None):
+    store = store or IndicatorStore(bars)
+    return {label: values.copy() for label, _, values in store.values("USD_JPY", "1m", specs, idx, owner)}
+
+
+def test_store_updates_tail_only():
+    """表示範囲が同じなら前回の値を使い回し、新しく確定した足と形成中の足だけ変わる"""
+    cols = make_bars(400, seed=3)
+    bars = FakeBars(cols, 300)
+    store = IndicatorStore(bars)
+    idx = np.arange(250, 310)
+    first = store_values(bars, SPECS, idx, store, owner="pane")
+    for label, values in first.items():
+        assert np.isnan(values[idx > 300]).all()
+    bars.closed = 305
+    second = store_values(bars, SPECS, idx, store, owner="pane")
+    fresh = store_values(bars, SPECS, idx)
+    for label in fresh:
+        assert_same(second[label], fresh[label])
+        # 前回確定していた足の値は変わらない
+        assert_same(second[label][:50], first[label][:50])
+
+
+def test_store_window_change_recomputes():
+    cols = make_bars(400, seed=4)
+    bars = FakeBars(cols, 390)
+    store = IndicatorStore(bars)
+    store_values(bars, SPECS, np.arange(300, 350), store, owner="pane")
+    moved = store_values(bars, SPECS, np.arange(320, 391), store, owner="pane")
+    fresh = store_values(bars, SPECS, np.arange(320, 391))
+    for label in fresh:
+        assert_same(moved[label], fresh[label])
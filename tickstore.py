@@ -0,0 +1,120 @@
+import threading
+import numpy as np
+
+# ---------------------------------------------------------
+# ティック保存用リングバッファ
+# ---------------------------------------------------------
+TICK_DTYPE = np.dtype([
+    ('ts', 'f8'), ('bid', 'f8'), ('ask', 'f8'),
+    ('high', 'f8'), ('low', 'f8'), ('volume', 'f8')
+])
+DEFAULT_CAPACITY = 16384  # 1銘柄あたりの保持ティック数
+
+
+class TickRingBuffer:
+    """固定長のティックバッファ (追記時のメモリ確保なし)
+
+    配列を容量の2倍確保し、同じティックを前半と後半の両方に書き込む。
+    これにより折り返しをまたぐ区間も常に連続領域となり、
+    last() / since() はコピーなしのビューを返せる。
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._data = np.zeros(capacity * 2, dtype=TICK_DTYPE)
+        self._count = 0  # これまでに追記した総数
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    @property
+    def total(self):
+        """累計の追記数 (上書きされた分も含む)"""
+        return self._count
+
+    def append(self, ts, bid, ask, high=0.0, low=0.0, volume=0.0):
+        pos = self._count % self.capacity
+        row = (ts, bid, ask, high, low, volume)
+        self._data[pos] = row
+        self._data[pos + self.capacity] = row
+        self._count += 1
+
+    def extend(self, records):
+        """TICK_DTYPE の配列をまとめて追記する (容量を超える分は古い方を捨てる)"""
+        total = len(records)  # 捨てた分も累計に数える
+        records = records[-self.capacity:]
+        n = len(records)
+        pos = (self._count + total - n + np.arange(n)) % self.capacity
+        self._data[pos] = records
+        self._data[pos + self.capacity] = records
+        self._count += total
+
+    def last(self, n=None):
+        """直近 n 件のビュー (古い順)"""
+        size = len(self)
+        n = size if n is None else max(0, min(n, size))
+        if self._count <= self.capacity:
+            return self._data[self._count - n:self._count]
+        end = self._count % self.capacity + self.capacity
+        return self._data[end - n:end]
+
+    def since(self, t):
+        """時刻 t 以降のティックのビュー (ts は単調増加を前提)"""
+        view = self.last()
+        start = np.searchsorted(view['ts'], t, side='left')
+        return view[start:]
+
+    def latest(self):
+        """最新ティック (未受信なら None)"""
+        if self._count == 0:
+            return None
+        return self.last(1)[0]
+
+
+class TickStore:
+    """銘柄ごとのリングバッファをまとめて管理する"""
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def buffer(self, symbol):
+        buf = self.buffers.get(symbol)
+        if buf is None:
+            buf = self.buffers[symbol] = TickRingBuffer(self.capacity)
+        return buf
+
+    def append(self, symbol, ts, bid, ask, high=0.0, low=0.0, volume=0.0):
+        with self.lock:
+            self.buffer(symbol).append(ts, bid, ask, high, low, volume)
+
+    def extend(self, symbol, records):
+        with self.lock:
+            self.buffer(symbol).extend(records)
+
+    def append_frame(self, df, ts):
+        """フィードが返す (fx_df, crypto_df) のうち DataFrame 1枚分をまとめて追記する"""
+        if df is None or df.empty:
+            return
+        n = len(df)
+        symbols = df['symbol'].to_numpy()
+        cols = [df[c].to_numpy(dtype=float) if c in df.columns else np.zeros(n)
+                for c in ('bid', 'ask', 'high', 'low', 'volume')]
+        with self.lock:
+            for i in range(n):
+                self.buffer(symbols[i]).append(ts, cols[0][i], cols[1][i],
+                                               cols[2][i], cols[3][i], cols[4][i])
+
+    def last(self, symbol, n=None):
+        buf = self.buffers.get(symbol)
+        return buf.last(n) if buf else np.empty(0, dtype=TICK_DTYPE)
+
+    def since(self, symbol, t):
+        buf = self.buffers.get(symbol)
+        return buf.since(t) if buf else np.empty(0, dtype=TICK_DTYPE)
+
+    def latest(self, symbol):
+        buf = self.buffers.get(symbol)
+        return buf.latest() if buf else None
+
+    def symbols(self):
+        return list(self.buffers)